@@ -6,19 +6,19 @@ from agno.embedder.openai import OpenAIEmbedder
 from agno.knowledge.url import UrlKnowledge
 from agno.memory.v2.db.postgres import PostgresMemoryDb
 from agno.memory.v2.memory import Memory
-from agno.models.openai import OpenAIChat
 from agno.storage.agent.postgres import PostgresAgentStorage
 from agno.tools.duckduckgo import DuckDuckGoTools
 from agno.vectordb.pgvector import PgVector, SearchType
 
-from db.session import db_url
+from agents.models import get_openai_chat
+from db.session import db_engine
 
 
 def get_agno_assist_knowledge() -> AgentKnowledge:
     return UrlKnowledge(
         urls=["https://docs.agno.com/llms-full.txt"],
         vector_db=PgVector(
-            db_url=db_url,
+            db_engine=db_engine,
             table_name="agno_assist_knowledge",
             search_type=SearchType.hybrid,
             embedder=OpenAIEmbedder(id="text-embedding-3-small"),
@@ -37,7 +37,7 @@ def get_agno_assist(
         agent_id="agno_assist",
         user_id=user_id,
         session_id=session_id,
-        model=OpenAIChat(id=model_id),
+        model=get_openai_chat(model_id),
         # Tools available to the agent
         tools=[DuckDuckGoTools()],
         # Description of the agent
@@ -105,7 +105,7 @@ def get_agno_assist(
         search_knowledge=True,
         # -*- Storage -*-
         # Storage chat history and session state in a Postgres table
-        storage=PostgresAgentStorage(table_name="agno_assist_sessions", db_url=db_url),
+        storage=PostgresAgentStorage(table_name="agno_assist_sessions", db_engine=db_engine),
         # -*- History -*-
         # Send the last 3 messages from the chat history
         add_history_to_messages=True,
@@ -115,8 +115,8 @@ def get_agno_assist(
         # -*- Memory -*-
         # Enable agentic memory where the Agent can personalize responses to the user
         memory=Memory(
-            model=OpenAIChat(id=model_id),
-            db=PostgresMemoryDb(table_name="user_memories", db_url=db_url),
+            model=get_openai_chat(model_id),
+            db=PostgresMemoryDb(table_name="user_memories", db_engine=db_engine),
             delete_memories=True,
             clear_memories=True,
         ),
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+from importlib.util import find_spec
+from os import getenv
+from typing import Any, Optional
+from weakref import WeakKeyDictionary
+
+import httpx
+from agno.models.openai import OpenAIChat
+from openai import AsyncOpenAI as AsyncOpenAIClient
+from openai import OpenAI as OpenAIClient
+
+from agents.rate_scheduler import AsyncScheduledTransport, ScheduledTransport, get_llm_scheduler
+
+# Connection limits of the shared pool, per process (sync) and per event loop (async)
+OPENAI_MAX_CONNECTIONS = int(getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+# Seconds an idle connection is kept open for reuse
+OPENAI_KEEPALIVE_EXPIRY = float(getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+# Seconds to connect, and to wait on a read, write or free pooled connection
+OPENAI_CONNECT_TIMEOUT = float(getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+OPENAI_READ_TIMEOUT = float(getenv("OPENAI_READ_TIMEOUT", "600"))
+# HTTP/2 multiplexes requests over one connection; it needs the h2 package (httpx[http2])
+OPENAI_HTTP2 = getenv("OPENAI_HTTP2", "true").lower() == "true" and find_spec("h2") is not None
+
+_http_client: Optional[httpx.Client] = None
+_async_http_clients: "WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = WeakKeyDictionary()
+_http_clients_lock = threading.Lock()
+
+
+def get_http_transport_options() -> dict:
+    return {
+        "http2": OPENAI_HTTP2,
+        "limits": httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        ),
+    }
+
+
+def get_http_client_options() -> dict:
+    return {
+        "timeout": httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        "follow_redirects": True,
+    }
+
+
+def get_http_client() -> httpx.Client:
+    """The process-wide keep-alive client for blocking model calls, admitted by the LLM rate scheduler."""
+    global _http_client
+    if _http_client is None:
+        with _http_clients_lock:
+            if _http_client is None:
+                transport = ScheduledTransport(httpx.HTTPTransport(**get_http_transport_options()), get_llm_scheduler())
+                _http_client = httpx.Client(transport=transport, **get_http_client_options())
+    return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    The keep-alive client for async model calls on the running event loop.
+
+    Async connections belong to the loop that opened them, so each loop (the API's, or a private
+    one such as the Excel workflow's chunk dispatcher) gets its own pool, dropped with the loop.
+    """
+    loop = asyncio.get_running_loop()
+    with _http_clients_lock:
+        client = _async_http_clients.get(loop)
+        if client is None:
+            transport = AsyncScheduledTransport(
+                httpx.AsyncHTTPTransport(**get_http_transport_options()), get_llm_scheduler()
+            )
+            client = httpx.AsyncClient(transport=transport, **get_http_client_options())
+            _async_http_clients[loop] = client
+    return client
+
+
+def close_http_clients() -> None:
+    """Close the blocking pool; async pools are released with their event loops."""
+    global _http_client
+    with _http_clients_lock:
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+
+
+class PooledOpenAIChat(OpenAIChat):
+    """
+    OpenAIChat whose clients reuse the shared connection pools.
+
+    OpenAIChat builds a new OpenAI client for every model call, and a new HTTP connection pool for
+    every async call, so each call paid for a fresh connection and TLS handshake. Clients built
+    here are still per call, which keeps per-model settings such as the API key and base URL, but
+    they send their requests through the shared keep-alive pools, and through the LLM rate scheduler
+    that keeps every model within its requests and tokens per minute. An explicit http_client wins.
+    """
+
+    def get_client(self) -> OpenAIClient:
+        if self.http_client is not None:
+            return super().get_client()
+        client_params = self._get_client_params()
+        client_params.setdefault("http_client", get_http_client())
+        return OpenAIClient(**client_params)
+
+    def get_async_client(self) -> AsyncOpenAIClient:
+        if self.http_client is not None:
+            return super().get_async_client()
+        try:
+            http_client = get_async_http_client()
+        except RuntimeError:
+            # Not called from an event loop: nothing to share the connections with
+            return super().get_async_client()
+        client_params = self._get_client_params()
+        client_params.setdefault("http_client", http_client)
+        return AsyncOpenAIClient(**client_params)
+
+
+def get_openai_chat(model_id: str, **kwargs: Any) -> OpenAIChat:
+    """An OpenAI chat model on the shared connection pools."""
+    return PooledOpenAIChat(id=model_id, **kwargs)
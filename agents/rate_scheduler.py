@@ -0,0 +1,513 @@
+import asyncio
+import itertools
+import json
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from logging import getLogger
+from os import getenv
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import Column, DateTime, Float, MetaData, String, Table, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection, Engine
+
+logger = getLogger(__name__)
+
+INTERACTIVE_LANE = "interactive"
+BATCH_LANE = "batch"
+LANES = (INTERACTIVE_LANE, BATCH_LANE)
+
+# Requests and tokens per minute allowed per model; 0 leaves that budget unlimited
+OPENAI_RPM = int(getenv("OPENAI_RPM", "0"))
+OPENAI_TPM = int(getenv("OPENAI_TPM", "0"))
+# Per-model budgets overriding the defaults above, e.g. "gpt-4.1=500:30000,gpt-4o-mini=500:200000"
+OPENAI_MODEL_RATE_LIMITS = getenv("OPENAI_MODEL_RATE_LIMITS", "")
+# Share of every budget batch work may use; the rest is held back for interactive requests
+OPENAI_BATCH_SHARE = float(getenv("OPENAI_BATCH_SHARE", "0.8"))
+# Completion tokens charged up front when a request sets no max tokens; corrected once usage is known
+OPENAI_COMPLETION_TOKENS_ESTIMATE = int(getenv("OPENAI_COMPLETION_TOKENS_ESTIMATE", "500"))
+# "local" keeps the budgets in each process; "postgres" shares them between processes and nodes
+OPENAI_RATE_LIMIT_BACKEND = getenv("OPENAI_RATE_LIMIT_BACKEND", "local").lower()
+
+# Recent queue waits kept per lane for latency percentiles
+WAIT_SAMPLE_SIZE = 1000
+# Longest a waiting request sleeps before checking the budgets again
+MAX_POLL_SECONDS = 0.25
+
+_llm_lane: ContextVar[str] = ContextVar("llm_lane", default=INTERACTIVE_LANE)
+
+
+@contextmanager
+def llm_lane(lane: str) -> Iterator[None]:
+    """Send the model calls made inside the block, including those of tasks it starts, through `lane`."""
+    token = _llm_lane.set(lane)
+    try:
+        yield
+    finally:
+        _llm_lane.reset(token)
+
+
+def get_llm_lane() -> str:
+    return _llm_lane.get()
+
+
+@dataclass
+class RateLimit:
+    """Requests and tokens one model may use per minute; 0 means unlimited."""
+
+    requests_per_minute: int = 0
+    tokens_per_minute: int = 0
+
+    @property
+    def unlimited(self) -> bool:
+        return self.requests_per_minute <= 0 and self.tokens_per_minute <= 0
+
+
+def parse_rate_limits(value: str) -> Dict[str, RateLimit]:
+    """Parse `model=rpm:tpm` pairs separated by commas; malformed pairs are skipped."""
+    limits: Dict[str, RateLimit] = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        try:
+            model, budgets = entry.split("=", 1)
+            rpm, tpm = budgets.split(":", 1)
+            limits[model.strip()] = RateLimit(int(rpm or 0), int(tpm or 0))
+        except ValueError:
+            logger.warning(f"Ignoring malformed rate limit '{entry}', expected model=rpm:tpm")
+    return limits
+
+
+def plan_take(
+    levels: List[float], elapsed: float, capacities: List[float], costs: List[float], reserves: List[float]
+) -> Tuple[List[float], float]:
+    """
+    Refill token buckets for `elapsed` seconds and take `costs` from them if every bucket keeps its reserve.
+
+    Buckets refill their whole capacity per minute. Returns the new levels, and 0.0 if the costs were taken
+    or else the seconds until they could be.
+    """
+    refilled = [min(capacity, level + elapsed * capacity / 60) for level, capacity in zip(levels, capacities)]
+    wait = 0.0
+    for level, capacity, cost, reserve in zip(refilled, capacities, costs, reserves):
+        if level < cost + reserve:
+            wait = max(wait, (cost + reserve - level) / (capacity / 60))
+    if wait > 0:
+        return refilled, wait
+    return [level - cost for level, cost in zip(refilled, costs)], 0.0
+
+
+def get_budgets(
+    limit: RateLimit, requests: int, tokens: int, reserve_share: float
+) -> Tuple[List[str], List[float], List[float], List[float]]:
+    """The budgets `limit` sets, with their capacities, the costs of a call and the reserve it must leave."""
+    names, capacities, costs, reserves = [], [], [], []
+    for name, capacity, cost in (
+        ("requests", limit.requests_per_minute, requests),
+        ("tokens", limit.tokens_per_minute, tokens),
+    ):
+        if capacity <= 0:
+            continue
+        reserve = capacity * reserve_share
+        names.append(name)
+        capacities.append(float(capacity))
+        # A call bigger than the usable budget is charged the whole usable budget, so it still gets through
+        costs.append(float(min(cost, capacity - reserve)))
+        reserves.append(reserve)
+    return names, capacities, costs, reserves
+
+
+class LocalRateBuckets:
+    """Per-model budgets of this process."""
+
+    blocking = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._levels: Dict[str, Tuple[List[float], float]] = {}
+
+    def take(self, model: str, limit: RateLimit, requests: int, tokens: int, reserve_share: float) -> float:
+        names, capacities, costs, reserves = get_budgets(limit, requests, tokens, reserve_share)
+        now = time.monotonic()
+        with self._lock:
+            levels, updated_at = self._levels.get(model, (list(capacities), now))
+            levels, wait = plan_take(levels, now - updated_at, capacities, costs, reserves)
+            self._levels[model] = (levels, now)
+        return wait
+
+    def give_back(self, model: str, limit: RateLimit, tokens: int) -> None:
+        """Return tokens charged beyond a call's actual usage; negative tokens charge the shortfall."""
+        if limit.tokens_per_minute <= 0:
+            return
+        names, capacities, _, _ = get_budgets(limit, 0, 0, 0.0)
+        with self._lock:
+            if model not in self._levels:
+                return
+            levels, _ = self._levels[model]
+            index = names.index("tokens")
+            levels[index] = min(capacities[index], levels[index] + tokens)
+
+
+class PostgresRateBuckets:
+    """
+    Per-model budgets shared by every process using the same database.
+
+    Each budget is a row holding its level and when it was last updated; a call locks its model's rows,
+    refills them with the time passed on the database clock and takes its cost in one transaction.
+    """
+
+    blocking = True
+
+    def __init__(self, engine: Engine, table_name: str = "llm_rate_buckets", schema: str = "ai"):
+        self.engine = engine
+        self.schema = schema
+        self.table = Table(
+            table_name,
+            MetaData(schema=schema),
+            Column("bucket", String, primary_key=True),
+            Column("level", Float, nullable=False),
+            Column("updated_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+        )
+        self._initialized = False
+
+    def _create(self) -> None:
+        if self._initialized:
+            return
+        with self.engine.begin() as connection:
+            # Processes starting together would race to create the table; the lock makes them take turns
+            connection.execute(select(func.pg_advisory_xact_lock(func.hashtext(self.table.fullname))))
+            connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {self.schema}"))
+            self.table.create(connection, checkfirst=True)
+        self._initialized = True
+
+    def _locked_levels(
+        self, connection: Connection, keys: List[str], capacities: List[float]
+    ) -> Tuple[List[float], float]:
+        """Lock the buckets, creating full ones if missing; returns their levels and seconds since their update."""
+        connection.execute(
+            insert(self.table)
+            .values([{"bucket": key, "level": capacity} for key, capacity in zip(keys, capacities)])
+            .on_conflict_do_nothing()
+        )
+        elapsed = func.extract("epoch", func.clock_timestamp() - self.table.c.updated_at)
+        rows = {
+            bucket: (level, seconds)
+            for bucket, level, seconds in connection.execute(
+                select(self.table.c.bucket, self.table.c.level, elapsed)
+                .where(self.table.c.bucket.in_(keys))
+                .order_by(self.table.c.bucket)
+                .with_for_update()
+            )
+        }
+        # Buckets of one model are updated together, so they share one update time
+        return [rows[key][0] for key in keys], float(min(seconds for _, seconds in rows.values()))
+
+    def _save(self, connection: Connection, keys: List[str], levels: List[float]) -> None:
+        for key, level in zip(keys, levels):
+            connection.execute(
+                update(self.table)
+                .where(self.table.c.bucket == key)
+                .values(level=level, updated_at=func.clock_timestamp())
+            )
+
+    def take(self, model: str, limit: RateLimit, requests: int, tokens: int, reserve_share: float) -> float:
+        self._create()
+        names, capacities, costs, reserves = get_budgets(limit, requests, tokens, reserve_share)
+        keys = [f"{model}:{name}" for name in names]
+        with self.engine.begin() as connection:
+            levels, elapsed = self._locked_levels(connection, keys, capacities)
+            levels, wait = plan_take(levels, elapsed, capacities, costs, reserves)
+            self._save(connection, keys, levels)
+        return wait
+
+    def give_back(self, model: str, limit: RateLimit, tokens: int) -> None:
+        if limit.tokens_per_minute <= 0:
+            return
+        self._create()
+        names, capacities, _, _ = get_budgets(limit, 0, 0, 0.0)
+        keys = [f"{model}:{name}" for name in names]
+        with self.engine.begin() as connection:
+            levels, elapsed = self._locked_levels(connection, keys, capacities)
+            levels, _ = plan_take(levels, elapsed, capacities, [0.0] * len(keys), [0.0] * len(keys))
+            index = names.index("tokens")
+            levels[index] = min(capacities[index], levels[index] + tokens)
+            self._save(connection, keys, levels)
+
+
+class SchedulerStats:
+    """Per-lane counters and recent queue waits of model calls."""
+
+    def __init__(self, sample_size: int = WAIT_SAMPLE_SIZE):
+        self._lock = threading.Lock()
+        self._waits: Dict[str, Deque[float]] = {lane: deque(maxlen=sample_size) for lane in LANES}
+        self.calls: Dict[str, int] = {lane: 0 for lane in LANES}
+        self.delayed: Dict[str, int] = {lane: 0 for lane in LANES}
+        self.total_wait_seconds: Dict[str, float] = {lane: 0.0 for lane in LANES}
+        self.max_wait_seconds: Dict[str, float] = {lane: 0.0 for lane in LANES}
+        self.rate_limited = 0
+
+    def record_wait(self, lane: str, wait_seconds: float) -> None:
+        with self._lock:
+            self.calls[lane] += 1
+            if wait_seconds > 0.001:
+                self.delayed[lane] += 1
+            self.total_wait_seconds[lane] += wait_seconds
+            self.max_wait_seconds[lane] = max(self.max_wait_seconds[lane], wait_seconds)
+            self._waits[lane].append(wait_seconds)
+
+    def record_rate_limited(self) -> None:
+        with self._lock:
+            self.rate_limited += 1
+
+    def snapshot(self, waiting: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """Counters and queue wait percentiles per lane, with the calls waiting right now."""
+        lanes: Dict[str, Any] = {}
+        with self._lock:
+            for lane in LANES:
+                waits = sorted(self._waits[lane])
+                lanes[lane] = {
+                    "calls": self.calls[lane],
+                    "delayed": self.delayed[lane],
+                    "waiting": (waiting or {}).get(lane, 0),
+                    "queue_wait_seconds_total": round(self.total_wait_seconds[lane], 6),
+                    "queue_wait_ms_max": round(self.max_wait_seconds[lane] * 1000, 3),
+                    "queue_wait_ms_p50": round(statistics.median(waits) * 1000, 3) if waits else 0.0,
+                    "queue_wait_ms_p95": round(waits[int(len(waits) * 0.95) - 1] * 1000, 3) if waits else 0.0,
+                }
+            return {"lanes": lanes, "rate_limited_responses": self.rate_limited}
+
+
+@dataclass
+class ScheduledCall:
+    """A model call admitted by the scheduler, with the tokens it was charged."""
+
+    model: str
+    lane: str
+    tokens: int
+    streamed: bool
+
+
+class LLMRateScheduler:
+    """
+    Admits model calls within per-model requests- and tokens-per-minute budgets.
+
+    Calls wait in two lanes. Interactive calls (the default) go first: a batch call only takes from a
+    budget when no interactive call for its model is waiting, and never takes the last
+    (1 - batch_share) of it, which is held back for interactive bursts. Within a lane calls are admitted
+    in arrival order. Tokens are charged up front from the request's size and max tokens, and corrected
+    with the usage reported in the response when it is not streamed. A 429 pauses the model's calls
+    for the Retry-After the API asked for.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, RateLimit]] = None,
+        default_limit: Optional[RateLimit] = None,
+        buckets: Optional[Any] = None,
+        batch_share: float = OPENAI_BATCH_SHARE,
+        completion_tokens_estimate: int = OPENAI_COMPLETION_TOKENS_ESTIMATE,
+    ):
+        self.limits = limits or {}
+        self.default_limit = default_limit or RateLimit()
+        self.buckets = buckets or LocalRateBuckets()
+        self.batch_share = min(max(batch_share, 0.0), 1.0)
+        self.completion_tokens_estimate = completion_tokens_estimate
+        self.stats = SchedulerStats()
+        self._lock = threading.Lock()
+        self._tickets = itertools.count()
+        self._queues: Dict[str, Dict[str, Deque[int]]] = {}
+        self._paused_until: Dict[str, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return not self.default_limit.unlimited or any(not limit.unlimited for limit in self.limits.values())
+
+    def get_limit(self, model: str) -> RateLimit:
+        return self.limits.get(model, self.default_limit)
+
+    def prepare(self, request: httpx.Request) -> Optional[ScheduledCall]:
+        """The call to schedule for a request, or None if it is not a budgeted model call."""
+        if not self.enabled or request.method != "POST":
+            return None
+        try:
+            body = json.loads(request.content or b"{}")
+        except (ValueError, httpx.RequestNotRead):
+            return None
+        model = body.get("model") if isinstance(body, dict) else None
+        if not model or self.get_limit(model).unlimited:
+            return None
+        max_tokens = body.get("max_completion_tokens") or body.get("max_tokens") or self.completion_tokens_estimate
+        # About four bytes of JSON per prompt token, which errs on the side of charging too much
+        tokens = len(request.content) // 4 + int(max_tokens)
+        lane = get_llm_lane() if get_llm_lane() in LANES else INTERACTIVE_LANE
+        return ScheduledCall(model=model, lane=lane, tokens=tokens, streamed=bool(body.get("stream")))
+
+    def _enter(self, call: ScheduledCall) -> int:
+        ticket = next(self._tickets)
+        with self._lock:
+            lanes = self._queues.setdefault(call.model, {lane: deque() for lane in LANES})
+            lanes[call.lane].append(ticket)
+        return ticket
+
+    def _leave(self, call: ScheduledCall, ticket: int) -> None:
+        with self._lock:
+            for queue in self._queues[call.model].values():
+                if ticket in queue:
+                    queue.remove(ticket)
+
+    def _try_take(self, call: ScheduledCall, ticket: int) -> float:
+        """0.0 once the call is admitted, otherwise seconds to wait before trying again."""
+        with self._lock:
+            lanes = self._queues[call.model]
+            if lanes[call.lane][0] != ticket:
+                return 0.01
+            if call.lane == BATCH_LANE and lanes[INTERACTIVE_LANE]:
+                return 0.01
+            paused = self._paused_until.get(call.model, 0.0) - time.monotonic()
+        if paused > 0:
+            return paused
+        reserve_share = 1.0 - self.batch_share if call.lane == BATCH_LANE else 0.0
+        return self.buckets.take(call.model, self.get_limit(call.model), 1, call.tokens, reserve_share)
+
+    async def acquire(self, call: ScheduledCall) -> float:
+        """Wait until the call fits its model's budgets; returns the seconds waited."""
+        started = time.perf_counter()
+        ticket = self._enter(call)
+        try:
+            while True:
+                if self.buckets.blocking:
+                    wait = await asyncio.to_thread(self._try_take, call, ticket)
+                else:
+                    wait = self._try_take(call, ticket)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(min(wait, MAX_POLL_SECONDS))
+        finally:
+            self._leave(call, ticket)
+        waited = time.perf_counter() - started
+        self.stats.record_wait(call.lane, waited)
+        return waited
+
+    def acquire_sync(self, call: ScheduledCall) -> float:
+        """Blocking version of acquire() for the synchronous client."""
+        started = time.perf_counter()
+        ticket = self._enter(call)
+        try:
+            while (wait := self._try_take(call, ticket)) > 0:
+                time.sleep(min(wait, MAX_POLL_SECONDS))
+        finally:
+            self._leave(call, ticket)
+        waited = time.perf_counter() - started
+        self.stats.record_wait(call.lane, waited)
+        return waited
+
+    def pause(self, model: str, seconds: float) -> None:
+        """Hold back the model's calls, e.g. after the API answered 429."""
+        with self._lock:
+            self._paused_until[model] = max(self._paused_until.get(model, 0.0), time.monotonic() + seconds)
+
+    def settle(self, call: ScheduledCall, response: httpx.Response) -> None:
+        """Correct the call's charge from a read response: its usage, or the pause a 429 asked for."""
+        if response.status_code == 429:
+            self.stats.record_rate_limited()
+            self.pause(call.model, get_retry_after(response))
+            return
+        if call.streamed or response.status_code != 200:
+            return
+        try:
+            used = int(response.json()["usage"]["total_tokens"])
+        except (ValueError, KeyError, TypeError):
+            return
+        self.buckets.give_back(call.model, self.get_limit(call.model), call.tokens - used)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Queue wait statistics per lane and the configured budgets."""
+        with self._lock:
+            waiting = {lane: sum(len(lanes[lane]) for lanes in self._queues.values()) for lane in LANES}
+        stats = self.stats.snapshot(waiting)
+        stats["enabled"] = self.enabled
+        stats["backend"] = "postgres" if self.buckets.blocking else "local"
+        stats["default_limit"] = vars(self.default_limit)
+        stats["model_limits"] = {model: vars(limit) for model, limit in self.limits.items()}
+        return stats
+
+
+def get_retry_after(response: httpx.Response, default: float = 1.0) -> float:
+    """Seconds a 429 response asks to wait, from retry-after-ms or retry-after."""
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(response.headers[header]) * scale
+        except (KeyError, ValueError):
+            continue
+    return default
+
+
+class ScheduledTransport(httpx.BaseTransport):
+    """Sends requests through `transport` once the scheduler admits them."""
+
+    def __init__(self, transport: httpx.BaseTransport, scheduler: LLMRateScheduler):
+        self.transport = transport
+        self.scheduler = scheduler
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        call = self.scheduler.prepare(request)
+        if call is None:
+            return self.transport.handle_request(request)
+        self.scheduler.acquire_sync(call)
+        response = self.transport.handle_request(request)
+        if not call.streamed or response.status_code == 429:
+            response.read()
+            self.scheduler.settle(call, response)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncScheduledTransport(httpx.AsyncBaseTransport):
+    """Async version of ScheduledTransport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, scheduler: LLMRateScheduler):
+        self.transport = transport
+        self.scheduler = scheduler
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        call = self.scheduler.prepare(request)
+        if call is None:
+            return await self.transport.handle_async_request(request)
+        await self.scheduler.acquire(call)
+        response = await self.transport.handle_async_request(request)
+        if not call.streamed or response.status_code == 429:
+            await response.aread()
+            self.scheduler.settle(call, response)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+_llm_scheduler: Optional[LLMRateScheduler] = None
+_llm_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMRateScheduler:
+    """The process-wide scheduler every pooled OpenAI client sends its requests through."""
+    global _llm_scheduler
+    if _llm_scheduler is None:
+        with _llm_scheduler_lock:
+            if _llm_scheduler is None:
+                buckets: Any = LocalRateBuckets()
+                if OPENAI_RATE_LIMIT_BACKEND == "postgres":
+                    from db.session import db_engine
+
+                    buckets = PostgresRateBuckets(db_engine)
+                _llm_scheduler = LLMRateScheduler(
+                    limits=parse_rate_limits(OPENAI_MODEL_RATE_LIMITS),
+                    default_limit=RateLimit(OPENAI_RPM, OPENAI_TPM),
+                    buckets=buckets,
+                )
+    return _llm_scheduler
@@ -1,9 +1,15 @@
+import time
+from dataclasses import fields
 from enum import Enum
-from typing import List, Optional
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agno.agent import Agent
 
 from agents.agno_assist import get_agno_assist
 from agents.finance_agent import get_finance_agent
 from agents.web_agent import get_web_agent
+from metrics.instruments import agent_build_seconds
 
 
 class AgentType(Enum):
@@ -12,22 +18,96 @@ class AgentType(Enum):
     FINANCE_AGENT = "finance_agent"
 
 
+AGENT_FACTORIES: Dict[AgentType, Callable[..., Agent]] = {
+    AgentType.WEB_AGENT: get_web_agent,
+    AgentType.AGNO_ASSIST: get_agno_assist,
+    AgentType.FINANCE_AGENT: get_finance_agent,
+}
+
+# Fields a request's agent shares with its template instead of copying. Storage and knowledge only
+# hold table metadata and the shared engine, so one instance serves every request; everything
+# that collects run state (model, memory, tools, session state) is copied per request.
+SHARED_AGENT_FIELDS = ("storage", "knowledge")
+
+# Agents built once per (agent_id, model_id, debug_mode) and copied for every request
+_agent_templates: Dict[Tuple[AgentType, str, bool], Agent] = {}
+_agent_templates_lock = Lock()
+
+
 def get_available_agents() -> List[str]:
     """Returns a list of all available agent IDs."""
     return [agent.value for agent in AgentType]
 
 
+def get_agent_template(agent_id: AgentType, model_id: str = "gpt-4.1", debug_mode: bool = True) -> Agent:
+    """
+    The cached, never-run agent that requests for this agent and model are copied from.
+
+    Raises:
+        ValueError: If the agent does not exist.
+    """
+    factory = AGENT_FACTORIES.get(agent_id)
+    if factory is None:
+        raise ValueError(f"Agent: {agent_id} not found")
+
+    key = (agent_id, model_id, debug_mode)
+    template = _agent_templates.get(key)
+    if template is None:
+        with _agent_templates_lock:
+            template = _agent_templates.get(key)
+            if template is None:
+                template = factory(model_id=model_id, debug_mode=debug_mode)
+                _agent_templates[key] = template
+    return template
+
+
+def clear_agent_templates() -> None:
+    """Drop the cached templates, e.g. after changing an agent's configuration."""
+    with _agent_templates_lock:
+        _agent_templates.clear()
+
+
+def copy_agent(template: Agent, **update: Any) -> Agent:
+    """
+    Copy an agent the way Agent.deep_copy() does, sharing SHARED_AGENT_FIELDS with the template.
+
+    Fields given in `update` are not copied at all; Agent.deep_copy() copies every field before
+    applying its update, which would rebuild the storage's and knowledge base's table metadata.
+    """
+    for field_name in SHARED_AGENT_FIELDS:
+        update.setdefault(field_name, getattr(template, field_name))
+
+    fields_for_new_agent: Dict[str, Any] = {}
+    for f in fields(template):
+        if f.name == "agent_session" or f.name in update:
+            continue
+        field_value = getattr(template, f.name)
+        if field_value is not None:
+            fields_for_new_agent[f.name] = template._deep_copy_field(f.name, field_value)
+    fields_for_new_agent.update({name: value for name, value in update.items() if value is not None})
+    return template.__class__(**fields_for_new_agent)
+
+
 def get_agent(
     model_id: str = "gpt-4.1",
     agent_id: Optional[AgentType] = None,
     user_id: Optional[str] = None,
     session_id: Optional[str] = None,
     debug_mode: bool = True,
-):
-    if agent_id == AgentType.WEB_AGENT:
-        return get_web_agent(model_id=model_id, user_id=user_id, session_id=session_id, debug_mode=debug_mode)
-    elif agent_id == AgentType.AGNO_ASSIST:
-        return get_agno_assist(model_id=model_id, user_id=user_id, session_id=session_id, debug_mode=debug_mode)
-    elif agent_id == AgentType.FINANCE_AGENT:
-        return get_finance_agent(model_id=model_id, user_id=user_id, session_id=session_id, debug_mode=debug_mode)
-    raise ValueError(f"Agent: {agent_id} not found")
+) -> Agent:
+    """
+    An agent for one request, bound to its user and session.
+
+    The agent is a copy of a cached template, so building its tools, model, storage and memory
+    objects and inspecting their tables happens once per process rather than on every request.
+    """
+    if agent_id is None:
+        raise ValueError(f"Agent: {agent_id} not found")
+    started = time.perf_counter()
+    cached = (agent_id, model_id, debug_mode) in _agent_templates
+    template = get_agent_template(agent_id, model_id=model_id, debug_mode=debug_mode)
+    agent = copy_agent(template, user_id=user_id, session_id=session_id)
+    agent_build_seconds.observe(
+        time.perf_counter() - started, agent=agent_id.value, template="cached" if cached else "built"
+    )
+    return agent
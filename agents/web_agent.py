@@ -4,11 +4,11 @@ from typing import Optional
 from agno.agent import Agent
 from agno.memory.v2.db.postgres import PostgresMemoryDb
 from agno.memory.v2.memory import Memory
-from agno.models.openai import OpenAIChat
 from agno.storage.agent.postgres import PostgresAgentStorage
 from agno.tools.duckduckgo import DuckDuckGoTools
 
-from db.session import db_url
+from agents.models import get_openai_chat
+from db.session import db_engine
 
 
 def get_web_agent(
@@ -22,7 +22,7 @@ def get_web_agent(
         agent_id="web_search_agent",
         user_id=user_id,
         session_id=session_id,
-        model=OpenAIChat(id=model_id),
+        model=get_openai_chat(model_id),
         # Tools available to the agent
         tools=[DuckDuckGoTools()],
         # Description of the agent
@@ -75,7 +75,7 @@ def get_web_agent(
         add_state_in_messages=True,
         # -*- Storage -*-
         # Storage chat history and session state in a Postgres table
-        storage=PostgresAgentStorage(table_name="web_search_agent_sessions", db_url=db_url),
+        storage=PostgresAgentStorage(table_name="web_search_agent_sessions", db_engine=db_engine),
         # -*- History -*-
         # Send the last 3 messages from the chat history
         add_history_to_messages=True,
@@ -85,8 +85,8 @@ def get_web_agent(
         # -*- Memory -*-
         # Enable agentic memory where the Agent can personalize responses to the user
         memory=Memory(
-            model=OpenAIChat(id=model_id),
-            db=PostgresMemoryDb(table_name="user_memories", db_url=db_url),
+            model=get_openai_chat(model_id),
+            db=PostgresMemoryDb(table_name="user_memories", db_engine=db_engine),
             delete_memories=True,
             clear_memories=True,
         ),
@@ -0,0 +1,441 @@
+import asyncio
+import math
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import timedelta
+from logging import getLogger
+from os import getenv
+from typing import Any, Deque, Dict, List, Optional, Set
+from uuid import uuid4
+
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, delete, func, select, text, update
+from sqlalchemy.engine import Engine
+
+logger = getLogger(__name__)
+
+# Agent runs one user may have going at once; 0 means unlimited
+ADMISSION_USER_CONCURRENCY = int(getenv("ADMISSION_USER_CONCURRENCY", "4"))
+# Agent runs one agent may have going at once across all users; 0 means unlimited
+ADMISSION_AGENT_CONCURRENCY = int(getenv("ADMISSION_AGENT_CONCURRENCY", "0"))
+# Per-agent limits overriding the default above, e.g. "finance_agent=8,web_agent=16"
+ADMISSION_AGENT_LIMITS = getenv("ADMISSION_AGENT_LIMITS", "")
+# Runs that may wait for a slot per user and per agent; further requests are rejected right away
+ADMISSION_QUEUE_SIZE = int(getenv("ADMISSION_QUEUE_SIZE", "8"))
+# Longest a queued run waits for a slot before it is rejected
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "30"))
+# "local" counts runs in each process; "postgres" shares the limits between processes and nodes
+ADMISSION_BACKEND = getenv("ADMISSION_BACKEND", "local").lower()
+# Postgres only: slots of a process that stops renewing them (e.g. it crashed) are freed after this long
+ADMISSION_LEASE_SECONDS = float(getenv("ADMISSION_LEASE_SECONDS", "60"))
+
+# Longest a queued run sleeps before checking for a free slot again; slots freed by other processes
+# are only noticed this way
+ADMISSION_POLL_SECONDS = 0.5
+# Recent queue waits and run durations kept for percentiles and Retry-After estimates
+ADMISSION_SAMPLE_SIZE = 1000
+# Bounds of the Retry-After sent with rejections
+MIN_RETRY_AFTER_SECONDS = 1
+MAX_RETRY_AFTER_SECONDS = 60
+
+
+def parse_agent_limits(value: str) -> Dict[str, int]:
+    """Parse `agent_id=limit` pairs separated by commas; malformed pairs are skipped."""
+    limits: Dict[str, int] = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        try:
+            agent_id, limit = entry.split("=", 1)
+            limits[agent_id.strip()] = int(limit)
+        except ValueError:
+            logger.warning(f"Ignoring malformed agent limit '{entry}', expected agent_id=limit")
+    return limits
+
+
+class AdmissionRejected(Exception):
+    """A run was turned away because its user or agent is at its limit and its queue is full or too slow."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LocalAdmissionSlots:
+    """Running agent runs per slot (user or agent), counted in this process only."""
+
+    blocking = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._held: Dict[str, int] = {}
+
+    def try_acquire(self, lease_id: str, limits: Dict[str, int]) -> bool:
+        with self._lock:
+            if any(self._held.get(slot, 0) >= limit for slot, limit in limits.items()):
+                return False
+            for slot in limits:
+                self._held[slot] = self._held.get(slot, 0) + 1
+        return True
+
+    def release(self, lease_id: str, limits: Dict[str, int]) -> None:
+        with self._lock:
+            for slot in limits:
+                held = self._held.get(slot, 0) - 1
+                if held > 0:
+                    self._held[slot] = held
+                else:
+                    self._held.pop(slot, None)
+
+    def renew(self, lease_ids: List[str]) -> None:
+        pass
+
+
+class PostgresAdmissionSlots:
+    """
+    Running agent runs per slot, shared by every process using the same database.
+
+    Every admitted run holds a lease row per slot. A run is admitted in one transaction that locks its
+    slots, drops their expired leases and counts the rest; leases are renewed while their runs go on,
+    so the slots of a process that dies are freed once its leases expire.
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        engine: Engine,
+        table_name: str = "run_admissions",
+        schema: str = "ai",
+        lease_seconds: float = ADMISSION_LEASE_SECONDS,
+    ):
+        self.engine = engine
+        self.schema = schema
+        self.lease = timedelta(seconds=lease_seconds)
+        self.table = Table(
+            table_name,
+            MetaData(schema=schema),
+            Column("lease_id", String, primary_key=True),
+            Column("slot", String, primary_key=True),
+            Column("expires_at", DateTime(timezone=True), nullable=False),
+            Index(f"ix_{table_name}_slot", "slot"),
+        )
+        self._initialized = False
+
+    def _create(self) -> None:
+        if self._initialized:
+            return
+        with self.engine.begin() as connection:
+            # Processes starting together would race to create the table; the lock makes them take turns
+            connection.execute(select(func.pg_advisory_xact_lock(func.hashtext(self.table.fullname))))
+            connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {self.schema}"))
+            self.table.create(connection, checkfirst=True)
+        self._initialized = True
+
+    def try_acquire(self, lease_id: str, limits: Dict[str, int]) -> bool:
+        self._create()
+        slots = sorted(limits)
+        with self.engine.begin() as connection:
+            # Locking slots in sorted order keeps runs sharing an agent from deadlocking
+            for slot in slots:
+                connection.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"{self.table.fullname}:{slot}"))))
+            now = func.clock_timestamp()
+            connection.execute(
+                delete(self.table).where(self.table.c.slot.in_(slots), self.table.c.expires_at <= now)
+            )
+            held: Dict[str, int] = {
+                row.slot: row.leases
+                for row in connection.execute(
+                    select(self.table.c.slot, func.count().label("leases"))
+                    .where(self.table.c.slot.in_(slots))
+                    .group_by(self.table.c.slot)
+                )
+            }
+            if any(held.get(slot, 0) >= limits[slot] for slot in slots):
+                return False
+            connection.execute(
+                self.table.insert().values(
+                    [{"lease_id": lease_id, "slot": slot, "expires_at": now + self.lease} for slot in slots]
+                )
+            )
+        return True
+
+    def release(self, lease_id: str, limits: Dict[str, int]) -> None:
+        self._create()
+        with self.engine.begin() as connection:
+            connection.execute(delete(self.table).where(self.table.c.lease_id == lease_id))
+
+    def renew(self, lease_ids: List[str]) -> None:
+        if not lease_ids:
+            return
+        self._create()
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(self.table)
+                .where(self.table.c.lease_id.in_(lease_ids))
+                .values(expires_at=func.clock_timestamp() + self.lease)
+            )
+
+
+class AdmissionStats:
+    """Admission counters, recent queue waits and recent run durations."""
+
+    def __init__(self, sample_size: int = ADMISSION_SAMPLE_SIZE):
+        self._lock = threading.Lock()
+        self._waits: Deque[float] = deque(maxlen=sample_size)
+        self._run_seconds: Deque[float] = deque(maxlen=sample_size)
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.max_wait_seconds = 0.0
+
+    def record_admitted(self, wait_seconds: float, queued: bool) -> None:
+        with self._lock:
+            self.admitted += 1
+            if queued:
+                self.queued += 1
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            self._waits.append(wait_seconds)
+
+    def record_rejected(self, timed_out: bool) -> None:
+        with self._lock:
+            if timed_out:
+                self.rejected_timeout += 1
+            else:
+                self.rejected_queue_full += 1
+
+    def record_run(self, run_seconds: float) -> None:
+        with self._lock:
+            self._run_seconds.append(run_seconds)
+
+    def median_run_seconds(self) -> Optional[float]:
+        with self._lock:
+            return statistics.median(self._run_seconds) if self._run_seconds else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            run_seconds = sorted(self._run_seconds)
+            stats: Dict[str, Any] = {
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_timeout": self.rejected_timeout,
+                "queue_wait_ms_max": round(self.max_wait_seconds * 1000, 3),
+            }
+        stats["queue_wait_ms_p50"] = round(statistics.median(waits) * 1000, 3) if waits else 0.0
+        stats["queue_wait_ms_p95"] = round(waits[int(len(waits) * 0.95) - 1] * 1000, 3) if waits else 0.0
+        stats["run_seconds_p50"] = round(statistics.median(run_seconds), 3) if run_seconds else 0.0
+        return stats
+
+
+@dataclass
+class AdmissionTicket:
+    """The slots an admitted run holds until it is released."""
+
+    lease_id: str
+    limits: Dict[str, int]
+    controller: Optional["AdmissionController"] = None
+    admitted_at: float = field(default_factory=time.monotonic)
+    released: bool = False
+
+    def release(self) -> None:
+        """Free the run's slots; safe to call more than once, and from task done callbacks."""
+        if self.released:
+            return
+        self.released = True
+        if self.controller is not None:
+            self.controller.release(self)
+
+
+@dataclass
+class _Waiter:
+    limits: Dict[str, int]
+    wake: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class AdmissionController:
+    """
+    Limits how many agent runs each user and each agent may have going at once.
+
+    A run over a limit waits in its user's and agent's queue, in arrival order, for up to
+    queue_timeout_seconds; once queue_size runs wait for the same user or agent, further runs are
+    rejected straight away. Rejections carry a Retry-After estimated from recent run durations.
+    """
+
+    def __init__(
+        self,
+        user_concurrency: int = ADMISSION_USER_CONCURRENCY,
+        agent_concurrency: int = ADMISSION_AGENT_CONCURRENCY,
+        agent_limits: Optional[Dict[str, int]] = None,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        queue_timeout_seconds: float = ADMISSION_QUEUE_TIMEOUT_SECONDS,
+        slots: Optional[Any] = None,
+        lease_seconds: float = ADMISSION_LEASE_SECONDS,
+    ):
+        self.user_concurrency = user_concurrency
+        self.agent_concurrency = agent_concurrency
+        self.agent_limits = agent_limits or {}
+        self.queue_size = queue_size
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.slots = slots or LocalAdmissionSlots()
+        self.lease_seconds = lease_seconds
+        self.stats = AdmissionStats()
+        self._waiters: List[_Waiter] = []
+        self._running: Dict[str, AdmissionTicket] = {}
+        # Keeps release and renewal tasks referenced until they finish
+        self._tasks: Set[asyncio.Task] = set()
+        self._renewing: Optional[asyncio.Task] = None
+
+    def get_limits(self, user_key: str, agent_id: str) -> Dict[str, int]:
+        """The slots a run of `agent_id` for `user_key` needs, with their limits; unlimited slots are left out."""
+        limits = {
+            f"user:{user_key}": self.user_concurrency,
+            f"agent:{agent_id}": self.agent_limits.get(agent_id, self.agent_concurrency),
+        }
+        return {slot: limit for slot, limit in limits.items() if limit > 0}
+
+    def get_retry_after(self, limits: Dict[str, int]) -> int:
+        """Seconds until a run waiting behind everyone queued for these slots would likely start."""
+        run_seconds = self.stats.median_run_seconds() or float(MIN_RETRY_AFTER_SECONDS)
+        turns = max((self._waiting_for(slot) // limit) + 1 for slot, limit in limits.items())
+        return int(min(MAX_RETRY_AFTER_SECONDS, max(MIN_RETRY_AFTER_SECONDS, math.ceil(run_seconds * turns))))
+
+    def _waiting_for(self, slot: str) -> int:
+        return sum(1 for waiter in self._waiters if slot in waiter.limits)
+
+    def _has_waiters_ahead(self, waiter: Optional[_Waiter], limits: Dict[str, int]) -> bool:
+        for other in self._waiters:
+            if other is waiter:
+                return False
+            if other.limits.keys() & limits.keys():
+                return True
+        return False
+
+    async def _try_acquire(self, ticket: AdmissionTicket) -> bool:
+        if self.slots.blocking:
+            return await asyncio.to_thread(self.slots.try_acquire, ticket.lease_id, ticket.limits)
+        return self.slots.try_acquire(ticket.lease_id, ticket.limits)
+
+    def _admitted(self, ticket: AdmissionTicket, started: float, queued: bool) -> AdmissionTicket:
+        ticket.admitted_at = time.monotonic()
+        self.stats.record_admitted(ticket.admitted_at - started, queued)
+        self._running[ticket.lease_id] = ticket
+        if self.slots.blocking and self._renewing is None:
+            self._renewing = asyncio.create_task(self._renew_leases())
+        return ticket
+
+    async def admit(self, user_key: str, agent_id: str) -> AdmissionTicket:
+        """
+        Wait for a slot for a run of `agent_id` on behalf of `user_key`.
+
+        Raises:
+            AdmissionRejected: If the run's queue is full, or no slot freed up within the queue timeout.
+        """
+        started = time.monotonic()
+        ticket = AdmissionTicket(lease_id=uuid4().hex, limits=self.get_limits(user_key, agent_id), controller=self)
+        if not ticket.limits:
+            return ticket
+        if not self._has_waiters_ahead(None, ticket.limits) and await self._try_acquire(ticket):
+            return self._admitted(ticket, started, queued=False)
+
+        full = [slot for slot in ticket.limits if self._waiting_for(slot) >= self.queue_size]
+        if full:
+            self.stats.record_rejected(timed_out=False)
+            raise AdmissionRejected(
+                f"Too many runs waiting for {', '.join(full)}", self.get_retry_after(ticket.limits)
+            )
+
+        waiter = _Waiter(limits=ticket.limits)
+        self._waiters.append(waiter)
+        deadline = started + self.queue_timeout_seconds
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats.record_rejected(timed_out=True)
+                    raise AdmissionRejected(
+                        f"No slot freed up within {self.queue_timeout_seconds:g}s for {', '.join(ticket.limits)}",
+                        self.get_retry_after(ticket.limits),
+                    )
+                try:
+                    await asyncio.wait_for(waiter.wake.wait(), timeout=min(remaining, ADMISSION_POLL_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+                waiter.wake.clear()
+                if not self._has_waiters_ahead(waiter, ticket.limits) and await self._try_acquire(ticket):
+                    return self._admitted(ticket, started, queued=True)
+        finally:
+            self._waiters.remove(waiter)
+            # The runs queued behind this one may go now
+            self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        for waiter in self._waiters:
+            waiter.wake.set()
+
+    def release(self, ticket: AdmissionTicket) -> None:
+        if self._running.pop(ticket.lease_id, None) is None:
+            return
+        self.stats.record_run(time.monotonic() - ticket.admitted_at)
+        if not self.slots.blocking:
+            self.slots.release(ticket.lease_id, ticket.limits)
+            self._wake_waiters()
+            return
+        task = asyncio.get_running_loop().create_task(self._release_blocking(ticket))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _release_blocking(self, ticket: AdmissionTicket) -> None:
+        try:
+            await asyncio.to_thread(self.slots.release, ticket.lease_id, ticket.limits)
+        except Exception as e:
+            # The lease expires on its own once it stops being renewed
+            logger.warning(f"Failed to release admission lease {ticket.lease_id}: {e}")
+        self._wake_waiters()
+
+    async def _renew_leases(self) -> None:
+        """Keep the leases of running runs from expiring; stops once no run is left."""
+        try:
+            while self._running:
+                await asyncio.sleep(self.lease_seconds / 3)
+                try:
+                    await asyncio.to_thread(self.slots.renew, list(self._running))
+                except Exception as e:
+                    logger.warning(f"Failed to renew admission leases: {e}")
+        finally:
+            self._renewing = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters, queue wait percentiles and the runs this process is running or queueing right now."""
+        return {
+            "user_concurrency": self.user_concurrency,
+            "agent_concurrency": self.agent_concurrency,
+            "agent_limits": self.agent_limits,
+            "queue_size": self.queue_size,
+            "running": len(self._running),
+            "waiting": len(self._waiters),
+            **self.stats.snapshot(),
+        }
+
+
+_admission_controller: Optional[AdmissionController] = None
+_admission_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """The process-wide controller admitting agent runs."""
+    global _admission_controller
+    if _admission_controller is None:
+        with _admission_controller_lock:
+            if _admission_controller is None:
+                slots: Any = LocalAdmissionSlots()
+                if ADMISSION_BACKEND == "postgres":
+                    from db.session import db_engine
+
+                    slots = PostgresAdmissionSlots(db_engine)
+                _admission_controller = AdmissionController(
+                    agent_limits=parse_agent_limits(ADMISSION_AGENT_LIMITS), slots=slots
+                )
+    return _admission_controller
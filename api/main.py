@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
+from api.routes.metrics import metrics_router
 from api.routes.v1_router import v1_router
 from api.settings import api_settings
 
@@ -20,6 +21,9 @@ def create_app() -> FastAPI:
     # Add v1 router
     app.include_router(v1_router)
 
+    # Add the Prometheus scrape endpoint at its conventional path
+    app.include_router(metrics_router)
+
     # Add Middlewares
     app.add_middleware(
         CORSMiddleware,
@@ -1,15 +1,21 @@
+import time
 from enum import Enum
 from logging import getLogger
-from typing import AsyncGenerator, List, Optional
+from typing import Any, AsyncGenerator, Dict, List, Optional
 import pandas as pd
 from io import StringIO
 from agno.agent import Agent, AgentKnowledge
-from fastapi import APIRouter, HTTPException, status
-from fastapi.responses import StreamingResponse
+from agno.run.response import RunEvent
+from fastapi import APIRouter, HTTPException, Request, status
 from pydantic import BaseModel
 
 from agents.agno_assist import get_agno_assist_knowledge
 from agents.selector import AgentType, get_agent, get_available_agents
+from api.admission import AdmissionRejected, AdmissionTicket, get_admission_controller
+from api.run_streams import run_streams
+from api.sse import format_sse_event, sse_response
+from metrics.instruments import agent_first_token_seconds, record_agent_run, record_agent_tokens, record_tool_call
+from workflows.chunk_budget import TokenUsage
 
 logger = getLogger(__name__)
 
@@ -37,23 +43,110 @@ async def list_agents():
     return get_available_agents()
 
 
-async def chat_response_streamer(agent: Agent, message: str) -> AsyncGenerator:
+def get_tool_call_data(chunk: Any, phase: str) -> Dict[str, Any]:
+    tool = getattr(chunk, "tool", None)
+    data: Dict[str, Any] = {
+        "status": phase,
+        "tool_call_id": getattr(tool, "tool_call_id", None),
+        "tool_name": getattr(tool, "tool_name", None),
+        "tool_args": getattr(tool, "tool_args", None),
+    }
+    if phase == "completed":
+        data["result"] = getattr(tool, "result", None)
+        data["error"] = getattr(tool, "tool_call_error", None)
+    return data
+
+
+def get_tool_call_seconds(tool: Any) -> Optional[float]:
+    """The duration agno measured for a finished tool call, if any."""
+    metrics = getattr(tool, "metrics", None)
+    return getattr(metrics, "time", None) if metrics is not None else None
+
+
+async def chat_response_streamer(agent: Agent, message: str, agent_label: Optional[str] = None) -> AsyncGenerator:
     """
-    Stream agent responses chunk by chunk.
+    Stream an agent run as Server-Sent Events.
+
+    Events:
+        content: {"content": ...} for each delta of the response text
+        tool_call: {"status": "started" | "completed", "tool_name": ..., ...} around each tool call
+        usage: {"input_tokens": ..., "cached_input_tokens": ..., "output_tokens": ...} once the run ends
+        done: {"run_id": ..., "session_id": ...} as the last event
+        error: {"error": ...} if the run fails
+
+    Closing the generator (e.g. when the client disconnects) closes the agent's run stream too,
+    so the model stops generating.
+
+    The run's latency, time to first token, tool calls and tokens are recorded under `agent_label`
+    (see metrics/instruments.py).
 
     Args:
         agent: The agent instance to interact with
         message: User message to process
+        agent_label: The agent's metrics label; defaults to its agent_id
 
     Yields:
-        Text chunks from the agent response
+        SSE-framed events
     """
-    run_response = await agent.arun(message, stream=True)
-    async for chunk in run_response:
-        # chunk.content only contains the text response from the Agent.
-        # For advanced use cases, we should yield the entire chunk
-        # that contains the tool calls and intermediate steps.
-        yield chunk.content
+    label = agent_label or agent.agent_id or "unknown"
+    started = time.perf_counter()
+    first_token_at: Optional[float] = None
+    tool_started_at: Dict[Any, float] = {}
+    # Stays None if the run is cancelled, e.g. when nobody resumes it after a disconnect
+    outcome: Optional[str] = None
+    run_response = None
+    try:
+        run_response = await agent.arun(message, stream=True, stream_intermediate_steps=True)
+        async for chunk in run_response:
+            event = getattr(chunk, "event", None)
+            if event == RunEvent.run_response_content.value or event is None:
+                if chunk.content:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        agent_first_token_seconds.observe(first_token_at - started, agent=label)
+                    yield format_sse_event("content", {"content": chunk.content})
+            elif event == RunEvent.tool_call_started.value:
+                tool_started_at[getattr(getattr(chunk, "tool", None), "tool_call_id", None)] = time.perf_counter()
+                yield format_sse_event("tool_call", get_tool_call_data(chunk, "started"))
+            elif event == RunEvent.tool_call_completed.value:
+                tool = getattr(chunk, "tool", None)
+                tool_started = tool_started_at.pop(getattr(tool, "tool_call_id", None), None)
+                record_tool_call(
+                    label,
+                    getattr(tool, "tool_name", None),
+                    time.perf_counter() - tool_started if tool_started is not None else get_tool_call_seconds(tool),
+                    bool(getattr(tool, "tool_call_error", False)),
+                )
+                yield format_sse_event("tool_call", get_tool_call_data(chunk, "completed"))
+            elif event == RunEvent.run_error.value:
+                outcome = "error"
+                yield format_sse_event("error", {"error": chunk.content})
+                return
+        outcome = "completed"
+    except Exception as e:
+        outcome = "error"
+        logger.error(f"Agent run failed: {e}")
+        yield format_sse_event("error", {"error": str(e)})
+        return
+    finally:
+        aclose = getattr(run_response, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        record_agent_run(label, True, outcome or "cancelled", time.perf_counter() - started)
+
+    # The run's metrics are complete once the stream is exhausted
+    metrics = agent.run_response.metrics if agent.run_response is not None else None
+    usage = TokenUsage.from_metrics(metrics)
+    record_agent_tokens(label, usage)
+    yield format_sse_event(
+        "usage",
+        {
+            "input_tokens": usage.input_tokens,
+            "cached_input_tokens": usage.cached_input_tokens,
+            "output_tokens": usage.output_tokens,
+        },
+    )
+    yield format_sse_event("done", {"run_id": agent.run_id, "session_id": agent.session_id})
 
 
 class RunRequest(BaseModel):
@@ -67,19 +160,51 @@ class RunRequest(BaseModel):
 
 
 @agents_router.post("/{agent_id}/runs", status_code=status.HTTP_200_OK)
-async def create_agent_run(agent_id: AgentType, body: RunRequest):
+async def create_agent_run(agent_id: AgentType, body: RunRequest, request: Request):
     """
     Sends a message to a specific agent and returns the response.
 
+    Streaming responses are Server-Sent Events (see chat_response_streamer), with heartbeat
+    comments while the agent is busy. The run is buffered under the id in the `run` event and the
+    X-Run-Id header: a client that drops can resume it from GET /v1/runs/{run_id}/events with
+    Last-Event-ID. A run nobody resumes within RUN_STREAM_RESUME_SECONDS is cancelled.
+
+    Each user (the user_id, else the client address) and each agent may only have so many runs going
+    at once (see api/admission.py). Runs over the limit wait in a short queue; once it is full, or a
+    queued run waited too long, the request fails with 429 and a Retry-After header.
+
     Args:
         agent_id: The ID of the agent to interact with
         body: Request parameters including the message
+        request: The HTTP request, watched for client disconnects
 
     Returns:
         Either a streaming response or the complete agent response
     """
     logger.debug(f"RunRequest: {body}")
 
+    user_key = body.user_id or (request.client.host if request.client else "anonymous")
+    try:
+        ticket = await get_admission_controller().admit(user_key, agent_id.value)
+    except AdmissionRejected as e:
+        logger.info(f"Rejected run of {agent_id.value} for {user_key}: {e}")
+        record_agent_run(agent_id.value, body.stream, "rejected")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    try:
+        return await run_admitted_agent(agent_id, body, request, ticket)
+    except BaseException:
+        # Nothing holds the slot any more if the run failed or was never started
+        ticket.release()
+        raise
+
+
+async def run_admitted_agent(agent_id: AgentType, body: RunRequest, request: Request, ticket: AdmissionTicket):
+    """The part of create_agent_run that runs once it was admitted; the run releases `ticket` when it ends."""
     try:
         agent: Agent = get_agent(
             model_id=body.model.value,
@@ -91,12 +216,25 @@ async def create_agent_run(agent_id: AgentType, body: RunRequest):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
 
     if body.stream:
-        return StreamingResponse(
-            chat_response_streamer(agent, body.message),
-            media_type="text/event-stream",
-        )
+        stream = run_streams.start(chat_response_streamer(agent, body.message, agent_label=agent_id.value))
+        # The run goes on after the response is returned; it holds its slot until it ends or is cancelled
+        stream.task.add_done_callback(lambda _: ticket.release())
+        return sse_response(stream.subscribe(), request, headers={"X-Run-Id": stream.run_id})
     else:
-        response = await agent.arun(body.message, stream=False)
+        started = time.perf_counter()
+        try:
+            response = await agent.arun(body.message, stream=False)
+        except Exception:
+            record_agent_run(agent_id.value, False, "error", time.perf_counter() - started)
+            raise
+        finally:
+            ticket.release()
+        record_agent_run(agent_id.value, False, "completed", time.perf_counter() - started)
+        record_agent_tokens(agent_id.value, TokenUsage.from_metrics(response.metrics))
+        for tool in response.tools or []:
+            record_tool_call(
+                agent_id.value, tool.tool_name, get_tool_call_seconds(tool), bool(tool.tool_call_error)
+            )
         # In this case, the response.content only contains the text response from the Agent.
         # For advanced use cases, we should yield the entire response
         # that contains the tool calls and intermediate steps.
@@ -1,5 +1,9 @@
 from fastapi import APIRouter
 
+from agents.rate_scheduler import get_llm_scheduler
+from api.admission import get_admission_controller
+from db.session import get_pool_stats
+
 ######################################################
 ## Routes for the API Health
 ######################################################
@@ -14,3 +18,33 @@ def get_health():
     return {
         "status": "success",
     }
+
+
+@health_router.get("/health/db")
+def get_db_health():
+    """Checkout latency and saturation of the shared database connection pool"""
+
+    return {
+        "status": "success",
+        "pool": get_pool_stats(),
+    }
+
+
+@health_router.get("/health/llm")
+def get_llm_health():
+    """Queue waits of model calls per priority lane, and the requests and tokens per minute budgets"""
+
+    return {
+        "status": "success",
+        "scheduler": get_llm_scheduler().snapshot(),
+    }
+
+
+@health_router.get("/health/admission")
+def get_admission_health():
+    """Agent runs admitted, queued and rejected by the per-user and per-agent concurrency limits"""
+
+    return {
+        "status": "success",
+        "admission": get_admission_controller().snapshot(),
+    }
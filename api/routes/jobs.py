@@ -0,0 +1,202 @@
+import asyncio
+import os
+from datetime import datetime
+from logging import getLogger
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from pydantic import BaseModel
+
+from api.sse import format_sse_event, sse_response
+from db.session import db_engine
+from jobs.handlers import CSV_JOB, EXCEL_JOB, resolve_job_input_path
+from jobs.queue import Job, JobQueue
+from workflows.excel_upload import ExcelUploadError, get_excel_input_path
+
+logger = getLogger(__name__)
+
+######################################################
+## Routes for background file-analysis jobs
+######################################################
+
+jobs_router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+job_queue = JobQueue(db_engine)
+
+# Seconds between database polls of a job whose progress is being streamed
+JOB_PROGRESS_POLL_SECONDS = 2.0
+
+
+class ExcelJobRequest(BaseModel):
+    """Request model for a background ExcelProcessor run over a workbook stored through /v1/uploads/excel"""
+
+    niche: str
+    upload_id: str
+    chunk_size: str = "100"
+    max_concurrency: str = "1"
+    use_cache: str = "true"
+    prefilter: str = "true"
+    resume: str = "true"
+    user_id: Optional[str] = None
+    session_id: Optional[str] = None
+
+
+class CSVJobRequest(BaseModel):
+    """Request model for a background CSV keyword run over a file in the shared tmp/ directory"""
+
+    file_path: str
+    keyword_column: str = "keyword"
+    category_column: str = "category"
+    chunk_size: str = "100"
+    model_id: str = "o4-mini"
+    user_id: Optional[str] = None
+    session_id: Optional[str] = None
+
+
+class JobResponse(BaseModel):
+    """Status, progress and (once finished) result of a background job"""
+
+    job_id: str
+    kind: str
+    status: str
+    attempts: int
+    max_attempts: int
+    progress: Dict[str, Any]
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @classmethod
+    def from_job(cls, job: Job) -> "JobResponse":
+        return cls(
+            job_id=job.id,
+            kind=job.kind,
+            status=job.status,
+            attempts=job.attempts,
+            max_attempts=job.max_attempts,
+            progress=job.progress or {},
+            result=job.result,
+            error=job.error,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+        )
+
+
+def get_job_or_404(job_id: str) -> Job:
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {job_id} not found")
+    return job
+
+
+@jobs_router.post("/excel-keyword-processor", status_code=status.HTTP_202_ACCEPTED, response_model=JobResponse)
+def create_excel_job(body: ExcelJobRequest):
+    """
+    Queue an Excel keyword run for the job workers and return its job id right away.
+
+    Upload the workbook through /v1/uploads/excel first and pass its upload_id. Runs resume from
+    their checkpoints, so a job retried after a failure skips the chunks that were already saved.
+
+    Args:
+        body: Run inputs, with the same options as the streamed Excel run
+
+    Returns:
+        JobResponse: The queued job
+    """
+    try:
+        file_path = get_excel_input_path(body.upload_id)
+    except ExcelUploadError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Upload {body.upload_id} not found")
+
+    job = job_queue.enqueue(EXCEL_JOB, body.model_dump())
+    return JobResponse.from_job(job)
+
+
+@jobs_router.post("/csv-keyword-processor", status_code=status.HTTP_202_ACCEPTED, response_model=JobResponse)
+def create_csv_job(body: CSVJobRequest):
+    """
+    Queue a CSV keyword run for the job workers and return its job id right away.
+
+    Args:
+        body: Run inputs; file_path is relative to the shared tmp/ directory
+
+    Returns:
+        JobResponse: The queued job
+    """
+    try:
+        file_path = resolve_job_input_path(body.file_path)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File {body.file_path} not found")
+
+    job = job_queue.enqueue(CSV_JOB, body.model_dump())
+    return JobResponse.from_job(job)
+
+
+@jobs_router.get("", response_model=List[JobResponse])
+def list_jobs(job_status: Optional[str] = Query(None, alias="status"), limit: int = Query(50, ge=1, le=500)):
+    """The most recent jobs, optionally only those with the given status"""
+
+    return [JobResponse.from_job(job) for job in job_queue.list(job_status, limit)]
+
+
+@jobs_router.get("/{job_id}", response_model=JobResponse)
+def get_job(job_id: str):
+    """Status, latest progress and, once finished, the result or error of a job"""
+
+    return JobResponse.from_job(get_job_or_404(job_id))
+
+
+async def job_progress_streamer(job: Job) -> AsyncGenerator[str, None]:
+    """A `progress` event whenever the job's status or progress changes, then a `done` event."""
+    last_seen = None
+    while True:
+        response = JobResponse.from_job(job)
+        seen = (response.status, response.attempts, response.progress)
+        if seen != last_seen:
+            last_seen = seen
+            yield format_sse_event("progress", response.model_dump(mode="json"))
+        if job.finished:
+            yield format_sse_event("done", response.model_dump(mode="json"))
+            return
+        await asyncio.sleep(JOB_PROGRESS_POLL_SECONDS)
+        job = await asyncio.to_thread(get_job_or_404, job.id)
+
+
+@jobs_router.get("/{job_id}/progress")
+async def stream_job_progress(job_id: str, request: Request):
+    """
+    Follow a job's progress as Server-Sent Events until it finishes.
+
+    The job keeps running on its worker whether or not anyone follows it; disconnecting only stops
+    the stream.
+
+    Args:
+        job_id: The id returned when the job was queued
+        request: The HTTP request, watched for client disconnects
+
+    Returns:
+        A streaming response of progress events
+    """
+    job = await asyncio.to_thread(get_job_or_404, job_id)
+    return sse_response(job_progress_streamer(job), request)
+
+
+@jobs_router.post("/{job_id}/cancel", response_model=JobResponse)
+def cancel_job(job_id: str):
+    """
+    Cancel a queued or running job.
+
+    A running job stops at its worker's next heartbeat; results saved so far are kept.
+    """
+    get_job_or_404(job_id)
+    # The job may have been deleted between the two lookups
+    job = job_queue.cancel(job_id) or get_job_or_404(job_id)
+    logger.info(f"Cancelled job {job_id}")
+    return JobResponse.from_job(job)
@@ -0,0 +1,108 @@
+from typing import Iterable
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from agents.rate_scheduler import get_llm_scheduler
+from api.admission import get_admission_controller
+from api.routes.jobs import job_queue
+from api.run_streams import run_streams
+from db.session import get_pool_stats
+from jobs.queue import JOB_STATUSES
+from metrics.registry import MetricFamily, counter, gauge, registry
+
+######################################################
+## Routes for Prometheus metrics
+######################################################
+
+metrics_router = APIRouter(tags=["Metrics"])
+
+# Content type of the Prometheus text exposition format
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def collect_db_pool() -> Iterable[MetricFamily]:
+    stats = get_pool_stats()
+    return [
+        counter("db_pool_checkouts_total", "Connections checked out of the pool", stats["checkouts"]),
+        counter("db_pool_checkout_timeouts_total", "Checkouts that timed out waiting", stats["timeouts"]),
+        counter(
+            "db_pool_checkout_wait_seconds_total",
+            "Time spent waiting for pool connections",
+            stats["checkout_wait_seconds_total"],
+        ),
+        gauge("db_pool_size", "Connections the pool keeps open", stats.get("pool_size", 0)),
+        gauge("db_pool_max_overflow", "Connections the pool may open beyond its size", stats.get("max_overflow", 0)),
+        gauge("db_pool_checked_out", "Connections in use", stats.get("checked_out", 0)),
+        gauge("db_pool_saturation", "Share of the pool's connections in use", stats.get("saturation", 0.0)),
+    ]
+
+
+def collect_run_streams() -> Iterable[MetricFamily]:
+    streams = list(run_streams.streams.values())
+    return [
+        gauge("run_streams_in_flight", "Streamed agent runs still running", sum(not s.finished for s in streams)),
+        gauge("run_streams_buffered", "Streamed agent runs kept for resumption, running or finished", len(streams)),
+        gauge("run_streams_subscribers", "Clients following streamed agent runs", sum(s.subscribers for s in streams)),
+    ]
+
+
+def collect_llm_scheduler() -> Iterable[MetricFamily]:
+    stats = get_llm_scheduler().snapshot()
+    calls = counter("llm_calls_total", "Model calls admitted by the rate scheduler, by lane")
+    delayed = counter("llm_calls_delayed_total", "Model calls that waited for the rate budget, by lane")
+    waiting = gauge("llm_calls_waiting", "Model calls waiting for the rate budget, by lane")
+    wait_seconds = counter("llm_queue_wait_seconds_total", "Time model calls waited for the rate budget, by lane")
+    for lane, lane_stats in stats["lanes"].items():
+        calls.add(lane_stats["calls"], lane=lane)
+        delayed.add(lane_stats["delayed"], lane=lane)
+        waiting.add(lane_stats["waiting"], lane=lane)
+        wait_seconds.add(lane_stats["queue_wait_seconds_total"], lane=lane)
+    return [
+        calls,
+        delayed,
+        waiting,
+        wait_seconds,
+        counter("llm_rate_limited_responses_total", "429s from the model API", stats["rate_limited_responses"]),
+    ]
+
+
+def collect_admission() -> Iterable[MetricFamily]:
+    stats = get_admission_controller().snapshot()
+    rejected = counter("agent_admission_rejected_total", "Agent runs rejected with 429, by reason")
+    rejected.add(stats["rejected_queue_full"], reason="queue_full")
+    rejected.add(stats["rejected_timeout"], reason="timeout")
+    return [
+        gauge("agent_admission_running", "Agent runs holding an admission slot in this process", stats["running"]),
+        gauge("agent_admission_waiting", "Agent runs queued for an admission slot in this process", stats["waiting"]),
+        counter("agent_admission_queued_total", "Agent runs that waited for an admission slot", stats["queued"]),
+        rejected,
+    ]
+
+
+def collect_jobs() -> Iterable[MetricFamily]:
+    counts = job_queue.count_by_status()
+    jobs = gauge("background_jobs", "Background Excel/CSV jobs, by status")
+    for job_status in JOB_STATUSES:
+        jobs.add(counts.get(job_status, 0), status=job_status)
+    return [jobs]
+
+
+for name, collector in (
+    ("db_pool", collect_db_pool),
+    ("run_streams", collect_run_streams),
+    ("llm_scheduler", collect_llm_scheduler),
+    ("admission", collect_admission),
+    ("jobs", collect_jobs),
+):
+    registry.register_collector(name, collector)
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    """
+    Metrics of this process in the Prometheus text format: agent runs (latency, time to first token,
+    tokens, tool calls), Excel/CSV chunk throughput, the database pool, in-flight streams, model rate
+    scheduling, admission control and the background job queue.
+    """
+    return PlainTextResponse(registry.render(), media_type=METRICS_CONTENT_TYPE)
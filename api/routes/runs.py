@@ -0,0 +1,42 @@
+from logging import getLogger
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request, status
+
+from api.run_streams import parse_last_event_id, run_streams
+from api.sse import sse_response
+
+logger = getLogger(__name__)
+
+######################################################
+## Routes for resuming streamed runs
+######################################################
+
+runs_router = APIRouter(prefix="/runs", tags=["Runs"])
+
+
+@runs_router.get("/{run_id}/events", status_code=status.HTTP_200_OK)
+async def resume_run_events(run_id: str, request: Request, last_event_id: Optional[str] = Header(None)):
+    """
+    Re-attach to a streamed agent or Excel run.
+
+    Events after the Last-Event-ID header are replayed from the run's buffer, then the live run is
+    followed until it ends. Without the header the run is replayed from its first buffered event.
+
+    Args:
+        run_id: The id from the run's `run` event or X-Run-Id header
+        request: The HTTP request, watched for client disconnects
+        last_event_id: The id of the last event the client received
+
+    Returns:
+        A streaming response of the run's events
+    """
+    stream = run_streams.get(run_id)
+    if stream is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Run {run_id} not found or its events have expired",
+        )
+
+    logger.debug(f"Resuming run {run_id} after event {last_event_id}")
+    return sse_response(stream.subscribe(parse_last_event_id(last_event_id)), request, headers={"X-Run-Id": run_id})
@@ -0,0 +1,151 @@
+from logging import getLogger
+from typing import Optional
+from uuid import uuid4
+
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from pydantic import BaseModel
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from workflows.excel_upload import ExcelUploadError, ExcelUploadWriter, get_excel_input_path
+
+logger = getLogger(__name__)
+
+######################################################
+## Routes for streaming file uploads
+######################################################
+
+uploads_router = APIRouter(prefix="/uploads", tags=["Uploads"])
+
+
+class UploadResponse(BaseModel):
+    """Response model for a stored upload"""
+
+    upload_id: str
+    file_path: str
+    size_bytes: int
+
+
+class _MultipartFileSink:
+    """
+    Collect the bytes of the `file` part of a multipart body as it is parsed.
+
+    The parser's callbacks run on the event loop, so they only buffer; the route hands each request
+    chunk's bytes to the ExcelUploadWriter in a worker thread with take().
+    """
+
+    def __init__(self, field_name: str = "file"):
+        self.field_name = field_name
+        self.found = False
+        self._pending = bytearray()
+        self._header_field = b""
+        self._header_value = b""
+        self._in_file_part = False
+
+    def on_part_begin(self) -> None:
+        self._in_file_part = False
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self._header_field.lower() == b"content-disposition":
+            _, options = parse_options_header(self._header_value)
+            if options.get(b"name") == self.field_name.encode():
+                if self.found:
+                    raise ExcelUploadError(f"Only one '{self.field_name}' part is allowed")
+                self._in_file_part = True
+                self.found = True
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file_part:
+            self._pending += data[start:end]
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._pending)
+
+    def take(self) -> bytes:
+        """The file bytes parsed since the last call."""
+        data = bytes(self._pending)
+        self._pending.clear()
+        return data
+
+    def on_part_end(self) -> None:
+        self._in_file_part = False
+
+
+@uploads_router.post("/excel", status_code=status.HTTP_201_CREATED, response_model=UploadResponse)
+async def upload_excel_file(request: Request, upload_id: Optional[str] = Query(None)):
+    """
+    Stream an Excel workbook to disk for the Excel keyword workflow.
+
+    Accepts either a multipart/form-data body with a `file` field or the raw workbook bytes
+    (e.g. `application/octet-stream`). The body is written to disk as it arrives and is rejected
+    as soon as its signature or size is invalid; writes go to a worker thread one request chunk at
+    a time, so the event loop never waits on the disk. Pass the returned `upload_id` to the workflow
+    instead of a base64 string.
+
+    Args:
+        request: The incoming request whose body is streamed
+        upload_id: Optional id to store the upload under (usually the workflow session id)
+
+    Returns:
+        UploadResponse: The upload id, stored file path and size
+    """
+    upload_id = upload_id or str(uuid4())
+    try:
+        file_path = get_excel_input_path(upload_id)
+    except ExcelUploadError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    writer = ExcelUploadWriter(file_path)
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    try:
+        if content_type == b"multipart/form-data":
+            boundary = options.get(b"boundary")
+            if not boundary:
+                raise ExcelUploadError("Missing multipart boundary")
+            sink = _MultipartFileSink()
+            parser = MultipartParser(
+                boundary,
+                callbacks={
+                    "on_part_begin": sink.on_part_begin,
+                    "on_header_field": sink.on_header_field,
+                    "on_header_value": sink.on_header_value,
+                    "on_header_end": sink.on_header_end,
+                    "on_part_data": sink.on_part_data,
+                    "on_part_end": sink.on_part_end,
+                },
+            )
+            async for chunk in request.stream():
+                parser.write(chunk)
+                if sink.pending:
+                    await run_in_threadpool(writer.write, sink.take())
+            parser.finalize()
+            if sink.pending:
+                await run_in_threadpool(writer.write, sink.take())
+            if not sink.found:
+                raise ExcelUploadError("Multipart body has no 'file' field")
+        else:
+            async for chunk in request.stream():
+                await run_in_threadpool(writer.write, chunk)
+        await run_in_threadpool(writer.finish)
+    except ExcelUploadError as e:
+        writer.abort()
+        status_code = (
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE if writer.size > writer.max_bytes else status.HTTP_400_BAD_REQUEST
+        )
+        raise HTTPException(status_code=status_code, detail=str(e))
+    except Exception as e:
+        writer.abort()
+        logger.error(f"Error storing upload {upload_id}: {e}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to read upload body")
+
+    logger.info(f"Stored Excel upload {upload_id} ({writer.size} bytes) at {file_path}")
+    return UploadResponse(upload_id=upload_id, file_path=file_path, size_bytes=writer.size)
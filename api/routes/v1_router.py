@@ -1,11 +1,17 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, status
 from fastapi.responses import FileResponse
 import os
 from logging import getLogger
 
 from api.routes.agents import agents_router
 from api.routes.health import health_router
+from api.routes.jobs import jobs_router
 from api.routes.playground import playground_router
+from api.routes.runs import runs_router
+from api.routes.uploads import uploads_router
+from api.routes.workflows import workflows_router
+from starlette.concurrency import run_in_threadpool
+from workflows.session_results import EXPORT_FORMATS, get_session_export_path, get_session_result_store
 
 logger = getLogger(__name__)
 
@@ -13,38 +19,56 @@ v1_router = APIRouter(prefix="/v1")
 v1_router.include_router(health_router)
 v1_router.include_router(agents_router)
 v1_router.include_router(playground_router)
+v1_router.include_router(uploads_router)
+v1_router.include_router(workflows_router)
+v1_router.include_router(runs_router)
+v1_router.include_router(jobs_router)
 
 # Create a separate router for file downloads
 download_router = APIRouter(prefix="/downloads", tags=["Downloads"])
 
 @download_router.get("/excel/{session_id}")
-async def download_excel_file(session_id: str):
+async def download_excel_file(session_id: str, file_format: str = Query("xlsx", alias="format")):
     """
     Download the processed Excel file for a specific session.
     
     Args:
         session_id: The session ID to download the file for
+        file_format: Output format: `xlsx` (default), `csv` or `parquet`
         
     Returns:
         The Excel file as a downloadable response
     """
-    file_path = f"tmp/session_keywords_{session_id}.xlsx"
-    
+    file_format = file_format.lower()
+    if file_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported format '{file_format}', expected one of: {', '.join(EXPORT_FORMATS)}"
+        )
+
+    # Build the file from the session result store if it is missing or stale
+    try:
+        file_path = await run_in_threadpool(get_session_result_store().ensure_export, session_id, file_format)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    file_path = file_path or get_session_export_path(session_id, file_format)
+
     logger.info(f"Download request for session {session_id}, file path: {file_path}")
-    
+
     if not os.path.exists(file_path):
         logger.error(f"File not found: {file_path}")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Excel file not found for session {session_id}"
+            detail=f"{file_format} file not found for session {session_id}"
         )
     
     logger.info(f"File found, serving: {file_path}")
     
+    extension, media_type = EXPORT_FORMATS[file_format]
     return FileResponse(
         path=file_path,
-        filename=f"keywords_analysis_{session_id}.xlsx",
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        filename=f"keywords_analysis_{session_id}.{extension}",
+        media_type=media_type
     )
 
 # Include the download router in the main v1 router
@@ -0,0 +1,81 @@
+from logging import getLogger
+from typing import AsyncGenerator, Optional, cast
+
+from agno.workflow import WorkflowCompletedEvent
+from fastapi import APIRouter, Request, status
+from pydantic import BaseModel
+
+from api.run_streams import run_streams
+from api.sse import format_sse_event, sse_response
+from workflows.excel_workflow import ExcelProcessor, get_excel_processor
+
+logger = getLogger(__name__)
+
+######################################################
+## Routes for running workflows on the event loop
+######################################################
+
+workflows_router = APIRouter(prefix="/workflows", tags=["Workflows"])
+
+# Template for Excel runs; every request works on its own copy
+excel_workflow = get_excel_processor(debug_mode=False)
+
+
+class ExcelRunRequest(BaseModel):
+    """Request model for an ExcelProcessor run, with the same inputs as the playground workflow"""
+
+    niche: str
+    upload_id: str = ""
+    base64_string: str = ""
+    chunk_size: str = "100"
+    max_concurrency: str = "1"
+    use_cache: str = "true"
+    prefilter: str = "true"
+    resume: str = "true"
+    user_id: Optional[str] = None
+    session_id: Optional[str] = None
+
+
+async def excel_run_streamer(workflow: ExcelProcessor, body: ExcelRunRequest) -> AsyncGenerator:
+    """
+    Stream the events of an Excel run as Server-Sent Events.
+
+    Args:
+        workflow: A fresh copy of the ExcelProcessor workflow
+        body: Run inputs
+
+    Yields:
+        A `progress` event per progress message, then the `completed` event, each carrying the
+        same JSON document as the playground
+    """
+    run_input = body.model_dump(exclude={"user_id", "session_id"})
+    async for event in workflow.arun(**run_input, session_id=body.session_id):
+        event_name = "completed" if isinstance(event, WorkflowCompletedEvent) else "progress"
+        yield format_sse_event(event_name, event.to_dict())
+
+
+@workflows_router.post("/excel-keyword-processor/runs", status_code=status.HTTP_200_OK)
+async def create_excel_run(body: ExcelRunRequest, request: Request):
+    """
+    Runs the Excel keyword workflow through its async path.
+
+    Unlike the playground route, which iterates the synchronous run() on a thread pool worker for the
+    whole run, workbook parsing and result writes go to worker threads one step at a time and chunks
+    are analyzed with Agent.arun, so a long Excel job leaves the event loop free for other requests.
+
+    The run is buffered under the id in the `run` event and the X-Run-Id header, so a client that
+    drops can resume it from GET /v1/runs/{run_id}/events with Last-Event-ID.
+
+    Args:
+        body: Run inputs, including the upload to analyze
+        request: The HTTP request, watched for client disconnects
+
+    Returns:
+        A streaming response of run events
+    """
+    logger.debug(f"ExcelRunRequest: niche={body.niche}, upload_id={body.upload_id}, session_id={body.session_id}")
+
+    workflow = cast(ExcelProcessor, excel_workflow.deep_copy(update={"session_id": body.session_id}))
+    workflow.user_id = body.user_id
+    stream = run_streams.start(excel_run_streamer(workflow, body))
+    return sse_response(stream.subscribe(), request, headers={"X-Run-Id": stream.run_id})
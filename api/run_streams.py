@@ -0,0 +1,177 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from logging import getLogger
+from os import getenv
+from typing import AsyncGenerator, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from api.sse import format_sse_event
+
+logger = getLogger(__name__)
+
+# Events kept per run for replay; older ones are dropped first
+RUN_STREAM_BUFFER_EVENTS = int(getenv("RUN_STREAM_BUFFER_EVENTS", "2000"))
+# Seconds a finished run's events stay available for replay
+RUN_STREAM_TTL_SECONDS = float(getenv("RUN_STREAM_TTL_SECONDS", "300"))
+# Seconds a run keeps going with no client attached before it is cancelled; 0 cancels right away
+RUN_STREAM_RESUME_SECONDS = float(getenv("RUN_STREAM_RESUME_SECONDS", "30"))
+
+
+class RunStream:
+    """
+    The events of one streamed run in a bounded ring buffer, numbered from 1.
+
+    The run is driven by a task of its own, so it survives its client disconnecting; clients
+    attach with subscribe() and can resume after the last event id they received.
+    """
+
+    def __init__(self, run_id: str, max_events: int = RUN_STREAM_BUFFER_EVENTS):
+        self.run_id = run_id
+        self.events: Deque[Tuple[int, str]] = deque(maxlen=max_events)
+        self.last_event_id = 0
+        self.finished = False
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        # The task driving the run, set by RunStreamRegistry.start() before anyone can subscribe
+        self.task: asyncio.Task
+        self._changed = asyncio.Condition()
+        self._cancel_handle: Optional[asyncio.TimerHandle] = None
+
+    def record(self, event: str) -> None:
+        """Buffer an event without waking subscribers; append() is the async, notifying version."""
+        self.last_event_id += 1
+        self.events.append((self.last_event_id, event))
+
+    async def append(self, event: str) -> None:
+        async with self._changed:
+            self.record(event)
+            self._changed.notify_all()
+
+    async def finish(self) -> None:
+        async with self._changed:
+            self.finished = True
+            self.finished_at = time.monotonic()
+            self._changed.notify_all()
+
+    def events_after(self, event_id: int) -> List[Tuple[int, str]]:
+        return [(seq, event) for seq, event in self.events if seq > event_id]
+
+    @property
+    def first_event_id(self) -> int:
+        return self.events[0][0] if self.events else self.last_event_id + 1
+
+    async def subscribe(self, last_event_id: int = 0) -> AsyncGenerator[str, None]:
+        """
+        Yield the events after `last_event_id`, then follow the live run until it finishes.
+
+        If the buffer no longer holds the event right after `last_event_id`, a `gap` event says
+        which events were lost before replay continues from the oldest one kept.
+        """
+        self.attach()
+        sent = last_event_id
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: self.last_event_id > sent or self.finished)
+                pending = self.events_after(sent)
+                if pending and pending[0][0] > sent + 1:
+                    yield format_sse_event("gap", {"missed_from": sent + 1, "missed_to": pending[0][0] - 1})
+                for seq, event in pending:
+                    yield f"id: {seq}\n{event}"
+                    sent = seq
+                if self.finished and sent >= self.last_event_id:
+                    return
+        finally:
+            self.detach()
+
+    def attach(self) -> None:
+        self.subscribers += 1
+        if self._cancel_handle is not None:
+            self._cancel_handle.cancel()
+            self._cancel_handle = None
+
+    def detach(self) -> None:
+        self.subscribers -= 1
+        if self.subscribers > 0 or self.finished:
+            return
+        if RUN_STREAM_RESUME_SECONDS <= 0:
+            self.cancel_unattended()
+        else:
+            loop = asyncio.get_running_loop()
+            self._cancel_handle = loop.call_later(RUN_STREAM_RESUME_SECONDS, self.cancel_unattended)
+
+    def cancel_unattended(self) -> None:
+        """Stop the run if no client came back for it, so it does not keep using the model."""
+        self._cancel_handle = None
+        if self.subscribers == 0 and not self.finished:
+            logger.info(f"No client attached to run {self.run_id}, cancelling it")
+            self.task.cancel()
+
+
+class RunStreamRegistry:
+    """Live and recently finished run streams of this process, by run id."""
+
+    def __init__(self, ttl_seconds: float = RUN_STREAM_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.streams: Dict[str, RunStream] = {}
+
+    def start(self, events: AsyncIterator[str], run_id: Optional[str] = None) -> RunStream:
+        """
+        Drive `events` in a background task, buffering every event for its subscribers.
+
+        The first event, `run`, carries the run id that clients reconnect with.
+        """
+        self.evict_expired()
+        stream = RunStream(run_id or str(uuid.uuid4()))
+        stream.record(format_sse_event("run", {"run_id": stream.run_id}))
+        self.streams[stream.run_id] = stream
+        stream.task = asyncio.create_task(self._pump(stream, events))
+        return stream
+
+    def get(self, run_id: str) -> Optional[RunStream]:
+        self.evict_expired()
+        return self.streams.get(run_id)
+
+    def _expire(self, stream: RunStream) -> None:
+        """Drop a finished run once its TTL is up, unless its id was reused since."""
+        if self.streams.get(stream.run_id) is stream:
+            del self.streams[stream.run_id]
+
+    def evict_expired(self) -> None:
+        now = time.monotonic()
+        expired = [
+            run_id
+            for run_id, stream in self.streams.items()
+            if stream.finished_at is not None and now - stream.finished_at > self.ttl_seconds
+        ]
+        for run_id in expired:
+            del self.streams[run_id]
+
+    async def _pump(self, stream: RunStream, events: AsyncIterator[str]) -> None:
+        try:
+            async for event in events:
+                await stream.append(event)
+        except asyncio.CancelledError:
+            await stream.append(format_sse_event("cancelled", {"run_id": stream.run_id}))
+        except Exception as e:
+            logger.error(f"Run {stream.run_id} failed: {e}")
+            await stream.append(format_sse_event("error", {"error": str(e)}))
+        finally:
+            aclose = getattr(events, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            await stream.finish()
+            # Expire the run even if no other run is started or looked up in the meantime
+            asyncio.get_running_loop().call_later(self.ttl_seconds, self._expire, stream)
+
+
+run_streams = RunStreamRegistry()
+
+
+def parse_last_event_id(value: Optional[str]) -> int:
+    """The numeric Last-Event-ID of a reconnect; anything else replays from the start."""
+    try:
+        return max(0, int(value)) if value else 0
+    except ValueError:
+        return 0
@@ -0,0 +1,89 @@
+import asyncio
+import json
+from logging import getLogger
+from os import getenv
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+logger = getLogger(__name__)
+
+# Seconds without an event before a heartbeat comment is sent, so proxies keep the stream open
+# and a client that went away is noticed even while the model is silent
+SSE_HEARTBEAT_SECONDS = float(getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_HEARTBEAT = ": heartbeat\n\n"
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Stop nginx from buffering the stream
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse_event(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    """One Server-Sent Event with a JSON payload."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    # JSON never contains raw newlines, so the payload always fits on one data line
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_with_heartbeats(
+    events: AsyncIterator[str],
+    request: Optional[Request] = None,
+    heartbeat_seconds: float = SSE_HEARTBEAT_SECONDS,
+) -> AsyncGenerator[str, None]:
+    """
+    Relay SSE events, sending heartbeats while the source is idle and stopping it when the client leaves.
+
+    The source is advanced in a task, so a heartbeat can go out while a model call is still pending.
+    When the client disconnects (noticed between events and heartbeats, or through the response
+    being cancelled), the pending step is cancelled and the source is closed, which stops the
+    underlying agent run instead of letting it stream into the void.
+    """
+    iterator = events.__aiter__()
+    next_event: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.ensure_future(iterator.__anext__())
+            done, _ = await asyncio.wait({next_event}, timeout=heartbeat_seconds)
+            if request is not None and await request.is_disconnected():
+                logger.info("Client disconnected, cancelling the stream")
+                break
+            if not done:
+                yield SSE_HEARTBEAT
+                continue
+            try:
+                event = next_event.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                next_event = None
+            yield event
+    finally:
+        if next_event is not None:
+            next_event.cancel()
+            try:
+                await next_event
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+            except Exception as e:
+                logger.debug(f"Cancelled stream step raised: {e}")
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def sse_response(
+    events: AsyncIterator[str], request: Optional[Request] = None, headers: Optional[Dict[str, str]] = None
+) -> StreamingResponse:
+    """A text/event-stream response relaying `events` with heartbeats and disconnect handling."""
+    return StreamingResponse(
+        stream_with_heartbeats(events, request),
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, **(headers or {})},
+    )
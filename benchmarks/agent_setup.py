@@ -0,0 +1,83 @@
+"""
+Per-request agent setup cost: building agents from scratch vs copying cached templates.
+
+For every agent, the benchmark times the request-path setup of /v1/agents/{agent_id}/runs:
+
+- build:  the agent's factory, as get_agent() did before templates were cached
+- copy:   get_agent(), which copies the cached template and binds user_id and session_id
+
+and reports the mean and p95 setup time and the peak memory allocated while setting up one agent
+(tracemalloc). Building includes creating the storage and memory backends, which inspect their
+tables through the shared engine, so setup time depends on the database round trip.
+
+Usage: python -m benchmarks.agent_setup [--requests 200] [--model gpt-4.1]
+(the agents connect to Postgres, so run it with the API's DB_* settings and database)
+"""
+
+import argparse
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from agno.agent import Agent
+
+
+def measure(setup: Callable[[int], Agent], requests: int) -> Dict[str, float]:
+    timings: List[float] = []
+    peaks: List[int] = []
+    tracemalloc.start()
+    try:
+        for request in range(requests):
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            started = time.perf_counter()
+            agent = setup(request)
+            timings.append((time.perf_counter() - started) * 1000)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+            del agent
+    finally:
+        tracemalloc.stop()
+    timings.sort()
+    return {
+        "mean_ms": statistics.mean(timings),
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+        "peak_kb": statistics.mean(peaks) / 1024,
+    }
+
+
+def main(requests: int, model_id: str) -> None:
+    from agents.selector import AGENT_FACTORIES, AgentType, get_agent, get_agent_template
+
+    print(f"{requests} requests per agent and mode, model {model_id}")
+    print(f"{'agent':<16}{'mode':<8}{'mean ms':>10}{'p95 ms':>10}{'peak KB':>10}")
+    for agent_type in AgentType:
+        factory = AGENT_FACTORIES[agent_type]
+        # Build the template outside the measurement; it is paid once per process
+        get_agent_template(agent_type, model_id=model_id, debug_mode=False)
+        modes = {
+            "build": lambda request: factory(
+                model_id=model_id, user_id=f"user-{request}", session_id=f"session-{request}", debug_mode=False
+            ),
+            "copy": lambda request: get_agent(
+                model_id=model_id,
+                agent_id=agent_type,
+                user_id=f"user-{request}",
+                session_id=f"session-{request}",
+                debug_mode=False,
+            ),
+        }
+        for mode, setup in modes.items():
+            stats = measure(setup, requests)
+            print(
+                f"{agent_type.value:<16}{mode:<8}{stats['mean_ms']:>10.2f}"
+                f"{stats['p95_ms']:>10.2f}{stats['peak_kb']:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--model", default="gpt-4.1")
+    args = parser.parse_args()
+    main(args.requests, args.model)
@@ -0,0 +1,132 @@
+"""
+Keyword throughput and losses when 10% of model calls fail.
+
+A simulated analyzer answers a chunk after a fixed latency; a share of its calls fail, half of them
+with a transient error (a 429 from the provider) and half with an answer that does not parse. A few
+keywords are "poison" and make any call that contains them fail to parse. Three scenarios analyze the
+same chunks:
+
+- clean:  no injected failures or poison keywords, every chunk analyzed with one call
+- drop:   injected failures, a failed chunk is dropped (the behaviour before ChunkRetrier)
+- retry:  injected failures, ChunkRetrier retries with backoff and splits chunks that keep failing
+
+Throughput counts analyzed keywords per second of wall time; lost keywords are the ones without an
+answer at the end. With retries, only the poison keywords should be lost.
+
+Usage: python -m benchmarks.chunk_retry [--chunks 100] [--chunk-size 100] [--failure-rate 0.1]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+MODEL_LATENCY_SECONDS = 0.02
+# Extra latency per keyword, so smaller parts are cheaper to analyze than whole chunks
+KEYWORD_LATENCY_SECONDS = 0.0002
+POISON_EVERY = 2_500
+
+
+@dataclass
+class FakeResponse:
+    content: Optional[List[str]]
+    metrics: Dict[str, List[int]]
+
+
+class FlakyAnalyzer:
+    def __init__(self, failure_rate: float, seed: int, poison: bool = True):
+        from agno.exceptions import ModelProviderError
+
+        self.failure_rate = failure_rate
+        self.poison = poison
+        self.rng = random.Random(seed)
+        self.error_type = ModelProviderError
+
+    async def arun(self, message: str) -> FakeResponse:
+        keywords = [line.split("\t")[0] for line in message.splitlines()[3:]]
+        await asyncio.sleep(MODEL_LATENCY_SECONDS + KEYWORD_LATENCY_SECONDS * len(keywords))
+        draw = self.rng.random()
+        if draw < self.failure_rate / 2:
+            raise self.error_type("Rate limit reached", status_code=429)
+        metrics = {"input_tokens": [len(message) // 4], "output_tokens": [len(keywords) * 8]}
+        if draw < self.failure_rate or (self.poison and any(keyword.endswith("#poison") for keyword in keywords)):
+            return FakeResponse(content=None, metrics=metrics)
+        return FakeResponse(content=keywords, metrics=metrics)
+
+
+def make_chunks(chunks: int, chunk_size: int) -> List[Tuple[List[str], List[str]]]:
+    made = []
+    for chunk in range(chunks):
+        keywords = []
+        for row in range(chunk * chunk_size, (chunk + 1) * chunk_size):
+            keywords.append(f"herbal remedy {row}" + ("#poison" if row % POISON_EVERY == POISON_EVERY - 1 else ""))
+        made.append((keywords, ["beginners"] * chunk_size))
+    return made
+
+
+async def analyze_all(
+    scenario: str, chunks: List[Tuple[List[str], List[str]]], failure_rate: float, concurrency: int
+) -> Tuple[int, int, int]:
+    """Analyzed keywords, lost keywords and model calls of one scenario."""
+    from workflows.chunk_retry import ChunkRetrier, RetryPolicy
+    from workflows.keyword_prompt import build_keyword_message, format_keyword_table
+
+    analyzer = FlakyAnalyzer(0.0 if scenario == "clean" else failure_rate, seed=7, poison=scenario != "clean")
+    # Short delays, scaled to the simulated latency
+    retrier = ChunkRetrier(
+        lambda response: response.content, policy=RetryPolicy(base_delay=0.02, max_delay=0.5), rng=random.Random(7)
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+    totals = {"analyzed": 0, "lost": 0, "calls": 0}
+
+    def build_message(keywords: List[str], categories: List[str]) -> str:
+        return build_keyword_message("Herbalism", format_keyword_table(keywords, categories))
+
+    async def analyze(keywords: List[str], categories: List[str]) -> None:
+        async with semaphore:
+            if scenario == "retry":
+                result = await retrier.aanalyze(analyzer.arun, build_message, keywords, categories)
+                totals["calls"] += result.calls
+                lost = len(result.unrecoverable_keywords)
+            else:
+                totals["calls"] += 1
+                try:
+                    response = await analyzer.arun(build_message(keywords, categories))
+                    lost = 0 if response.content is not None else len(keywords)
+                except Exception:
+                    lost = len(keywords)
+            totals["analyzed"] += len(keywords) - lost
+            totals["lost"] += lost
+
+    await asyncio.gather(*(analyze(keywords, categories) for keywords, categories in chunks))
+    return totals["analyzed"], totals["lost"], totals["calls"]
+
+
+async def main(chunks: int, chunk_size: int, failure_rate: float, concurrency: int) -> None:
+    from agno.utils.log import logger
+
+    # The retrier logs every retry and split
+    logger.disabled = True
+    work = make_chunks(chunks, chunk_size)
+    print(
+        f"{chunks} chunks of {chunk_size} keywords, {failure_rate:.0%} failed calls, "
+        f"{concurrency} chunks in flight, 1 poison keyword every {POISON_EVERY}"
+    )
+    print(f"{'scenario':<10}{'calls':>8}{'analyzed':>10}{'lost':>8}{'seconds':>10}{'keywords/s':>12}")
+    for scenario in ("clean", "drop", "retry"):
+        started = time.perf_counter()
+        analyzed, lost, calls = await analyze_all(scenario, work, failure_rate, concurrency)
+        seconds = time.perf_counter() - started
+        print(f"{scenario:<10}{calls:>8}{analyzed:>10}{lost:>8}{seconds:>10.2f}{analyzed / seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.chunks, args.chunk_size, args.failure_rate, args.concurrency))
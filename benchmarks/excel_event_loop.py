@@ -0,0 +1,184 @@
+"""
+Latency of concurrent agent runs while an Excel job is being processed in the same API worker.
+
+Three scenarios are measured against one in-process ASGI app:
+
+- idle:  no Excel job running
+- run:   the Excel job streamed from the synchronous ExcelProcessor.run(), as the playground does
+- arun:  the Excel job streamed from ExcelProcessor.arun() through /v1/workflows/excel-keyword-processor/runs
+
+Model calls are simulated so the benchmark needs no API key: Agent.run sleeps (blocking) and
+Agent.arun awaits for the same time. /v1/agents/{agent_id}/runs streams a storage-free agent
+through the real chat_response_streamer, and is called by several clients in parallel for as
+long as the Excel job runs. Agent latency should stay flat across the three scenarios.
+
+Usage: python -m benchmarks.excel_event_loop [--rows 10000] [--chunk-size 500] [--clients 8]
+(importing the agent routes reads the DB_* settings, so run it with the API's environment)
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+import pandas as pd
+
+MODEL_LATENCY_SECONDS = 0.05
+
+
+async def fake_arun(self, message, stream: bool = False, **kwargs):
+    from agno.run.response import RunResponse
+
+    from workflows.excel_workflow import ExcelChunkAnalysis
+
+    await asyncio.sleep(MODEL_LATENCY_SECONDS)
+    if self.response_model is ExcelChunkAnalysis:
+        return RunResponse(content=ExcelChunkAnalysis(audience_analysis="beginners", valuable_keywords=[]))
+    if not stream:
+        return RunResponse(content="ok")
+
+    async def stream_chunks():
+        for word in ("simulated ", "agent ", "reply"):
+            yield RunResponse(content=word)
+
+    return stream_chunks()
+
+
+def fake_run(self, message, **kwargs):
+    from agno.run.response import RunResponse
+
+    from workflows.excel_workflow import ExcelChunkAnalysis
+
+    time.sleep(MODEL_LATENCY_SECONDS)
+    return RunResponse(content=ExcelChunkAnalysis(audience_analysis="beginners", valuable_keywords=[]))
+
+
+def make_workbook_base64(rows: int) -> str:
+    path = os.path.join(tempfile.mkdtemp(), "keywords.xlsx")
+    df = pd.DataFrame(
+        {
+            "Keyword": [f"herbal remedy {i} for sleep" for i in range(rows)],
+            "Category": ["beginners", "intermediates"] * (rows // 2) + ["beginners"] * (rows % 2),
+        }
+    )
+    df.to_excel(path, sheet_name="CATEGORY", index=False)
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode()
+
+
+def build_app():
+    from agno.agent import Agent
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+    from pydantic import BaseModel
+
+    from api.routes.agents import chat_response_streamer
+    from api.routes.workflows import excel_workflow, workflows_router
+
+    class ExcelRunBody(BaseModel):
+        niche: str
+        base64_string: str
+        chunk_size: str
+        session_id: str
+        use_cache: str
+
+    app = FastAPI()
+    app.include_router(workflows_router, prefix="/v1")
+
+    @app.post("/v1/agents/{agent_id}/runs")
+    async def agent_run(agent_id: str):
+        return StreamingResponse(chat_response_streamer(Agent(name=agent_id), "hello"), media_type="text/event-stream")
+
+    @app.post("/v1/playground/workflows/excel-keyword-processor/runs")
+    async def sync_excel_run(body: ExcelRunBody):
+        # The playground streams the synchronous run() generator, which Starlette iterates in a thread pool
+        workflow = excel_workflow.deep_copy(update={"session_id": body.session_id})
+        return StreamingResponse(
+            (event.to_json() for event in workflow.run(**body.model_dump())), media_type="text/event-stream"
+        )
+
+    return app
+
+
+async def measure(client, scenario: str, workbook: str, chunk_size: int, clients: int) -> List[float]:
+    latencies: List[float] = []
+    job_done = asyncio.Event()
+
+    async def excel_job():
+        try:
+            if scenario == "idle":
+                await asyncio.sleep(3)
+                return
+            url = (
+                "/v1/workflows/excel-keyword-processor/runs"
+                if scenario == "arun"
+                else "/v1/playground/workflows/excel-keyword-processor/runs"
+            )
+            body = {
+                "niche": "Herbalism",
+                "base64_string": workbook,
+                "chunk_size": str(chunk_size),
+                "session_id": f"bench-{scenario}-{time.time_ns()}",
+                "use_cache": "false",
+            }
+            async with client.stream("POST", url, json=body, timeout=None) as response:
+                async for _ in response.aiter_bytes():
+                    pass
+        finally:
+            job_done.set()
+
+    async def agent_client(index: int):
+        while not job_done.is_set():
+            started = time.perf_counter()
+            response = await client.post(f"/v1/agents/bench-agent-{index}/runs")
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(excel_job(), *(agent_client(i) for i in range(clients)))
+    return latencies
+
+
+def summarize(scenario: str, latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "p50_ms": statistics.median(ordered),
+        "p95_ms": ordered[int(len(ordered) * 0.95) - 1],
+        "max_ms": ordered[-1],
+    }
+
+
+async def main(rows: int, chunk_size: int, clients: int) -> None:
+    import httpx
+    from agno.agent import Agent
+
+    Agent.run = fake_run
+    Agent.arun = fake_arun
+
+    # Keep the workflow's stores out of the repository
+    os.chdir(tempfile.mkdtemp())
+    workbook = make_workbook_base64(rows)
+    app = build_app()
+
+    print(f"Excel job: {rows} rows in chunks of {chunk_size}; {clients} concurrent agent clients")
+    print(f"{'scenario':<10}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for scenario in ("idle", "run", "arun"):
+            stats = summarize(scenario, await measure(client, scenario, workbook, chunk_size, clients))
+            print(
+                f"{scenario:<10}{stats['requests']:>10}{stats['p50_ms']:>10.1f}"
+                f"{stats['p95_ms']:>10.1f}{stats['max_ms']:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--clients", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.chunk_size, args.clients))
@@ -0,0 +1,68 @@
+"""
+Micro-benchmark for KeywordPrefilter, the local rules applied to every chunk before the model sees it.
+
+Checks the language rule first: English keywords that contain a word other languages use as a
+function word ("garden hoe", "le creuset") must be kept, and phrases built from several foreign
+function words must be rejected. Then times filter() on chunks of synthetic keywords, one
+prefilter per run as in the workflows, so the near-duplicate index grows across chunks.
+
+Usage: python -m benchmarks.keyword_prefilter
+"""
+
+import timeit
+from typing import List
+
+from workflows.keyword_prefilter import RULE_NON_ENGLISH, KeywordPrefilter, looks_non_english, tokenize_keyword
+
+CHUNK_SIZES = [100, 1_000, 10_000]
+
+ENGLISH_KEYWORDS = [
+    "garden hoe",
+    "die casting",
+    "con artist",
+    "sin city",
+    "da vinci code",
+    "le creuset",
+    "lo mein recipe",
+    "para cord bracelet",
+    "camper van",
+    "miles per hour",
+    "café near me",
+]
+FOREIGN_KEYWORDS = [
+    "wie ist das wetter",
+    "comment faire une pizza",
+    "cómo también funciona",
+    "waarom niet een fiets",
+    "как приготовить борщ",
+]
+
+
+def check_language_rule() -> None:
+    for keyword in ENGLISH_KEYWORDS:
+        assert not looks_non_english(keyword, tokenize_keyword(keyword)), f"{keyword!r} rejected as non-English"
+    for keyword in FOREIGN_KEYWORDS:
+        assert looks_non_english(keyword, tokenize_keyword(keyword)), f"{keyword!r} kept as English"
+    result = KeywordPrefilter().filter(ENGLISH_KEYWORDS)
+    assert RULE_NON_ENGLISH not in result.rejected_by_rule, result.rejections
+
+
+def make_keywords(rows: int) -> List[str]:
+    topics = ["running shoes", "trail shoes", "vitamin b", "garden tools", "coffee grinder", "yoga mat"]
+    modifiers = ["best", "cheap", "review", "for women", "near me", "2024", "vs", "sale"]
+    return [f"{modifiers[i % len(modifiers)]} {topics[i % len(topics)]} {i // 48}" for i in range(rows)]
+
+
+def main() -> None:
+    check_language_rule()
+    print(f"{'rows':>8} {'filter (ms)':>12} {'per keyword (us)':>17} {'rejected':>9}")
+    for rows in CHUNK_SIZES:
+        keywords = make_keywords(rows)
+        rejected = len(KeywordPrefilter().filter(keywords).rejections)
+        number = max(1, 2_000 // rows)
+        seconds = min(timeit.repeat(lambda: KeywordPrefilter().filter(keywords), number=number, repeat=3)) / number
+        print(f"{rows:>8} {seconds * 1000:>12.2f} {seconds / rows * 1e6:>17.1f} {rejected:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Micro-benchmark for per-chunk keyword preparation in the Excel workflow.
+
+Compares the previous per-chunk column detection + DataFrame.iterrows() + string concatenation
+against prepare_keyword_chunk() with columns detected once per file.
+
+Usage: python -m benchmarks.keyword_prep
+"""
+
+import timeit
+from typing import List, Optional
+
+import pandas as pd
+
+from workflows.excel_workflow import detect_keyword_columns, prepare_keyword_chunk
+
+CHUNK_SIZES = [100, 1_000, 10_000]
+
+
+def make_chunk(rows: int) -> pd.DataFrame:
+    keywords: List[Optional[str]] = [f"keyword {i}" if i % 20 else None for i in range(rows)]
+    return pd.DataFrame(
+        {
+            "Keyword": keywords,
+            "Search Volume": range(rows),
+            "Category": ["beginners", "intermediates", "experts", ""] * (rows // 4) + [""] * (rows % 4),
+        }
+    )
+
+
+def legacy_prepare(chunk_df: pd.DataFrame, start_row: int, end_row: int) -> Optional[str]:
+    """The preparation code the workflow used before: detection, iterrows and += on every chunk."""
+    keyword_column = None
+    category_column = None
+    for col in chunk_df.columns:
+        col_lower = str(col).lower()
+        if any(keyword in col_lower for keyword in ["keyword", "term", "phrase", "word"]):
+            keyword_column = col
+        elif any(cat in col_lower for cat in ["category", "type", "class", "group"]):
+            category_column = col
+    if not keyword_column:
+        keyword_column = chunk_df.columns[0]
+    if not category_column:
+        category_column = "category"
+        chunk_df[category_column] = "general"
+
+    keywords_with_category = []
+    for _, row in chunk_df.iterrows():
+        keyword = str(row[keyword_column]).strip()
+        category = str(row[category_column]).strip()
+        if keyword and keyword.lower() not in ["nan", "none", ""]:
+            keywords_with_category.append({"keyword": keyword, "category": category})
+    if not keywords_with_category:
+        return None
+
+    keywords_text = f"Please analyze the following keywords from the Excel file (rows {start_row + 1} to {end_row}):\n\n"
+    for item in keywords_with_category:
+        keywords_text += f"- Keyword: {item['keyword']}, Category: {item['category']}\n"
+    return keywords_text
+
+
+def main() -> None:
+    print(f"{'rows':>8} {'legacy (ms)':>12} {'vectorized (ms)':>16} {'speedup':>8}")
+    for rows in CHUNK_SIZES:
+        chunk = make_chunk(rows)
+        columns = detect_keyword_columns(list(chunk.columns))
+        assert legacy_prepare(chunk.copy(), 0, rows) == prepare_keyword_chunk(chunk, columns, 0, rows).prompt
+
+        number = max(1, 20_000 // rows)
+        legacy = min(timeit.repeat(lambda: legacy_prepare(chunk.copy(), 0, rows), number=number, repeat=3)) / number
+        vectorized = min(timeit.repeat(lambda: prepare_keyword_chunk(chunk, columns, 0, rows), number=number, repeat=3))
+        vectorized /= number
+        print(f"{rows:>8} {legacy * 1000:>12.2f} {vectorized * 1000:>16.2f} {legacy / vectorized:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
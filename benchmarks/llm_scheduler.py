@@ -0,0 +1,64 @@
+"""
+Queue wait of interactive model calls while a bulk keyword job saturates the same model's budget.
+
+A batch job submits --batch calls at once, as a large Excel run with high max_concurrency does;
+--interactive chat calls then arrive one per second. Every call goes through LLMRateScheduler
+with a budget of --rpm requests per minute, which starts full; no HTTP is involved, so the numbers
+are pure queueing:
+
+- one lane:  every call in the interactive lane, i.e. first come, first served
+- lanes:     batch calls in the batch lane, which leaves (1 - batch share) of the budget to chats
+
+Usage: python -m benchmarks.llm_scheduler [--rpm 60] [--batch 120] [--interactive 10] [--batch-share 0.8]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+from agents.rate_scheduler import BATCH_LANE, INTERACTIVE_LANE, LLMRateScheduler, RateLimit, ScheduledCall
+
+
+async def run_scenario(rpm: int, batch: int, interactive: int, batch_share: float, lanes: bool) -> Dict[str, float]:
+    scheduler = LLMRateScheduler(limits={"model": RateLimit(rpm, 0)}, batch_share=batch_share if lanes else 1.0)
+    batch_lane = BATCH_LANE if lanes else INTERACTIVE_LANE
+    started = time.perf_counter()
+
+    async def call(lane: str) -> float:
+        return await scheduler.acquire(ScheduledCall(model="model", lane=lane, tokens=0, streamed=False))
+
+    batch_tasks = [asyncio.create_task(call(batch_lane)) for _ in range(batch)]
+    chat_tasks: List[asyncio.Task] = []
+    for _ in range(interactive):
+        await asyncio.sleep(1.0)
+        chat_tasks.append(asyncio.create_task(call(INTERACTIVE_LANE)))
+    waits = await asyncio.gather(*chat_tasks)
+    await asyncio.gather(*batch_tasks)
+    return {
+        "interactive_p50_ms": statistics.median(waits) * 1000,
+        "interactive_max_ms": max(waits) * 1000,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def main(rpm: int, batch: int, interactive: int, batch_share: float) -> None:
+    print(f"{batch} batch calls, {interactive} interactive calls, {rpm} requests/minute, batch share {batch_share}")
+    print(f"{'scenario':<12}{'chat p50 ms':>14}{'chat max ms':>14}{'total s':>10}")
+    for name, lanes in (("one lane", False), ("lanes", True)):
+        result = asyncio.run(run_scenario(rpm, batch, interactive, batch_share, lanes))
+        print(
+            f"{name:<12}{result['interactive_p50_ms']:>14.1f}{result['interactive_max_ms']:>14.1f}"
+            f"{result['seconds']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rpm", type=int, default=60)
+    parser.add_argument("--batch", type=int, default=120)
+    parser.add_argument("--interactive", type=int, default=10)
+    parser.add_argument("--batch-share", type=float, default=0.8)
+    args = parser.parse_args()
+    main(args.rpm, args.batch, args.interactive, args.batch_share)
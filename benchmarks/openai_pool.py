@@ -0,0 +1,144 @@
+"""
+Connections opened and latency of model calls with and without the shared HTTP connection pool.
+
+A mock OpenAI-compatible server runs on localhost and answers /v1/chat/completions with a fixed
+completion after a simulated model latency; it counts the TCP connections it accepts. The same
+calls are then made through agno's OpenAIChat, which builds a new client for every call, and
+through PooledOpenAIChat (agents.models.get_openai_chat), which reuses the shared keep-alive pools:
+
+- sync:   sequential blocking calls, one new model per call, as every request builds its agent
+- async:  concurrent async calls, up to --concurrency at a time
+
+The mock speaks plain HTTP/1.1, so the savings here are TCP handshakes only; against the real
+endpoint every new connection also pays a TLS handshake. Point OPENAI_BASE_URL at the mock to run
+other code against it.
+
+Usage: python -m benchmarks.openai_pool [--calls 200] [--concurrency 20]
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from typing import Callable, Dict
+
+MODEL_LATENCY_SECONDS = 0.005
+
+COMPLETION = {
+    "id": "chatcmpl-mock",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "mock",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+}
+
+
+class MockOpenAIServer:
+    """A minimal HTTP/1.1 keep-alive server answering every request with a chat completion."""
+
+    def __init__(self):
+        self.connections = 0
+        self.requests = 0
+        self.port = 0
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name="mock-openai", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def start(self) -> "MockOpenAIServer":
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _serve(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        body = json.dumps(COMPLETION).encode()
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                headers = dict(
+                    line.split(": ", 1) for line in head.decode("latin-1").split("\r\n")[1:] if ": " in line
+                )
+                length = int(next((v for k, v in headers.items() if k.lower() == "content-length"), "0"))
+                await reader.readexactly(length)
+                self.requests += 1
+                await asyncio.sleep(MODEL_LATENCY_SECONDS)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+                    + f"content-length: {len(body)}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    def reset(self) -> None:
+        self.connections = 0
+        self.requests = 0
+
+
+def run_sync(make_model: Callable, calls: int) -> None:
+    for _ in range(calls):
+        model = make_model()
+        model.get_client().chat.completions.create(model=model.id, messages=[{"role": "user", "content": "hi"}])
+
+
+async def run_async(make_model: Callable, calls: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call() -> None:
+        async with semaphore:
+            model = make_model()
+            await model.get_async_client().chat.completions.create(
+                model=model.id, messages=[{"role": "user", "content": "hi"}]
+            )
+
+    await asyncio.gather(*(call() for _ in range(calls)))
+
+
+def main(calls: int, concurrency: int) -> None:
+    from agno.models.openai import OpenAIChat
+
+    from agents.models import OPENAI_HTTP2, get_openai_chat
+
+    server = MockOpenAIServer().start()
+    models: Dict[str, Callable] = {
+        "OpenAIChat": lambda: OpenAIChat(id="mock", api_key="mock", base_url=server.base_url, max_retries=0),
+        "pooled": lambda: get_openai_chat("mock", api_key="mock", base_url=server.base_url, max_retries=0),
+    }
+
+    print(f"{calls} calls per scenario, {concurrency} concurrent async calls, HTTP/2 available: {OPENAI_HTTP2}")
+    print(f"{'scenario':<10}{'model':<12}{'connections':>13}{'seconds':>10}{'ms/call':>10}")
+    for scenario in ("sync", "async"):
+        for name, make_model in models.items():
+            server.reset()
+            started = time.perf_counter()
+            if scenario == "sync":
+                run_sync(make_model, calls)
+            else:
+                asyncio.run(run_async(make_model, calls, concurrency))
+            seconds = time.perf_counter() - started
+            assert server.requests == calls, f"mock answered {server.requests} of {calls} calls"
+            print(f"{scenario:<10}{name:<12}{server.connections:>13}{seconds:>10.2f}{seconds / calls * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    main(args.calls, args.concurrency)
@@ -0,0 +1,58 @@
+"""
+Prompt size of one keyword chunk before and after the prefix-cache-friendly layout.
+
+Before: the niche was interpolated into the analyzer's instructions, so the system prompt differed
+per niche (and repeated the description block), and every keyword was sent as a
+"- Keyword: ..., Category: ..." line. After: the system prompt is byte-identical for every niche and
+chunk, and the niche and a tab-separated keyword table make up the user message.
+
+Token counts use the workflow's ~4 characters per token estimate; the old system prompt is counted
+as twice the current one, since its instructions repeated the description with the niche filled in.
+
+Usage: python -m benchmarks.prompt_layout
+"""
+
+from typing import List
+
+from workflows.excel_workflow import ExcelProcessor
+from workflows.keyword_prefilter import estimate_tokens
+from workflows.keyword_prompt import build_keyword_message, format_keyword_table
+
+CHUNK_SIZES = [50, 100, 500]
+NICHES = ["Herbalism", "Home Gardening"]
+
+
+def make_keywords(rows: int) -> List[str]:
+    return [f"how to dry chamomile flowers at home {i}" for i in range(rows)]
+
+
+def legacy_message(keywords: List[str], categories: List[str]) -> str:
+    lines = [f"- Keyword: {keyword}, Category: {category}" for keyword, category in zip(keywords, categories)]
+    header = f"Please analyze the following keywords from the Excel file (rows 1 to {len(keywords)}):\n\n"
+    return header + "\n".join(lines) + "\n"
+
+
+def main() -> None:
+    analyzer = ExcelProcessor.keyword_analyzer.deep_copy()
+    system_prompts = {analyzer.get_system_message(session_id=niche).content for niche in NICHES}
+    system_prompt = next(iter(system_prompts))
+    system_tokens = estimate_tokens(system_prompt)
+    legacy_system_tokens = 2 * system_tokens
+
+    print(f"System prompt: {system_tokens} tokens, identical across {len(NICHES)} niches: {len(system_prompts) == 1}")
+    print(f"{'rows':>6}{'before':>10}{'after':>10}{'saved':>8}{'message before':>16}{'message after':>15}")
+    for rows in CHUNK_SIZES:
+        keywords = make_keywords(rows)
+        categories = ["beginners"] * rows
+        message_before = estimate_tokens(legacy_message(keywords, categories))
+        message_after = estimate_tokens(build_keyword_message(NICHES[0], format_keyword_table(keywords, categories)))
+        before = legacy_system_tokens + message_before
+        after = system_tokens + message_after
+        print(
+            f"{rows:>6}{before:>10}{after:>10}{(before - after) / before:>8.0%}"
+            f"{message_before:>16}{message_after:>15}"
+        )
+
+
+if __name__ == "__main__":
+    main()
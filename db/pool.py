@@ -0,0 +1,84 @@
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool, PoolProxiedConnection, QueuePool
+
+# Recent checkout waits kept for latency percentiles
+CHECKOUT_SAMPLE_SIZE = 1000
+
+
+class PoolStats:
+    """Checkout counters and recent checkout latencies of the process-wide connection pool."""
+
+    def __init__(self, sample_size: int = CHECKOUT_SAMPLE_SIZE):
+        self._lock = threading.Lock()
+        self._waits: Deque[float] = deque(maxlen=sample_size)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_checkout(self, wait_seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            self._waits.append(wait_seconds)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self, pool: Optional[Pool] = None) -> Dict[str, Any]:
+        """
+        Counters, checkout latency percentiles and, given a QueuePool, its current saturation.
+
+        Saturation is the share of all connections the pool may open (size plus overflow) that are
+        checked out; at 1.0 the next checkout waits up to the pool timeout.
+        """
+        with self._lock:
+            waits = sorted(self._waits)
+            stats: Dict[str, Any] = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "checkout_wait_seconds_total": round(self.total_wait_seconds, 6),
+                "checkout_wait_ms_max": round(self.max_wait_seconds * 1000, 3),
+            }
+        stats["checkout_wait_ms_p50"] = round(statistics.median(waits) * 1000, 3) if waits else 0.0
+        stats["checkout_wait_ms_p95"] = round(waits[int(len(waits) * 0.95) - 1] * 1000, 3) if waits else 0.0
+
+        if isinstance(pool, QueuePool):
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            stats.update(
+                {
+                    "pool_size": pool.size(),
+                    "max_overflow": pool._max_overflow,
+                    "checked_out": pool.checkedout(),
+                    "checked_in": pool.checkedin(),
+                    "overflow": max(pool.overflow(), 0),
+                    "saturation": round(pool.checkedout() / capacity, 3) if capacity > 0 else 0.0,
+                }
+            )
+        return stats
+
+
+# Shared by every TimedQueuePool, so the stats survive the pool being recreated (e.g. after a disconnect)
+pool_stats = PoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    """A QueuePool that records how long every checkout waited, including pre-ping and reconnects."""
+
+    def connect(self) -> PoolProxiedConnection:
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            pool_stats.record_timeout()
+            raise
+        pool_stats.record_checkout(time.perf_counter() - started)
+        return connection
@@ -1,13 +1,32 @@
-from typing import Generator
+from os import getenv
+from typing import Any, Dict, Generator
 
 from sqlalchemy.engine import Engine, create_engine
 from sqlalchemy.orm import Session, sessionmaker
 
+from db.pool import TimedQueuePool, pool_stats
 from db.url import get_db_url
 
-# Create SQLAlchemy Engine using a database URL
+# Connection pool settings, shared by the API, agent storage, memory and knowledge backends
+DB_POOL_SIZE = int(getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(getenv("DB_MAX_OVERFLOW", "20"))
+# Seconds before a connection is replaced, to stay under server and proxy idle timeouts
+DB_POOL_RECYCLE = int(getenv("DB_POOL_RECYCLE", "1800"))
+# Seconds a checkout waits for a free connection before failing
+DB_POOL_TIMEOUT = float(getenv("DB_POOL_TIMEOUT", "30"))
+
+# Create the process-wide SQLAlchemy Engine using a database URL. Storage, memory and vector
+# backends are given this engine instead of the URL, so they share one pool of connections.
 db_url: str = get_db_url()
-db_engine: Engine = create_engine(db_url, pool_pre_ping=True)
+db_engine: Engine = create_engine(
+    db_url,
+    poolclass=TimedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+)
 
 # Create a SessionLocal class
 SessionLocal: sessionmaker[Session] = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
@@ -25,3 +44,8 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Checkout latency and saturation of the shared connection pool."""
+    return pool_stats.snapshot(db_engine.pool)
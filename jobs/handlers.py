@@ -0,0 +1,106 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Coroutine, Dict, Optional, cast
+
+from agno.workflow import WorkflowCompletedEvent
+
+from jobs.queue import JobFailed
+from workflows.csv_workflow import process_csv_file_with_session_workflow
+from workflows.excel_workflow import ExcelProcessor, get_excel_processor
+from workflows.session_results import get_session_excel_path
+
+EXCEL_JOB = "excel_keywords"
+CSV_JOB = "csv_keywords"
+
+# Job input files must live here; workers run on the API's node and share its tmp/ directory
+JOB_INPUT_DIR = "tmp"
+
+
+@dataclass
+class JobContext:
+    """What a handler shares with its worker while a job runs: the progress the worker reports."""
+
+    job_id: str
+    progress: Dict[str, Any] = field(default_factory=dict)
+
+
+def resolve_job_input_path(file_path: str) -> str:
+    """
+    A job's input file, checked to be inside JOB_INPUT_DIR so a job can't read arbitrary files.
+
+    Raises:
+        ValueError: If the path leaves JOB_INPUT_DIR.
+    """
+    input_dir = os.path.realpath(JOB_INPUT_DIR)
+    resolved = os.path.realpath(os.path.join(input_dir, file_path))
+    if os.path.commonpath([input_dir, resolved]) != input_dir:
+        raise ValueError(f"Input files must be inside {JOB_INPUT_DIR}/: {file_path}")
+    return resolved
+
+
+# Template for Excel jobs; every job works on its own copy, as API runs do
+_excel_workflow: Optional[ExcelProcessor] = None
+
+
+async def run_excel_job(payload: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """Run ExcelProcessor over an uploaded workbook, publishing its counters and latest message as progress."""
+    global _excel_workflow
+    if _excel_workflow is None:
+        _excel_workflow = get_excel_processor(debug_mode=False)
+
+    session_id = payload.get("session_id") or context.job_id
+    workflow = cast(ExcelProcessor, _excel_workflow.deep_copy(update={"session_id": session_id}))
+    workflow.user_id = payload.get("user_id")
+    run_input = {key: value for key, value in payload.items() if key not in ("user_id", "session_id")}
+
+    summary: Optional[str] = None
+    async for event in workflow.arun(**run_input, session_id=session_id):
+        if isinstance(event, WorkflowCompletedEvent):
+            summary = event.content
+            continue
+        counters = workflow.run_progress.to_dict() if workflow.run_progress is not None else {}
+        context.progress = {**counters, "message": event.content}
+
+    if workflow.run_progress is None:
+        # The workbook could not be loaded; the summary holds the reason
+        raise JobFailed(summary or "The Excel run did not start")
+    return {
+        "session_id": session_id,
+        "summary": summary,
+        "output_path": get_session_excel_path(session_id),
+        **workflow.run_progress.to_dict(),
+    }
+
+
+async def run_csv_job(payload: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """Run the CSV keyword workflow over a file in JOB_INPUT_DIR, publishing its counters as progress."""
+    session_id = payload.get("session_id") or context.job_id
+
+    async def on_progress(progress: Dict[str, Any]) -> None:
+        context.progress = progress
+
+    try:
+        input_file_path = resolve_job_input_path(payload["file_path"])
+        if not os.path.exists(input_file_path):
+            raise ValueError(f"File not found: {payload['file_path']}")
+        result = await process_csv_file_with_session_workflow(
+            input_file_path=input_file_path,
+            output_file_path=get_session_excel_path(session_id),
+            keyword_column=payload.get("keyword_column", "keyword"),
+            category_column=payload.get("category_column", "category"),
+            chunk_size=payload.get("chunk_size", 100),
+            model_id=payload.get("model_id", "o4-mini"),
+            user_id=payload.get("user_id"),
+            session_id=session_id,
+            on_progress=on_progress,
+        )
+    except ValueError as e:
+        # Missing files and columns: another attempt would fail the same way
+        raise JobFailed(str(e))
+    return {"session_id": session_id, **result.model_dump()}
+
+
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any], JobContext], Coroutine[Any, Any, Dict[str, Any]]]] = {
+    EXCEL_JOB: run_excel_job,
+    CSV_JOB: run_csv_job,
+}
@@ -0,0 +1,267 @@
+import socket
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from logging import getLogger
+from os import getenv, getpid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    case,
+    func,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Engine, Row
+
+logger = getLogger(__name__)
+
+# Attempts a job gets before it is marked failed; a worker that dies mid-job also uses one up
+JOB_MAX_ATTEMPTS = int(getenv("JOB_MAX_ATTEMPTS", "3"))
+# Seconds without a heartbeat before a running job is considered abandoned and requeued
+JOB_STALE_SECONDS = float(getenv("JOB_STALE_SECONDS", "300"))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_JOB_STATUSES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+JOB_STATUSES = (JOB_QUEUED, JOB_RUNNING, *FINISHED_JOB_STATUSES)
+
+
+class JobCancelled(Exception):
+    """Raised in a worker when its job was cancelled or handed to another worker."""
+
+
+class JobFailed(Exception):
+    """Raised by a job handler for failures that retrying the job cannot fix, such as a missing input file."""
+
+
+@dataclass
+class Job:
+    """A queued file-analysis job and its latest reported progress."""
+
+    id: str
+    kind: str
+    status: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    progress: Dict[str, Any] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int = JOB_MAX_ATTEMPTS
+    worker_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_JOB_STATUSES
+
+    @classmethod
+    def from_row(cls, row: Row) -> "Job":
+        values = row._mapping
+        return cls(**{name: values[name] for name in cls.__dataclass_fields__})
+
+
+def get_worker_id() -> str:
+    """Identifies a worker process across nodes, for logs and for job ownership."""
+    return f"{socket.gethostname()}:{getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobQueue:
+    """
+    A queue of file-analysis jobs in a Postgres table, shared by the API and any number of workers.
+
+    Workers claim the oldest queued job with `SELECT ... FOR UPDATE SKIP LOCKED`, so concurrent workers,
+    on any node, never claim the same job and never wait on each other's locks. A claimed job belongs to
+    its worker until it finishes; the worker's progress reports double as heartbeats, and jobs whose
+    worker stopped reporting are requeued by requeue_stale(). Timestamps come from the database clock,
+    so nodes with skewed clocks still agree on which jobs are stale.
+    """
+
+    def __init__(self, engine: Engine, table_name: str = "keyword_jobs", schema: str = "ai"):
+        self.engine = engine
+        self.schema = schema
+        self.table = Table(
+            table_name,
+            MetaData(schema=schema),
+            Column("id", String, primary_key=True),
+            Column("kind", String, nullable=False),
+            Column("status", String, nullable=False),
+            Column("payload", JSONB, nullable=False),
+            Column("progress", JSONB, nullable=False, server_default=text("'{}'::jsonb")),
+            Column("result", JSONB),
+            Column("error", Text),
+            Column("attempts", Integer, nullable=False, server_default=text("0")),
+            Column("max_attempts", Integer, nullable=False),
+            Column("worker_id", String),
+            Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+            Column("started_at", DateTime(timezone=True)),
+            Column("heartbeat_at", DateTime(timezone=True)),
+            Column("finished_at", DateTime(timezone=True)),
+            Index(f"idx_{table_name}_status_created_at", "status", "created_at"),
+        )
+        self._initialized = False
+
+    def create(self) -> None:
+        """Create the jobs table if it does not exist yet."""
+        if self._initialized:
+            return
+        with self.engine.begin() as connection:
+            # Processes starting together would race to create the table; the lock makes them take turns
+            connection.execute(select(func.pg_advisory_xact_lock(func.hashtext(self.table.fullname))))
+            connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {self.schema}"))
+            self.table.create(connection, checkfirst=True)
+        self._initialized = True
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], max_attempts: int = JOB_MAX_ATTEMPTS) -> Job:
+        self.create()
+        with self.engine.begin() as connection:
+            row = connection.execute(
+                self.table.insert()
+                .values(id=str(uuid.uuid4()), kind=kind, status=JOB_QUEUED, payload=payload, max_attempts=max_attempts)
+                .returning(*self.table.c)
+            ).one()
+        job = Job.from_row(row)
+        logger.info(f"Queued {kind} job {job.id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self.create()
+        with self.engine.connect() as connection:
+            row = connection.execute(select(self.table).where(self.table.c.id == job_id)).one_or_none()
+        return Job.from_row(row) if row is not None else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Job]:
+        """The most recently created jobs, optionally with the given status."""
+        self.create()
+        query = select(self.table).order_by(self.table.c.created_at.desc()).limit(limit)
+        if status is not None:
+            query = query.where(self.table.c.status == status)
+        with self.engine.connect() as connection:
+            return [Job.from_row(row) for row in connection.execute(query)]
+
+    def count_by_status(self) -> Dict[str, int]:
+        """Jobs per status, for monitoring."""
+        self.create()
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                select(self.table.c.status, func.count()).group_by(self.table.c.status)
+            )
+            return {status: count for status, count in rows}
+
+    def claim(self, worker_id: str, kinds: Optional[List[str]] = None) -> Optional[Job]:
+        """Take the oldest queued job for `worker_id`, skipping jobs other workers are claiming right now."""
+        self.create()
+        next_job = (
+            select(self.table.c.id)
+            .where(self.table.c.status == JOB_QUEUED)
+            .order_by(self.table.c.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if kinds:
+            next_job = next_job.where(self.table.c.kind.in_(kinds))
+        with self.engine.begin() as connection:
+            row = connection.execute(
+                update(self.table)
+                .where(self.table.c.id == next_job.scalar_subquery())
+                .values(
+                    status=JOB_RUNNING,
+                    worker_id=worker_id,
+                    attempts=self.table.c.attempts + 1,
+                    started_at=func.now(),
+                    heartbeat_at=func.now(),
+                    error=None,
+                )
+                .returning(*self.table.c)
+            ).one_or_none()
+        return Job.from_row(row) if row is not None else None
+
+    def _update_owned(self, job_id: str, worker_id: str, values: Dict[str, Any]) -> bool:
+        """Update a job only while `worker_id` still runs it; False once it was cancelled or requeued."""
+        with self.engine.begin() as connection:
+            result = connection.execute(
+                update(self.table)
+                .where(
+                    self.table.c.id == job_id,
+                    self.table.c.worker_id == worker_id,
+                    self.table.c.status == JOB_RUNNING,
+                )
+                .values(**values)
+            )
+        return result.rowcount > 0
+
+    def report_progress(self, job_id: str, worker_id: str, progress: Dict[str, Any]) -> None:
+        """
+        Save a running job's progress and heartbeat.
+
+        Raises:
+            JobCancelled: If the job was cancelled, or requeued because this worker looked dead.
+        """
+        if not self._update_owned(job_id, worker_id, {"progress": progress, "heartbeat_at": func.now()}):
+            raise JobCancelled(f"Job {job_id} is no longer running on worker {worker_id}")
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any], progress: Dict[str, Any]) -> bool:
+        return self._update_owned(
+            job_id,
+            worker_id,
+            {"status": JOB_SUCCEEDED, "result": result, "progress": progress, "finished_at": func.now()},
+        )
+
+    def _after_failure(self, error: str, retry: bool = True) -> Dict[str, Any]:
+        """Values that requeue a job while it has attempts left and fail it otherwise."""
+        if not retry:
+            return {"status": JOB_FAILED, "finished_at": func.now(), "worker_id": None, "error": error}
+        has_attempts_left = self.table.c.attempts < self.table.c.max_attempts
+        return {
+            "status": case((has_attempts_left, JOB_QUEUED), else_=JOB_FAILED),
+            "finished_at": case((has_attempts_left, None), else_=func.now()),
+            "worker_id": None,
+            "error": error,
+        }
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> bool:
+        """Requeue a failed job while it has attempts left, otherwise (or when `retry` is False) mark it failed."""
+        return self._update_owned(job_id, worker_id, self._after_failure(error, retry))
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job; a running job stops at its worker's next progress report."""
+        self.create()
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(self.table)
+                .where(self.table.c.id == job_id, self.table.c.status.in_((JOB_QUEUED, JOB_RUNNING)))
+                .values(status=JOB_CANCELLED, finished_at=func.now())
+            )
+        return self.get(job_id)
+
+    def requeue_stale(self, stale_seconds: float = JOB_STALE_SECONDS) -> int:
+        """Requeue running jobs whose worker stopped reporting, or fail them once out of attempts."""
+        self.create()
+        with self.engine.begin() as connection:
+            result = connection.execute(
+                update(self.table)
+                .where(
+                    self.table.c.status == JOB_RUNNING,
+                    self.table.c.heartbeat_at < func.now() - timedelta(seconds=stale_seconds),
+                )
+                .values(**self._after_failure(f"Worker stopped reporting for {stale_seconds:.0f}s"))
+            )
+        if result.rowcount:
+            logger.warning(f"Requeued {result.rowcount} jobs abandoned by their workers")
+        return result.rowcount
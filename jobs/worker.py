@@ -0,0 +1,129 @@
+"""
+Worker process for queued file-analysis jobs.
+
+Each worker runs one job at a time; run as many processes as the model quota allows, on the node
+that serves the API. Besides the database, workers need the API's tmp/ directory: the uploads, and
+the checkpoints, session results and verdict cache that the workflows keep there in SQLite files.
+Those use WAL mode, which needs a local disk, so tmp/ can't be a network share and workers can't
+run on other nodes.
+
+Usage: python -m jobs.worker [--kinds excel_keywords,csv_keywords]
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+from logging import getLogger
+from os import getenv
+from typing import List, Optional
+
+from jobs.handlers import JOB_HANDLERS, JobContext
+from jobs.queue import Job, JobCancelled, JobFailed, JobQueue, get_worker_id
+
+logger = getLogger(__name__)
+
+# Seconds an idle worker waits before polling the queue again
+JOB_POLL_SECONDS = float(getenv("JOB_POLL_SECONDS", "2"))
+# Seconds between progress reports of a running job; they double as its heartbeat
+JOB_HEARTBEAT_SECONDS = float(getenv("JOB_HEARTBEAT_SECONDS", "15"))
+
+
+class JobWorker:
+    """Claims jobs from a JobQueue and runs them with their handler, reporting progress as it goes."""
+
+    def __init__(self, queue: JobQueue, kinds: Optional[List[str]] = None, worker_id: Optional[str] = None):
+        self.queue = queue
+        self.kinds = kinds or list(JOB_HANDLERS)
+        self.worker_id = worker_id or get_worker_id()
+
+    async def run(self, stop: asyncio.Event) -> None:
+        """Run jobs until `stop` is set; a job still running then is cancelled and requeued."""
+        logger.info(f"Worker {self.worker_id} waiting for {', '.join(self.kinds)} jobs")
+        while not stop.is_set():
+            await asyncio.to_thread(self.queue.requeue_stale)
+            job = await asyncio.to_thread(self.queue.claim, self.worker_id, self.kinds)
+            if job is None:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_task = asyncio.create_task(self.run_job(job))
+            stop_task = asyncio.create_task(stop.wait())
+            await asyncio.wait({job_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+            stop_task.cancel()
+            if not job_task.done():
+                job_task.cancel()
+                await asyncio.gather(job_task, return_exceptions=True)
+                # Excel runs resume from their checkpoints, so the next worker loses little
+                await asyncio.to_thread(self.queue.fail, job.id, self.worker_id, "Worker shut down")
+                logger.info(f"Requeued job {job.id} on shutdown")
+
+    async def run_job(self, job: Job) -> None:
+        logger.info(f"Running {job.kind} job {job.id} (attempt {job.attempts}/{job.max_attempts})")
+        handler = JOB_HANDLERS[job.kind]
+        context = JobContext(job_id=job.id, progress=dict(job.progress or {}))
+        handler_task = asyncio.create_task(handler(job.payload, context))
+        heartbeat_task = asyncio.create_task(self.heartbeat(job, context, handler_task))
+        try:
+            result = await handler_task
+        except asyncio.CancelledError:
+            heartbeat_stopped = heartbeat_task.done() and not heartbeat_task.cancelled()
+            if heartbeat_stopped and isinstance(heartbeat_task.exception(), JobCancelled):
+                logger.info(f"Job {job.id} was cancelled")
+                return
+            raise
+        except JobFailed as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            await asyncio.to_thread(self.queue.fail, job.id, self.worker_id, str(e), False)
+            return
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed, requeueing it if it has attempts left: {e}")
+            await asyncio.to_thread(self.queue.fail, job.id, self.worker_id, f"{type(e).__name__}: {e}")
+            return
+        finally:
+            if not heartbeat_task.done():
+                heartbeat_task.cancel()
+                await asyncio.gather(heartbeat_task, return_exceptions=True)
+
+        if await asyncio.to_thread(self.queue.complete, job.id, self.worker_id, result, context.progress):
+            logger.info(f"Job {job.id} succeeded")
+        else:
+            logger.warning(f"Job {job.id} finished after it was cancelled or requeued; its result was dropped")
+
+    async def heartbeat(self, job: Job, context: JobContext, handler_task: asyncio.Task) -> None:
+        """Save the job's progress periodically, stopping the handler once the job is no longer ours."""
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                await asyncio.to_thread(self.queue.report_progress, job.id, self.worker_id, context.progress)
+            except JobCancelled:
+                handler_task.cancel()
+                raise
+            except Exception as e:
+                # A missed heartbeat is not fatal; the job is only requeued after JOB_STALE_SECONDS
+                logger.warning(f"Failed to report progress of job {job.id}: {e}")
+
+
+def main(kinds: Optional[List[str]] = None) -> None:
+    from db.session import db_engine
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    async def serve() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        await JobWorker(JobQueue(db_engine), kinds=kinds).run(stop)
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kinds", help="Comma-separated job kinds to run (default: all)")
+    args = parser.parse_args()
+    main(args.kinds.split(",") if args.kinds else None)
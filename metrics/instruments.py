@@ -0,0 +1,171 @@
+"""Metrics of agent runs and keyword workflows, with the helpers the instrumented code records them through."""
+
+import functools
+import inspect
+import time
+from typing import Any, Callable, Optional, TypeVar
+
+from metrics.registry import registry
+
+# Bucket bounds, in seconds, for time to first token
+FIRST_TOKEN_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+# Bucket bounds, in seconds, for building a request's agent; copies take milliseconds, new templates longer
+AGENT_BUILD_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+# Bucket bounds, in seconds, for whole Excel/CSV runs
+KEYWORD_RUN_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0, 7200.0)
+
+agent_runs = registry.counter(
+    "agent_runs_total", "Agent runs by outcome: completed, error, cancelled or rejected", ("agent", "stream", "status")
+)
+agent_run_seconds = registry.histogram(
+    "agent_run_duration_seconds", "Agent run latency from admission to the end of the run", ("agent", "stream")
+)
+agent_first_token_seconds = registry.histogram(
+    "agent_time_to_first_token_seconds",
+    "Time from the start of a streamed agent run to its first content",
+    ("agent",),
+    buckets=FIRST_TOKEN_BUCKETS,
+)
+agent_tokens = registry.counter(
+    "agent_tokens_total", "Model tokens used by agent runs, by kind: input, cached_input or output", ("agent", "kind")
+)
+agent_tool_calls = registry.counter(
+    "agent_tool_calls_total", "Tool calls made by agent runs, by outcome: ok or error", ("agent", "tool", "status")
+)
+agent_tool_call_seconds = registry.histogram(
+    "agent_tool_call_duration_seconds", "Tool call latency within agent runs", ("agent", "tool")
+)
+agent_build_seconds = registry.histogram(
+    "agent_build_duration_seconds",
+    "Time to build a request's agent, by template: cached (a copy) or built (the factory ran first)",
+    ("agent", "template"),
+    buckets=AGENT_BUILD_BUCKETS,
+)
+
+keyword_runs = registry.counter(
+    "keyword_runs_total", "Excel/CSV keyword runs by outcome: completed, failed or cancelled", ("workflow", "status")
+)
+keyword_run_seconds = registry.histogram(
+    "keyword_run_duration_seconds", "Excel/CSV keyword run duration", ("workflow",), buckets=KEYWORD_RUN_BUCKETS
+)
+keyword_chunks = registry.counter("keyword_chunks_total", "Chunks read by Excel/CSV keyword runs", ("workflow",))
+keyword_rows = registry.counter("keyword_rows_total", "Rows read by Excel/CSV keyword runs", ("workflow",))
+keyword_analyzed_keywords = registry.counter(
+    "keyword_analyzed_keywords_total",
+    "Keywords sent to the model; the rest were pre-filtered or answered from the verdict cache",
+    ("workflow",),
+)
+keyword_chunk_analysis_seconds = registry.histogram(
+    "keyword_chunk_analysis_seconds", "Model analysis time per chunk, including retries and splits", ("workflow",)
+)
+keyword_tokens = registry.counter(
+    "keyword_model_tokens_total", "Model tokens used by Excel/CSV keyword runs, by kind", ("workflow", "kind")
+)
+
+
+def record_agent_run(agent: str, stream: bool, status: str, seconds: Optional[float] = None) -> None:
+    stream_label = "true" if stream else "false"
+    agent_runs.inc(agent=agent, stream=stream_label, status=status)
+    if seconds is not None:
+        agent_run_seconds.observe(seconds, agent=agent, stream=stream_label)
+
+
+def record_agent_tokens(agent: str, usage: Any) -> None:
+    """Add a run's TokenUsage to its agent's token counters."""
+    for kind in ("input", "cached_input", "output"):
+        tokens = getattr(usage, f"{kind}_tokens", 0)
+        if tokens:
+            agent_tokens.inc(tokens, agent=agent, kind=kind)
+
+
+def record_tool_call(agent: str, tool: Optional[str], seconds: Optional[float], error: bool) -> None:
+    tool = tool or "unknown"
+    agent_tool_calls.inc(agent=agent, tool=tool, status="error" if error else "ok")
+    if seconds is not None:
+        agent_tool_call_seconds.observe(seconds, agent=agent, tool=tool)
+
+
+def record_keyword_chunk(workflow: str, rows: int) -> None:
+    keyword_chunks.inc(workflow=workflow)
+    keyword_rows.inc(rows, workflow=workflow)
+
+
+def record_keyword_analysis(workflow: str, seconds: float, keyword_count: int, usage: Any) -> None:
+    """Record one chunk's model analysis, with its TokenUsage."""
+    keyword_chunk_analysis_seconds.observe(seconds, workflow=workflow)
+    keyword_analyzed_keywords.inc(keyword_count, workflow=workflow)
+    for kind in ("input", "cached_input", "output"):
+        tokens = getattr(usage, f"{kind}_tokens", 0)
+        if tokens:
+            keyword_tokens.inc(tokens, workflow=workflow, kind=kind)
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def instrument_keyword_run(workflow: str) -> Callable[[F], F]:
+    """
+    Count and time the runs of a keyword workflow's run function: a generator, an async generator or
+    a coroutine function. A run that stops early because its consumer closed it counts as cancelled.
+
+    The wrapper keeps the wrapped function's signature and kind, which agno's Workflow inspects to
+    route its run methods.
+    """
+
+    def record(status: str, started: float) -> None:
+        keyword_runs.inc(workflow=workflow, status=status)
+        keyword_run_seconds.observe(time.perf_counter() - started, workflow=workflow)
+
+    def decorator(function: F) -> F:
+        if inspect.isasyncgenfunction(function):
+
+            @functools.wraps(function)
+            async def async_generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+                started, status = time.perf_counter(), "cancelled"
+                generator = function(*args, **kwargs)
+                try:
+                    async for item in generator:
+                        yield item
+                    status = "completed"
+                except Exception:
+                    status = "failed"
+                    raise
+                finally:
+                    # Closing the wrapper closes the run too, as `yield from` does for generators
+                    await generator.aclose()
+                    record(status, started)
+
+            return async_generator_wrapper  # type: ignore[return-value]
+
+        if inspect.isgeneratorfunction(function):
+
+            @functools.wraps(function)
+            def generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+                started, status = time.perf_counter(), "cancelled"
+                try:
+                    yield from function(*args, **kwargs)
+                    status = "completed"
+                except Exception:
+                    status = "failed"
+                    raise
+                finally:
+                    record(status, started)
+
+            return generator_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(function)
+        async def coroutine_wrapper(*args: Any, **kwargs: Any) -> Any:
+            started, status = time.perf_counter(), "cancelled"
+            try:
+                result = await function(*args, **kwargs)
+                status = "completed"
+                return result
+            except Exception:
+                status = "failed"
+                raise
+            finally:
+                record(status, started)
+
+        return coroutine_wrapper  # type: ignore[return-value]
+
+    return decorator
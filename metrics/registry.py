@@ -0,0 +1,234 @@
+"""
+Process-wide metrics in the Prometheus text exposition format.
+
+Counters and histograms are updated on the hot path, so an update is a dict lookup and a few
+arithmetic operations under a lock. Values that already live elsewhere (pool stats, in-flight
+streams, queue depths) are read when the metrics are scraped, through collectors.
+"""
+
+import math
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = getLogger(__name__)
+
+# Bucket bounds, in seconds, for latencies from tool calls to whole agent runs
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_sample(name: str, labels: Dict[str, str], value: float) -> str:
+    if not labels:
+        return f"{name} {format_value(value)}"
+    label_text = ",".join(f'{key}="{escape_label_value(str(label))}"' for key, label in labels.items())
+    return f"{name}{{{label_text}}} {format_value(value)}"
+
+
+class Metric:
+    """A named metric with a fixed set of label names; one series per combination of label values."""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels_dict(self, values: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}", *self.samples()]
+
+
+class Counter(Metric):
+    """A value that only goes up, e.g. runs or tokens."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._label_values(labels), 0.0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [format_sample(self.name, self._labels_dict(key), value) for key, value in values]
+
+
+@dataclass
+class _HistogramSeries:
+    counts: List[int]
+    total: float = 0.0
+    count: int = 0
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their sum and count, e.g. latencies."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(counts=[0] * (len(self.buckets) + 1))
+            series.counts[index] += 1
+            series.total += value
+            series.count += 1
+
+    def get_count(self, **labels: str) -> int:
+        series = self._series.get(self._label_values(labels))
+        return series.count if series is not None else 0
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            series_list = [
+                (key, list(series.counts), series.total, series.count) for key, series in self._series.items()
+            ]
+        lines = []
+        for key, counts, total, count in series_list:
+            labels = self._labels_dict(key)
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                lines.append(format_sample(f"{self.name}_bucket", {**labels, "le": format_value(bound)}, cumulative))
+            lines.append(format_sample(f"{self.name}_sum", labels, total))
+            lines.append(format_sample(f"{self.name}_count", labels, count))
+        return lines
+
+
+@dataclass
+class MetricFamily:
+    """Samples of one metric read at scrape time by a collector."""
+
+    name: str
+    type_name: str
+    documentation: str
+    samples: List[Tuple[Dict[str, str], float]] = field(default_factory=list)
+
+    def add(self, value: float, **labels: str) -> "MetricFamily":
+        self.samples.append((labels, value))
+        return self
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+            *(format_sample(self.name, labels, value) for labels, value in self.samples),
+        ]
+
+
+def gauge(name: str, documentation: str, value: Optional[float] = None) -> MetricFamily:
+    family = MetricFamily(name, "gauge", documentation)
+    return family.add(value) if value is not None else family
+
+
+def counter(name: str, documentation: str, value: Optional[float] = None) -> MetricFamily:
+    family = MetricFamily(name, "counter", documentation)
+    return family.add(value) if value is not None else family
+
+
+Collector = Callable[[], Iterable[MetricFamily]]
+
+
+class MetricsRegistry:
+    """The metrics and collectors rendered by the /metrics endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: Dict[str, Collector] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def register_collector(self, name: str, collector: Collector) -> None:
+        """Read `collector`'s metrics on every scrape; registering a name again replaces its collector."""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def render(self) -> str:
+        """
+        Every metric in the text exposition format. A collector that fails is skipped, so one broken
+        source (e.g. the database being down) does not hide the others.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        failed: List[str] = []
+        for name, collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector {name} failed: {e}")
+                failed.append(name)
+                continue
+            for family in families:
+                lines.extend(family.render())
+        scrape_errors = MetricFamily("metrics_collector_errors", "gauge", "Collectors that failed during this scrape")
+        for name in failed:
+            scrape_errors.add(1, collector=name)
+        lines.extend(scrape_errors.render())
+        return "\n".join(lines) + "\n"
+
+
+# Shared by the whole process; metrics are registered on it where they are defined
+registry = MetricsRegistry()
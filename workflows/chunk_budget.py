@@ -0,0 +1,174 @@
+from dataclasses import dataclass
+from os import getenv
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from agno.utils.log import logger
+
+# (context window, max output tokens) of the models the keyword workflows run on
+MODEL_TOKEN_LIMITS: Dict[str, Tuple[int, int]] = {
+    "gpt-4o-mini": (128_000, 16_384),
+    "gpt-4o": (128_000, 16_384),
+    "gpt-4.1-nano": (1_047_576, 32_768),
+    "gpt-4.1-mini": (1_047_576, 32_768),
+    "gpt-4.1": (1_047_576, 32_768),
+    "o4-mini": (200_000, 100_000),
+    "o3-mini": (200_000, 100_000),
+    "o3": (200_000, 100_000),
+}
+DEFAULT_TOKEN_LIMITS = (128_000, 16_384)
+
+# Share of the model's prompt and output budgets a chunk is sized to fill
+DEFAULT_FILL_RATIO = float(getenv("KEYWORD_CHUNK_FILL_RATIO", "0.5"))
+
+# Rough characters per token for English keyword text
+CHARS_PER_TOKEN = 4
+# Per-keyword framing in the tab-separated keyword table (a tab and a newline)
+PROMPT_CHARS_PER_ROW = 2
+# A kept keyword is echoed back with a one-sentence reason inside the JSON answer
+COMPLETION_TOKENS_PER_KEYWORD = 45
+# The audience analysis and JSON envelope of every answer
+COMPLETION_OVERHEAD_TOKENS = 400
+# Reasoning models spend part of their output budget before answering
+REASONING_OUTPUT_SHARE = 0.5
+
+
+def get_model_token_limits(model_id: Optional[str]) -> Tuple[int, int]:
+    """Context window and output limit for a model id, matching dated snapshots by prefix."""
+    if not model_id:
+        return DEFAULT_TOKEN_LIMITS
+    for known_id in sorted(MODEL_TOKEN_LIMITS, key=len, reverse=True):
+        if model_id.startswith(known_id):
+            return MODEL_TOKEN_LIMITS[known_id]
+    return DEFAULT_TOKEN_LIMITS
+
+
+def get_metric_total(metrics: Optional[Dict[str, Any]], *names: str) -> Optional[int]:
+    """
+    Total of the first of `names` reported in an agent run's metrics.
+
+    Agent runs report one value per model call (a list), workflow steps a single number.
+    """
+    metrics = metrics or {}
+    for name in names:
+        value = metrics.get(name)
+        if isinstance(value, list):
+            value = sum(value) if value else None
+        if value:
+            return value
+    return None
+
+
+def get_output_tokens(metrics: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Output tokens in an agent run's metrics, if the model reported usage."""
+    return get_metric_total(metrics, "output_tokens", "completion_tokens")
+
+
+@dataclass
+class TokenUsage:
+    """Model tokens used by keyword analyses, with the input tokens the provider served from its prompt cache."""
+
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
+
+    @classmethod
+    def from_metrics(cls, metrics: Optional[Dict[str, Any]]) -> "TokenUsage":
+        return cls(
+            input_tokens=get_metric_total(metrics, "input_tokens", "prompt_tokens") or 0,
+            cached_input_tokens=get_metric_total(metrics, "cached_tokens") or 0,
+            output_tokens=get_output_tokens(metrics) or 0,
+        )
+
+    @property
+    def cached_share(self) -> float:
+        """Percentage of input tokens read from the prompt cache."""
+        return (self.cached_input_tokens / self.input_tokens * 100) if self.input_tokens else 0.0
+
+    def add(self, other: "TokenUsage") -> None:
+        self.input_tokens += other.input_tokens
+        self.cached_input_tokens += other.cached_input_tokens
+        self.output_tokens += other.output_tokens
+
+    def describe(self) -> str:
+        return (
+            f"{self.input_tokens} in ({self.cached_input_tokens} cached, {self.cached_share:.0f}%), "
+            f"{self.output_tokens} out"
+        )
+
+
+class AdaptiveChunker:
+    """
+    Size keyword chunks by estimated tokens instead of a fixed row count.
+
+    Each chunk is as large as fits in `fill_ratio` of both the prompt budget (context window minus
+    the instructions and output limit) and the output budget of the model, assuming every keyword
+    may be kept and echoed back with a reason. Long phrase keywords therefore get smaller chunks and
+    short single words larger ones. A response that fails to parse or uses up the output limit halves
+    the budget for the following chunks; each successful chunk then grows it back gradually.
+    """
+
+    def __init__(
+        self,
+        model_id: Optional[str],
+        instruction_tokens: int = 0,
+        fill_ratio: float = DEFAULT_FILL_RATIO,
+        min_rows: int = 10,
+        max_rows: int = 1000,
+        min_scale: float = 0.05,
+    ):
+        if not 0 < fill_ratio <= 1:
+            raise ValueError("fill_ratio must be in (0, 1]")
+        self.model_id = model_id
+        self.context_tokens, self.output_tokens = get_model_token_limits(model_id)
+        self.instruction_tokens = instruction_tokens
+        self.fill_ratio = fill_ratio
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.min_scale = min_scale
+        self.scale = 1.0
+
+    @property
+    def output_budget(self) -> float:
+        usable: float = float(self.output_tokens)
+        if self.model_id and self.model_id.startswith("o"):
+            usable *= REASONING_OUTPUT_SHARE
+        return max(0.0, usable * self.fill_ratio * self.scale - COMPLETION_OVERHEAD_TOKENS)
+
+    @property
+    def prompt_budget(self) -> float:
+        usable = self.context_tokens - self.output_tokens - self.instruction_tokens
+        return max(0.0, usable * self.fill_ratio * self.scale)
+
+    def size_next_chunk(self, keywords: pd.Series, categories: Optional[pd.Series] = None) -> int:
+        """Number of leading rows of `keywords` (a look-ahead window) that fit in the current budget."""
+        if keywords.empty:
+            return self.min_rows
+        window = min(len(keywords), self.max_rows)
+        keyword_chars = keywords.iloc[:window].fillna("").astype(str).str.len().to_numpy()
+        category_chars = (
+            categories.iloc[:window].fillna("").astype(str).str.len().to_numpy()
+            if categories is not None
+            else np.full(window, len("general"))
+        )
+        keyword_tokens = keyword_chars / CHARS_PER_TOKEN
+        prompt_tokens = (keyword_chars + category_chars + PROMPT_CHARS_PER_ROW) / CHARS_PER_TOKEN
+        completion_tokens = keyword_tokens + COMPLETION_TOKENS_PER_KEYWORD
+
+        fits_prompt = int(np.searchsorted(np.cumsum(prompt_tokens), self.prompt_budget, side="right"))
+        fits_output = int(np.searchsorted(np.cumsum(completion_tokens), self.output_budget, side="right"))
+        rows = min(fits_prompt, fits_output, window)
+        return max(self.min_rows, rows)
+
+    def record_result(self, parsed: bool, output_tokens: Optional[int] = None) -> None:
+        """Adapt the budget to how the model coped with the last chunk."""
+        truncated = output_tokens is not None and output_tokens >= self.output_tokens * 0.98
+        if not parsed or truncated:
+            self.scale = max(self.min_scale, self.scale / 2)
+            logger.warning(
+                f"Keyword chunk {'was truncated' if truncated else 'failed to parse'}; "
+                f"shrinking chunk budget to {self.scale:.0%}"
+            )
+        elif self.scale < 1.0:
+            self.scale = min(1.0, self.scale * 1.25)
@@ -0,0 +1,257 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from os import getenv
+from typing import Any, Awaitable, Callable, Dict, Generator, List, Optional, Tuple, Union
+
+from agno.exceptions import ModelProviderError
+from agno.utils.log import logger
+
+from agents.rate_scheduler import BATCH_LANE, llm_lane
+
+try:
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+    _TRANSIENT_OPENAI_ERRORS: Tuple[type, ...] = (
+        APIConnectionError,
+        APITimeoutError,
+        InternalServerError,
+        RateLimitError,
+    )
+except ImportError:
+    _TRANSIENT_OPENAI_ERRORS = ()
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+TRANSIENT_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+# HTTP statuses no retry or smaller request can fix: bad credentials, no access, unknown model
+FATAL_STATUS_CODES = frozenset({401, 403, 404})
+# Error texts that mark a failure as transient when only the message survives (e.g. workflow run errors)
+TRANSIENT_ERROR_MARKERS = (
+    "rate limit", "timeout", "timed out", "connection", "temporarily", "overloaded", "try again",
+)
+
+# Calls per chunk on transient errors, and on answers that do not parse, before giving up or splitting it
+DEFAULT_MAX_ATTEMPTS = int(getenv("KEYWORD_RETRY_ATTEMPTS", "5"))
+DEFAULT_PARSE_ATTEMPTS = int(getenv("KEYWORD_PARSE_ATTEMPTS", "2"))
+# Backoff before retry n is drawn uniformly from [0, min(max_delay, base_delay * 2**n)]
+DEFAULT_BASE_DELAY = float(getenv("KEYWORD_RETRY_BASE_DELAY", "1.0"))
+DEFAULT_MAX_DELAY = float(getenv("KEYWORD_RETRY_MAX_DELAY", "30.0"))
+
+
+class ChunkRunError(Exception):
+    """A run that reported an error instead of raising it, such as a v2 workflow run."""
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Whether retrying the same request later can succeed: rate limits, timeouts, dropped connections, 5xx."""
+    seen = set()
+    current: Optional[BaseException] = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        if _TRANSIENT_OPENAI_ERRORS and isinstance(current, _TRANSIENT_OPENAI_ERRORS):
+            return True
+        if isinstance(current, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+            return True
+        current = current.__cause__ or current.__context__
+
+    if isinstance(error, ModelProviderError) and error.__cause__ is None:
+        return error.status_code in TRANSIENT_STATUS_CODES
+    message = str(error).lower()
+    return any(marker in message for marker in TRANSIENT_ERROR_MARKERS)
+
+
+def is_fatal_error(error: BaseException) -> bool:
+    """Whether the error will repeat for any request, so the run should stop instead of retrying or splitting."""
+    status_code = getattr(error, "status_code", None)
+    cause_status_code = getattr(error.__cause__, "status_code", None)
+    return status_code in FATAL_STATUS_CODES or cause_status_code in FATAL_STATUS_CODES
+
+
+@dataclass
+class RetryPolicy:
+    """How often and how patiently a chunk analysis is retried."""
+
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    parse_attempts: int = DEFAULT_PARSE_ATTEMPTS
+    base_delay: float = DEFAULT_BASE_DELAY
+    max_delay: float = DEFAULT_MAX_DELAY
+
+    def get_delay(self, retry: int, rng: Optional[random.Random] = None) -> float:
+        """Full-jitter exponential backoff before the `retry`-th retry (0-based)."""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** retry))
+        return (rng or random).uniform(0, ceiling)
+
+
+@dataclass
+class UnrecoverableRows:
+    """Keywords that could not be analyzed, even on their own."""
+
+    keywords: List[str]
+    reason: str
+
+
+@dataclass
+class ChunkAnalysisResult:
+    """Outcome of analyzing one chunk, possibly through several model calls on parts of it."""
+
+    analyses: List[Any] = field(default_factory=list)
+    metrics: Dict[str, List[Any]] = field(default_factory=dict)
+    unrecoverable: List[UnrecoverableRows] = field(default_factory=list)
+    calls: int = 0
+    retries: int = 0
+    parse_failures: int = 0
+    splits: int = 0
+
+    @property
+    def unrecoverable_keywords(self) -> List[str]:
+        return [keyword for rows in self.unrecoverable for keyword in rows.keywords]
+
+    @property
+    def max_output_tokens(self) -> Optional[int]:
+        """Largest output of a single call, to tell truncated answers apart from many small ones."""
+        output_tokens = self.metrics.get("output_tokens") or self.metrics.get("completion_tokens")
+        return max(output_tokens) if output_tokens else None
+
+    def add_metrics(self, metrics: Optional[Dict[str, Any]]) -> None:
+        for name, value in (metrics or {}).items():
+            values = value if isinstance(value, list) else [value]
+            self.metrics.setdefault(name, []).extend(v for v in values if isinstance(v, (int, float)))
+
+
+# A step of the analysis: a message to send, or seconds to wait before the next call
+_Request = Union[str, float]
+
+
+class ChunkRetrier:
+    """
+    Analyze a chunk of keywords without losing it to one bad call.
+
+    Transient errors (rate limits, timeouts, connection drops, 5xx) are retried with jittered
+    exponential backoff. An answer that does not parse is asked for again, and if the chunk keeps
+    failing it is split in halves which are analyzed separately, down to single keywords; only the
+    keywords that fail on their own are reported as unrecoverable. Errors no retry can fix, such as
+    an invalid API key, are raised. The same policy drives blocking callers (analyze) and async ones
+    (aanalyze).
+    """
+
+    def __init__(
+        self,
+        parse_response: Callable[[Any], Optional[Any]],
+        get_metrics: Callable[[Any], Optional[Dict[str, Any]]] = lambda response: getattr(response, "metrics", None),
+        policy: Optional[RetryPolicy] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        self.parse_response = parse_response
+        self.get_metrics = get_metrics
+        self.policy = policy or RetryPolicy()
+        self.rng = rng
+
+    def analyze(
+        self,
+        run: Callable[[str], Any],
+        build_message: Callable[[List[str], List[str]], str],
+        keywords: List[str],
+        categories: List[str],
+    ) -> ChunkAnalysisResult:
+        result = ChunkAnalysisResult()
+        steps = self._steps(build_message, keywords, categories, result)
+        reply: Any = None
+        while True:
+            try:
+                request = steps.send(reply)
+            except StopIteration:
+                return result
+            if isinstance(request, float):
+                time.sleep(request)
+                reply = None
+                continue
+            try:
+                # Bulk analyses queue behind interactive chats for the shared model quota
+                with llm_lane(BATCH_LANE):
+                    reply = run(request)
+            except Exception as e:
+                reply = e
+
+    async def aanalyze(
+        self,
+        arun: Callable[[str], Awaitable[Any]],
+        build_message: Callable[[List[str], List[str]], str],
+        keywords: List[str],
+        categories: List[str],
+    ) -> ChunkAnalysisResult:
+        result = ChunkAnalysisResult()
+        steps = self._steps(build_message, keywords, categories, result)
+        reply: Any = None
+        while True:
+            try:
+                request = steps.send(reply)
+            except StopIteration:
+                return result
+            if isinstance(request, float):
+                await asyncio.sleep(request)
+                reply = None
+                continue
+            try:
+                with llm_lane(BATCH_LANE):
+                    reply = await arun(request)
+            except Exception as e:
+                reply = e
+
+    def _steps(
+        self,
+        build_message: Callable[[List[str], List[str]], str],
+        keywords: List[str],
+        categories: List[str],
+        result: ChunkAnalysisResult,
+    ) -> Generator[_Request, Any, None]:
+        """Yield the messages to send and the delays to wait; replies (responses or exceptions) are sent back in."""
+        # Parts still to analyze, last one first, so analyses come out in row order
+        parts: List[Tuple[List[str], List[str]]] = [(keywords, categories)]
+        while parts:
+            part_keywords, part_categories = parts.pop()
+            message = build_message(part_keywords, part_categories)
+            transient_failures = 0
+            parse_failures = 0
+            while True:
+                result.calls += 1
+                reply = yield message
+                if isinstance(reply, BaseException):
+                    if is_fatal_error(reply):
+                        raise reply
+                    if is_transient_error(reply) and transient_failures + 1 < self.policy.max_attempts:
+                        delay = self.policy.get_delay(transient_failures, self.rng)
+                        transient_failures += 1
+                        result.retries += 1
+                        logger.warning(
+                            f"Transient error on {len(part_keywords)} keywords, retrying in {delay:.1f}s: {reply}"
+                        )
+                        yield float(delay)
+                        continue
+                    failure = f"{type(reply).__name__}: {reply}"
+                    # Retrying a rate limit on smaller parts only makes it worse
+                    can_split = not is_transient_error(reply)
+                else:
+                    result.add_metrics(self.get_metrics(reply))
+                    analysis = self.parse_response(reply)
+                    if analysis is not None:
+                        result.analyses.append(analysis)
+                        break
+                    parse_failures += 1
+                    result.parse_failures += 1
+                    if parse_failures < self.policy.parse_attempts:
+                        result.retries += 1
+                        continue
+                    failure = "The model's answer could not be parsed"
+                    can_split = True
+
+                if can_split and len(part_keywords) > 1:
+                    middle = len(part_keywords) // 2
+                    parts.append((part_keywords[middle:], part_categories[middle:]))
+                    parts.append((part_keywords[:middle], part_categories[:middle]))
+                    result.splits += 1
+                    logger.warning(f"Splitting {len(part_keywords)} keywords in halves after: {failure}")
+                else:
+                    result.unrecoverable.append(UnrecoverableRows(keywords=list(part_keywords), reason=failure))
+                    logger.error(f"Giving up on {len(part_keywords)} keywords: {failure}")
+                break
@@ -1,18 +1,34 @@
 import asyncio
+import time
 import pandas as pd
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import Awaitable, Callable, List, Optional, Dict, Any, Union
 from textwrap import dedent
 import json
 import os
 
 from agno.agent import Agent
-from agno.models.openai import OpenAIChat
+from agno.run.base import RunStatus
 from agno.storage.sqlite import SqliteStorage
 from agno.workflow.v2.types import StepInput, StepOutput
 from agno.workflow.v2.workflow import Workflow
 from pydantic import BaseModel, Field
 
+from agents.models import get_openai_chat
+from metrics.instruments import instrument_keyword_run, record_keyword_analysis, record_keyword_chunk
+from workflows.chunk_budget import AdaptiveChunker, TokenUsage
+from workflows.chunk_retry import ChunkRetrier, ChunkRunError
+from workflows.keyword_prefilter import KeywordPrefilter, estimate_tokens
+from workflows.keyword_prompt import build_keyword_message, clean_table_cell, format_keyword_table
+from workflows.session_results import get_session_excel_path, get_session_result_store
+from workflows.verdict_cache import build_verdicts, get_instruction_hash, get_keyword_verdict_cache, normalize_keyword
+
+# Niche sent with every CSV chunk
+CSV_KEYWORD_NICHE = "Herbalism"
+
+# Rows parsed from the CSV file at a time; memory use is bounded by this plus one look-ahead window
+CSV_READ_BLOCK_ROWS = 10_000
+
 
 class KeywordEvaluation(BaseModel):
     keyword: str = Field(..., description="The keyword being evaluated.")
@@ -28,6 +44,86 @@ class CSVProcessingResult(BaseModel):
     valuable_keywords_found: int = Field(..., description="The total number of valuable keywords found.")
     output_path: str = Field(..., description="The path to the output Excel file.")
     processed_chunks: int = Field(..., description="The number of chunks processed.")
+    unrecoverable_keywords: List[str] = Field(
+        default_factory=list, description="Keywords that could not be analyzed, even after retries."
+    )
+
+
+def get_csv_string_dtype() -> str:
+    """Arrow-backed strings when pyarrow is installed, pandas' own string dtype otherwise."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "string"
+    return "string[pyarrow]"
+
+
+def read_csv_header(file_path: str) -> List[str]:
+    """Column names of a CSV file, read without loading any rows."""
+    try:
+        return [str(column) for column in pd.read_csv(file_path, nrows=0).columns]
+    except FileNotFoundError:
+        raise ValueError(f"File not found: {file_path}")
+    except Exception as e:
+        raise ValueError(f"Error reading CSV file: {e}")
+
+
+class CSVKeywordStream:
+    """
+    The keyword and category columns of a CSV file, parsed in blocks and handed out in chunks of any size.
+
+    Only the two columns are parsed, as compact string columns. Rows without a keyword are dropped and
+    missing categories become empty strings. At most one block plus the rows asked for are held in memory.
+    """
+
+    def __init__(
+        self, file_path: str, keyword_column: str, category_column: str, block_rows: int = CSV_READ_BLOCK_ROWS
+    ):
+        self.keyword_column = keyword_column
+        self.category_column = category_column
+        self.rows_read = 0
+        self._blocks = pd.read_csv(
+            file_path,
+            usecols=[keyword_column, category_column],
+            dtype=get_csv_string_dtype(),
+            chunksize=block_rows,
+        )
+        self._buffer = pd.DataFrame(columns=[keyword_column, category_column])
+        self._exhausted = False
+
+    def _fill(self, rows: int) -> None:
+        blocks = []
+        buffered = len(self._buffer)
+        while buffered < rows and not self._exhausted:
+            try:
+                block = next(self._blocks)
+            except StopIteration:
+                self._exhausted = True
+                self._blocks.close()
+                break
+            self.rows_read += len(block)
+            keywords = block[self.keyword_column].str.strip()
+            block = block.assign(
+                **{self.keyword_column: keywords, self.category_column: block[self.category_column].fillna("")}
+            )[keywords.fillna("") != ""]
+            blocks.append(block)
+            buffered += len(block)
+        if blocks:
+            self._buffer = pd.concat([self._buffer, *blocks] if len(self._buffer) else blocks, ignore_index=True)
+
+    def peek(self, rows: int) -> pd.DataFrame:
+        """The next `rows` keywords without consuming them."""
+        self._fill(rows)
+        return self._buffer.iloc[:rows]
+
+    def take(self, rows: int) -> pd.DataFrame:
+        """Consume and return the next `rows` keywords; fewer, or none, at the end of the file."""
+        self._fill(rows)
+        chunk, self._buffer = self._buffer.iloc[:rows], self._buffer.iloc[rows:]
+        return chunk
+
+    def close(self) -> None:
+        self._blocks.close()
 
 
 def create_csv_analysis_agent(
@@ -40,7 +136,7 @@ def create_csv_analysis_agent(
     return Agent(
         name="CSV Keyword Analysis Agent",
         agent_id="csv_keyword_analysis_agent",
-        model=OpenAIChat(id=model_id),
+        model=get_openai_chat(model_id),
         user_id=user_id,
         session_id=session_id,
         instructions=dedent('''
@@ -48,8 +144,8 @@ def create_csv_analysis_agent(
 
             Ensure that all evaluations are made solely based on the provided criteria without introducing any personal opinions or assumptions.
             ________________________________________________________________
-            The user will provide a message containing the keywords to analyze and their category.
-            The niche for all keywords is "Herbalism".
+            Each message starts with the niche of all of its keywords ("Niche: ..."), followed by a tab-separated
+            table with a header row: one keyword and its category per row.
             ________________________________________________________________
             First: analyze the keywords carefully to understand its context and its intent ( informational - commercial - Navigational - Transactional ), to determine the target audience whether it is (beginners OR intermediates OR experts) for the keywords.
             ________________________________________________________________
@@ -103,6 +199,31 @@ def create_csv_analysis_agent(
     )
 
 
+def get_step_session_id(step_input: StepInput) -> str:
+    """Session id passed to the workflow run through `additional_data`."""
+    if step_input.additional_data and step_input.additional_data.get('session_id'):
+        return step_input.additional_data['session_id']
+    if hasattr(step_input, 'workflow_state') and step_input.workflow_state:
+        return step_input.workflow_state.get('session_id', 'default')
+    return 'default'
+
+
+def get_chunk_analysis(result: Any) -> Optional[SEOKeywordAnalysis]:
+    """The analysis agent's answer from a workflow run, if it produced one."""
+    for step_response in getattr(result, 'step_responses', None) or []:
+        if isinstance(step_response.content, SEOKeywordAnalysis):
+            return step_response.content
+    return None
+
+
+def get_step_metrics(result: Any) -> Optional[Dict[str, Any]]:
+    """Model metrics of the agent step of a workflow run."""
+    for step_response in getattr(result, 'step_responses', None) or []:
+        if step_response.metrics and step_response.metrics.get('metrics'):
+            return step_response.metrics['metrics']
+    return None
+
+
 def prepare_csv_chunk_for_analysis(step_input: StepInput) -> StepOutput:
     """Prepare CSV chunk data for analysis by the AI agent."""
     chunk_data = step_input.message
@@ -110,13 +231,11 @@ def prepare_csv_chunk_for_analysis(step_input: StepInput) -> StepOutput:
     # Extract chunk information from the input
     # The input should contain the CSV chunk data
     return StepOutput(
-        content=dedent(f"""\
-        Please analyze the following keywords from the CSV chunk:
-        
-        {chunk_data}
-        
-        Please provide a structured analysis of these keywords according to the SEO criteria.
-        """)
+        content=(
+            "Please analyze the following keywords from the CSV chunk:\n\n"
+            f"{chunk_data}\n"
+            "Please provide a structured analysis of these keywords according to the SEO criteria.\n"
+        )
     )
 
 
@@ -140,57 +259,31 @@ def accumulate_analysis_results(step_input: StepInput) -> StepOutput:
         })
     
     # Get session ID from the workflow context or use a default
-    session_id = 'default'
-    if hasattr(step_input, 'workflow_state') and step_input.workflow_state:
-        session_id = step_input.workflow_state.get('session_id', 'default')
-    
-    # Create session-specific Excel file
-    session_excel_file = f"tmp/session_keywords_{session_id}.xlsx"
-    os.makedirs("tmp", exist_ok=True)
-    
-    # Load existing results from Excel file
-    existing_keywords = []
-    if os.path.exists(session_excel_file):
-        try:
-            existing_df = pd.read_excel(session_excel_file)
-            existing_keywords = existing_df.to_dict('records')
-        except:
-            existing_keywords = []
-    
-    # Add new keywords
-    existing_keywords.extend(keywords_data)
-    
-    # Save updated results to Excel file
-    if existing_keywords:
-        df = pd.DataFrame(existing_keywords)
-        df.to_excel(session_excel_file, index=False)
+    session_id = get_step_session_id(step_input)
     
+    # Append only this chunk's keywords; the Excel file is built when the session is finalized
+    result_store = get_session_result_store()
+    result_store.append(session_id, keywords_data)
+    session_keyword_count = result_store.count(session_id)
+    session_excel_file = get_session_excel_path(session_id)
+
     return StepOutput(
-        content=f"Successfully processed {len(keywords_data)} valuable keywords from this chunk. Total accumulated in session: {len(existing_keywords)} keywords. File: {session_excel_file}"
+        content=f"Successfully processed {len(keywords_data)} valuable keywords from this chunk. Total accumulated in session: {session_keyword_count} keywords. File: {session_excel_file}"
     )
 
 
 def save_session_results(step_input: StepInput) -> StepOutput:
     """Finalize the session Excel file and provide download link."""
     # Get session ID from the workflow context
-    session_id = 'default'
-    if hasattr(step_input, 'workflow_state') and step_input.workflow_state:
-        session_id = step_input.workflow_state.get('session_id', 'default')
-    
-    # Check the session Excel file
-    session_excel_file = f"tmp/session_keywords_{session_id}.xlsx"
-    session_keywords = []
-    
-    if os.path.exists(session_excel_file):
-        try:
-            df = pd.read_excel(session_excel_file)
-            session_keywords = df.to_dict('records')
-        except:
-            session_keywords = []
+    session_id = get_step_session_id(step_input)
     
-    if session_keywords:
+    # Count the session's keywords; the Excel file is built once when the file has been processed
+    session_keyword_count = get_session_result_store().count(session_id)
+    session_excel_file = get_session_excel_path(session_id)
+
+    if session_keyword_count:
         return StepOutput(
-            content=f"Session complete! Successfully processed {len(session_keywords)} total valuable keywords. Your Excel file is ready: {session_excel_file}"
+            content=f"Session complete! Successfully processed {session_keyword_count} total valuable keywords. Your Excel file will be available at: {session_excel_file}"
         )
     else:
         return StepOutput(
@@ -234,15 +327,17 @@ def create_session_based_csv_workflow(
     return workflow
 
 
+@instrument_keyword_run("csv")
 async def process_csv_file_with_session_workflow(
     input_file_path: str,
     output_file_path: str,
     keyword_column: str = 'keyword',
     category_column: str = 'category',
-    chunk_size: int = 100,
+    chunk_size: Union[int, str] = 100,
     model_id: str = "o4-mini",
     user_id: Optional[str] = None,
     session_id: Optional[str] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
 ) -> CSVProcessingResult:
     """
     Process a CSV file using Agno workflow v2 with session-based file creation.
@@ -252,26 +347,21 @@ async def process_csv_file_with_session_workflow(
         output_file_path: Path to save the output CSV file
         keyword_column: Name of the column containing keywords
         category_column: Name of the column containing categories
-        chunk_size: Number of rows to process in each chunk
+        chunk_size: Number of rows to process in each chunk, or "auto" to size chunks by estimated tokens
         model_id: OpenAI model ID to use
         user_id: User ID for the agent
         session_id: Session ID for the agent
+        on_progress: Awaited with the run's counters after every chunk; an exception it raises stops the run
     
     Returns:
         CSVProcessingResult with processing statistics
     """
     
-    # Read the CSV file
-    try:
-        df = pd.read_csv(input_file_path)
-    except FileNotFoundError:
-        raise ValueError(f"File not found: {input_file_path}")
-    except Exception as e:
-        raise ValueError(f"Error reading CSV file: {e}")
-
-    if keyword_column not in df.columns:
+    # Validate the columns from the header before any rows are loaded
+    columns = read_csv_header(input_file_path)
+    if keyword_column not in columns:
         raise ValueError(f"Keyword column '{keyword_column}' not found in the CSV file.")
-    if category_column not in df.columns:
+    if category_column not in columns:
         raise ValueError(f"Category column '{category_column}' not found in the CSV file.")
 
     # Create the session-based workflow
@@ -282,48 +372,190 @@ async def process_csv_file_with_session_workflow(
         debug_mode=True
     )
 
-    # Process the CSV in chunks
-    total_rows = len(df)
+    # Stream the CSV in chunks
     processed_chunks = 0
-
-    for start in range(0, total_rows, chunk_size):
-        end = min(start + chunk_size, total_rows)
-        chunk_df = df.iloc[start:end]
-        processed_chunks += 1
-
-        # Prepare chunk data for analysis
-        keywords_with_category = chunk_df[[keyword_column, category_column]].to_dict('records')
-        
-        chunk_message = f"Please analyze the following keywords (chunk {processed_chunks} of {(total_rows + chunk_size - 1) // chunk_size}):\n"
-        for item in keywords_with_category:
-            chunk_message += f"- Keyword: {item[keyword_column]}, Category: {item[category_column]}\n"
-
-        # Run the workflow for this chunk
-        try:
-            result = await session_workflow.arun(chunk_message)
-            print(f"Processed chunk {processed_chunks}/{total_rows // chunk_size + 1}")
-            
-        except Exception as e:
-            print(f"Warning: Error processing chunk {start}-{end}: {e}")
-            continue
-
-    # Get the session Excel file path
+    analyzed_rows = 0
     session_id = session_id or 'default'
-    session_excel_file = f"tmp/session_keywords_{session_id}.xlsx"
-    
-    # Count the total keywords from the session file
-    total_keywords = 0
-    if os.path.exists(session_excel_file):
-        try:
-            df = pd.read_excel(session_excel_file)
-            total_keywords = len(df)
-        except:
-            total_keywords = 0
+    result_store = get_session_result_store()
+
+    # Keywords analyzed before with the same model and prompt are answered from the verdict cache
+    analysis_agent = session_workflow.steps[1]
+    verdict_cache = get_keyword_verdict_cache()
+    instruction_hash = get_instruction_hash(analysis_agent.model.id, str(analysis_agent.instructions))
+    cache_hits = 0
+
+    # Single-word, English-only and near-duplicate rules are enforced locally, across all chunks
+    keyword_prefilter = KeywordPrefilter(single_word_only=True)
+    prefiltered: Dict[str, int] = {}
+    prefilter_tokens_saved = 0
+    analysis_seconds = 0.0
+    analyzed_keywords = 0
+    token_usage = TokenUsage()
+
+    # Failed runs are retried with backoff, and chunks that keep failing are split, instead of being dropped
+    retrier = ChunkRetrier(get_chunk_analysis, get_metrics=get_step_metrics)
+    unrecoverable: List[str] = []
+    retries = 0
+    splits = 0
+
+    async def run_chunk(message: str) -> Any:
+        result = await session_workflow.arun(message, additional_data={'session_id': session_id}, session_id=session_id)
+        # Workflow v2 reports step failures on the response instead of raising them
+        if getattr(result, 'status', None) == RunStatus.error:
+            raise ChunkRunError(str(result.content))
+        return result
+
+    async def report_progress() -> None:
+        if on_progress is not None:
+            await on_progress({
+                'rows_read': keyword_stream.rows_read,
+                'analyzed_rows': analyzed_rows,
+                'processed_chunks': processed_chunks,
+                'cache_hits': cache_hits,
+                'prefiltered': sum(prefiltered.values()),
+                'analysis_retries': retries,
+                'analysis_splits': splits,
+                'unrecoverable_keywords': len(unrecoverable),
+            })
+
+    def build_chunk_message(keywords: List[str], categories: List[str]) -> str:
+        # The agent's instructions are the same for every chunk; the niche and keywords come last
+        return build_keyword_message(CSV_KEYWORD_NICHE, format_keyword_table(keywords, categories))
+
+    chunker = None
+    if str(chunk_size).strip().lower() == "auto":
+        chunker = AdaptiveChunker(analysis_agent.model.id, instruction_tokens=estimate_tokens(str(analysis_agent.instructions)))
+        chunk_size = 100
+    chunk_size = int(chunk_size)
+
+    keyword_stream = CSVKeywordStream(input_file_path, keyword_column, category_column)
+    try:
+        while True:
+            if chunker is not None:
+                window = keyword_stream.peek(chunker.max_rows)
+                chunk_size = chunker.size_next_chunk(window[keyword_column], window[category_column])
+            chunk_df = keyword_stream.take(chunk_size)
+            if chunk_df.empty:
+                break
+            chunk_start, end = analyzed_rows, analyzed_rows + len(chunk_df)
+            analyzed_rows = end
+            processed_chunks += 1
+            record_keyword_chunk("csv", len(chunk_df))
+
+            # Prepare chunk data for analysis
+            keywords = chunk_df[keyword_column].tolist()
+            categories = chunk_df[category_column].tolist()
+            prefilter_result = keyword_prefilter.filter(keywords)
+            if prefilter_result.rejections:
+                rejected_lines = [
+                    f"{clean_table_cell(keyword)}\t{clean_table_cell(category)}\n"
+                    for keyword, category, keep in zip(keywords, categories, prefilter_result.keep) if not keep
+                ]
+                for rule, count in prefilter_result.rejected_by_rule.items():
+                    prefiltered[rule] = prefiltered.get(rule, 0) + count
+                prefilter_tokens_saved += estimate_tokens("".join(rejected_lines))
+                result_store.append_rejections(
+                    session_id,
+                    [{'keyword': r.keyword, 'rule': r.rule, 'reason': r.reason} for r in prefilter_result.rejections],
+                )
+                keywords = [keyword for keyword, keep in zip(keywords, prefilter_result.keep) if keep]
+                categories = [category for category, keep in zip(categories, prefilter_result.keep) if keep]
+
+            try:
+                cached = verdict_cache.get_many(keywords, CSV_KEYWORD_NICHE, instruction_hash)
+            except Exception as e:
+                print(f"Warning: Keyword verdict cache lookup failed: {e}")
+                cached = {}
+
+            cached_keywords = []
+            to_analyze: List[str] = []
+            to_analyze_categories: List[str] = []
+            for keyword, category in zip(keywords, categories):
+                verdict = cached.get(normalize_keyword(keyword))
+                if verdict is None:
+                    to_analyze.append(keyword)
+                    to_analyze_categories.append(category)
+                elif verdict.included:
+                    cached_keywords.append({'keyword': keyword, 'reason': verdict.reason})
+            cache_hits += len(keywords) - len(to_analyze)
+            result_store.append(session_id, cached_keywords)
+
+            if not to_analyze:
+                print(f"Processed chunk {processed_chunks} (keywords {chunk_start + 1}-{end}) without the model")
+                await report_progress()
+                continue
+
+            # Run the workflow for this chunk, or for parts of it if it keeps failing
+            started_at = time.perf_counter()
+            chunk_result = await retrier.aanalyze(run_chunk, build_chunk_message, to_analyze, to_analyze_categories)
+            chunk_seconds = time.perf_counter() - started_at
+            analysis_seconds += chunk_seconds
+            analyzed_keywords += len(to_analyze)
+            chunk_usage = TokenUsage.from_metrics(chunk_result.metrics)
+            token_usage.add(chunk_usage)
+            record_keyword_analysis("csv", chunk_seconds, len(to_analyze), chunk_usage)
+            retries += chunk_result.retries
+            splits += chunk_result.splits
+            print(
+                f"Processed chunk {processed_chunks} (keywords {chunk_start + 1}-{end}, "
+                f"tokens: {chunk_usage.describe()})"
+            )
+            for rows in chunk_result.unrecoverable:
+                print(
+                    f"Warning: Could not analyze {len(rows.keywords)} keywords of chunk {processed_chunks}: "
+                    f"{rows.reason}"
+                )
+                unrecoverable.extend(rows.keywords)
+
+            if chunker is not None:
+                chunker.record_result(chunk_result.parse_failures == 0, chunk_result.max_output_tokens)
+            if chunk_result.analyses:
+                failed = set(chunk_result.unrecoverable_keywords)
+                valuable = {
+                    keyword_eval.keyword: keyword_eval.reason
+                    for analysis in chunk_result.analyses
+                    for keyword_eval in analysis.valuable_keywords
+                }
+                try:
+                    verdict_cache.put_many(
+                        build_verdicts([keyword for keyword in to_analyze if keyword not in failed], valuable),
+                        CSV_KEYWORD_NICHE,
+                        instruction_hash,
+                    )
+                except Exception as e:
+                    print(f"Warning: Keyword verdict cache update failed: {e}")
+            await report_progress()
+    finally:
+        keyword_stream.close()
+
+    print(f"Keyword cache hits: {cache_hits}/{analyzed_rows} (of {keyword_stream.rows_read} rows read)")
+    if token_usage.input_tokens:
+        print(f"Model tokens: {token_usage.describe()}")
+    if retries or splits:
+        print(f"Recovered model calls: {retries} retries, {splits} chunk splits")
+    if unrecoverable:
+        print(
+            f"Unrecoverable rows: {len(unrecoverable)} keywords could not be analyzed: "
+            f"{', '.join(unrecoverable[:20])}{'...' if len(unrecoverable) > 20 else ''}"
+        )
+    if prefiltered:
+        prefiltered_total = sum(prefiltered.values())
+        seconds_saved = analysis_seconds / analyzed_keywords * prefiltered_total if analyzed_keywords else 0.0
+        rules = ", ".join(f"{rule.replace('_', ' ')}: {count}" for rule, count in sorted(prefiltered.items()))
+        print(
+            f"Pre-filtered {prefiltered_total} keywords ({rules}): "
+            f"~{prefilter_tokens_saved} prompt tokens and ~{seconds_saved:.1f}s of model time saved"
+        )
+
+    # Build the session Excel file once from the accumulated results
+    total_keywords = result_store.count(session_id)
+    session_excel_file = result_store.export_excel(session_id) or get_session_excel_path(session_id)
 
     return CSVProcessingResult(
         valuable_keywords_found=total_keywords,
         output_path=session_excel_file,
-        processed_chunks=processed_chunks
+        processed_chunks=processed_chunks,
+        unrecoverable_keywords=unrecoverable,
     )
 
 
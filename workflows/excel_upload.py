@@ -0,0 +1,138 @@
+import base64
+import binascii
+import os
+import re
+import tempfile
+from os import getenv
+from typing import Optional
+
+from agno.utils.log import logger
+
+# Leading bytes of .xlsx (zip), legacy .xls (OLE2) and BIFF workbooks
+EXCEL_SIGNATURES = [
+    b"\x50\x4b\x03\x04",
+    b"\xd0\xcf\x11\xe0",
+    b"\x09\x08\x10\x00",
+]
+SIGNATURE_LENGTH = max(len(signature) for signature in EXCEL_SIGNATURES)
+
+MAX_EXCEL_UPLOAD_BYTES = int(getenv("MAX_EXCEL_UPLOAD_MB", "200")) * 1024 * 1024
+
+# Base64 input is decoded in slices of this many characters (a multiple of 4)
+BASE64_SLICE_CHARS = 4 * 256 * 1024
+
+_UPLOAD_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+_BASE64_WHITESPACE = re.compile(r"\s+")
+_BASE64_INVALID = re.compile(r"[^A-Za-z0-9+/=]")
+
+
+class ExcelUploadError(ValueError):
+    """Raised when an uploaded workbook is rejected."""
+
+
+def get_excel_input_path(upload_id: Optional[str]) -> str:
+    """Path an uploaded workbook is stored at, validating the id so it can't escape tmp/."""
+    upload_id = upload_id or "default"
+    if not _UPLOAD_ID_PATTERN.match(upload_id):
+        raise ExcelUploadError(f"Invalid upload id: {upload_id}")
+    return f"tmp/input_excel_{upload_id}.xlsx"
+
+
+class ExcelUploadWriter:
+    """
+    Write an Excel upload to disk incrementally.
+
+    Bytes are appended to a temporary file as they arrive. The workbook signature is checked as soon
+    as the first bytes are in and the size limit on every write, so bad or oversized uploads are
+    rejected without buffering the whole body. `finish()` moves the complete file into place.
+    """
+
+    def __init__(self, file_path: str, max_bytes: int = MAX_EXCEL_UPLOAD_BYTES):
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._head = b""
+        file_dir, file_name = os.path.split(file_path)
+        os.makedirs(file_dir or ".", exist_ok=True)
+        # A temporary file of its own, so concurrent writes to the same path can't mix their bytes
+        base, ext = os.path.splitext(file_name)
+        fd, self._tmp_path = tempfile.mkstemp(dir=file_dir or ".", prefix=f"{base}.part-", suffix=ext)
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise ExcelUploadError(f"Upload exceeds the {self.max_bytes // (1024 * 1024)} MB limit")
+
+        if len(self._head) < SIGNATURE_LENGTH:
+            self._head += data[: SIGNATURE_LENGTH - len(self._head)]
+            if len(self._head) >= SIGNATURE_LENGTH:
+                self._check_signature()
+
+        self._file.write(data)
+
+    def _check_signature(self) -> None:
+        if not any(self._head.startswith(signature) for signature in EXCEL_SIGNATURES):
+            raise ExcelUploadError("Upload is not an Excel workbook")
+
+    def finish(self) -> str:
+        """Close the file and move it into place, returning its path."""
+        self._file.close()
+        if self.size == 0:
+            self.abort()
+            raise ExcelUploadError("Upload is empty")
+        if len(self._head) < SIGNATURE_LENGTH:
+            self.abort()
+            raise ExcelUploadError("Upload is not an Excel workbook")
+        os.replace(self._tmp_path, self.file_path)
+        return self.file_path
+
+    def abort(self) -> None:
+        """Discard the partially written file."""
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def write_base64_excel(base64_string: str, file_path: str, max_bytes: int = MAX_EXCEL_UPLOAD_BYTES) -> str:
+    """
+    Decode a base64-encoded workbook to `file_path` slice by slice.
+
+    Only one slice of the string is stripped and decoded at a time, and the bytes go straight to an
+    ExcelUploadWriter, so peak memory stays close to the size of the input string itself.
+    """
+    writer = ExcelUploadWriter(file_path, max_bytes=max_bytes)
+    carry = ""
+    padded = False
+    try:
+        for offset in range(0, len(base64_string), BASE64_SLICE_CHARS):
+            piece = _BASE64_WHITESPACE.sub("", base64_string[offset : offset + BASE64_SLICE_CHARS])
+            if not piece:
+                continue
+            if padded or _BASE64_INVALID.search(piece):
+                raise ExcelUploadError("Upload is not valid base64")
+
+            piece = carry + piece
+            usable = len(piece) - len(piece) % 4
+            piece, carry = piece[:usable], piece[usable:]
+            if "=" in piece:
+                # Padding may only close the input
+                padded = True
+                unpadded = piece.rstrip("=")
+                if "=" in unpadded or len(piece) - len(unpadded) > 2:
+                    raise ExcelUploadError("Upload is not valid base64")
+            writer.write(base64.b64decode(piece, validate=True))
+
+        if carry:
+            raise ExcelUploadError("Upload is not valid base64")
+        return writer.finish()
+    except (binascii.Error, ExcelUploadError) as e:
+        writer.abort()
+        logger.warning(f"Rejected base64 Excel upload: {e}")
+        raise ExcelUploadError(str(e)) from e
+    except Exception:
+        writer.abort()
+        raise
@@ -1,236 +1,584 @@
 import asyncio
-import base64
 import pandas as pd
 import os
-import re
-from typing import List, Optional, Dict, Any, Iterator, Union
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Any, AsyncIterator, Callable, Deque, Generator, Iterator, Set, Union
 from textwrap import dedent
 from pathlib import Path
 
 from agno.agent import Agent
-from agno.models.openai import OpenAIChat
 from agno.storage.sqlite import SqliteStorage
 from agno.workflow import RunResponse, Workflow, WorkflowCompletedEvent
 from pydantic import BaseModel, Field
 from agno.utils.log import logger
 
-current_row_position = 0
-
-
-def read_excel_chunk_with_calamine(filename: str, chunk_size: int = 100, reset_position: bool = False) -> tuple[pd.DataFrame, int, int]:
+from agents.models import get_openai_chat
+from metrics.instruments import instrument_keyword_run, record_keyword_analysis, record_keyword_chunk
+from workflows.excel_upload import ExcelUploadError, get_excel_input_path, write_base64_excel
+from workflows.chunk_budget import AdaptiveChunker, TokenUsage
+from workflows.chunk_retry import ChunkAnalysisResult, ChunkRetrier, UnrecoverableRows
+from workflows.keyword_prefilter import KeywordPrefilter, estimate_tokens
+from workflows.keyword_prompt import build_keyword_message, format_keyword_table
+from workflows.run_checkpoints import ExcelRunCheckpoint, get_excel_run_checkpoint_store, get_file_sha256
+from workflows.session_results import get_session_excel_path, get_session_result_store
+from workflows.workbook_inspect import SheetInfo, read_calamine_sheet_info, read_xlsx_sheet_info
+from workflows.verdict_cache import (
+    KeywordVerdict,
+    build_verdicts,
+    get_instruction_hash,
+    get_keyword_verdict_cache,
+    normalize_keyword,
+)
+
+
+class ExcelChunkReader:
     """
-    Read Excel file using CalamineWorkbook and return a chunk of rows from the CATEGORY sheet
-
-    Args:
-        filename (str): Path to Excel file
-        chunk_size (int): Number of rows to read per chunk (default: 100)
-        reset_position (bool): Whether to reset the global position counter (default: False)
+    Open an Excel workbook once and serve row chunks from its CATEGORY sheet.
 
-    Returns:
-        tuple: (DataFrame chunk, start_row, end_row)
+    The sheet is parsed a single time (python-calamine first, pandas as a fallback) and
+    cached as one DataFrame, so chunking and progress checks never re-read the workbook.
+    Row count and column names come from the workbook metadata and don't need the rows
+    to be loaded at all.
     """
-    global current_row_position
-
-    if reset_position:
-        current_row_position = 0
 
-    try:
-        try:
-            from python_calamine import CalamineWorkbook
-            workbook = CalamineWorkbook.from_path(filename)
+    def __init__(self, filename: str, sheet_name: str = "CATEGORY"):
+        self.filename = filename
+        self.sheet_name = sheet_name
+        self._df: Optional[pd.DataFrame] = None
+        self._info: Optional[SheetInfo] = None
+        self._workbook: Any = None
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """The parsed sheet, loaded on first access."""
+        if self._df is None:
+            self._df = self._load()
+        return self._df
+
+    @property
+    def total_rows(self) -> int:
+        return len(self._df) if self._df is not None else self.inspect().total_rows
+
+    @property
+    def column_names(self) -> List[str]:
+        return list(self._df.columns) if self._df is not None else list(self.inspect().column_names)
+
+    def inspect(self) -> SheetInfo:
+        """
+        Sheet dimensions and header row, without converting the rows.
+
+        Read from the xlsx sheet XML when it declares its dimensions, otherwise from the calamine
+        sheet dimensions; the sheet is only fully loaded when neither is available.
+        """
+        if self._info is not None:
+            return self._info
+        if self._df is None:
+            try:
+                self._info = read_xlsx_sheet_info(self.filename, self.sheet_name)
+            except Exception as e:
+                logger.warning(f"Could not read xlsx metadata: {e}")
+            if self._info is None and self._open_workbook() is not None:
+                try:
+                    self._info = read_calamine_sheet_info(self._workbook, self.sheet_name)
+                except Exception as e:
+                    logger.warning(f"Could not read calamine sheet dimensions: {e}")
+        if self._info is None:
+            self._info = SheetInfo(sheet_name=self.sheet_name, total_rows=len(self.df), column_names=list(self.df.columns))
+        return self._info
+
+    def _open_workbook(self) -> Any:
+        """The CalamineWorkbook for this file, opened once and shared by inspection and loading."""
+        if self._workbook is None:
+            try:
+                from python_calamine import CalamineWorkbook
 
+                self._workbook = CalamineWorkbook.from_path(self.filename)
+            except ImportError:
+                logger.info("CalamineWorkbook not available")
+            except Exception as e:
+                logger.warning(f"CalamineWorkbook failed to open {self.filename}: {e}")
+        return self._workbook
 
+    def _load(self) -> pd.DataFrame:
+        try:
+            workbook = self._open_workbook()
+            if workbook is None:
+                raise ImportError("CalamineWorkbook unavailable")
             sheet_names = workbook.sheet_names
-            print(f"Available sheets: {sheet_names}")
+            logger.info(f"Available sheets: {sheet_names}")
 
-            if "CATEGORY" not in sheet_names:
-                print("CATEGORY sheet not found, trying first available sheet...")
+            if self.sheet_name not in sheet_names:
+                logger.info(f"{self.sheet_name} sheet not found, using first available sheet...")
                 sheet_name = sheet_names[0] if sheet_names else "Sheet1"
             else:
-                sheet_name = "CATEGORY"
+                sheet_name = self.sheet_name
 
             sheet_data = workbook.get_sheet_by_name(sheet_name).to_python()
+            if not sheet_data:
+                return pd.DataFrame()
+            return pd.DataFrame(sheet_data[1:], columns=sheet_data[0])
 
+        except ImportError:
+            logger.info("CalamineWorkbook not available, using pandas with calamine engine...")
+        except Exception as e:
+            logger.warning(f"CalamineWorkbook failed: {e}, using pandas with calamine engine...")
 
-            if sheet_data:
-                headers = sheet_data[0]
-                data = sheet_data[1:]
-                df = pd.DataFrame(data, columns=headers)
-            else:
-                df = pd.DataFrame()
+        try:
+            return pd.read_excel(self.filename, engine="calamine", sheet_name=self.sheet_name)
+        except Exception:
+            logger.info("Calamine engine failed, using default engine...")
 
-        except ImportError:
-            print("CalamineWorkbook not available, trying pandas with calamine engine...")
-            try:
-                df = pd.read_excel(filename, engine='calamine', sheet_name="CATEGORY")
-            except:
-                print("Calamine engine failed, trying default engine...")
-                df = pd.read_excel(filename, sheet_name="CATEGORY")
+        try:
+            return pd.read_excel(self.filename, sheet_name=self.sheet_name)
         except Exception as e:
-            print(f"CalamineWorkbook failed: {e}, trying pandas with calamine engine...")
-            try:
-                df = pd.read_excel(filename, engine='calamine', sheet_name="CATEGORY")
-            except:
-                print("Calamine engine failed, trying default engine...")
-                df = pd.read_excel(filename, sheet_name="CATEGORY")
+            raise Exception(f"Failed to read Excel file {self.sheet_name} sheet: {str(e)}")
+
+    def read_chunk(self, start_row: int, chunk_size: int = 100) -> tuple[pd.DataFrame, int, int]:
+        """
+        Return the rows in [start_row, start_row + chunk_size) of the cached sheet.
+
+        Args:
+            start_row (int): First row of the chunk (0-based, header excluded)
+            chunk_size (int): Maximum number of rows in the chunk
+
+        Returns:
+            tuple: (DataFrame chunk, start_row, end_row)
+        """
+        total_rows = len(self.df)
+        if start_row >= total_rows:
+            return pd.DataFrame(), start_row, total_rows
 
-        total_rows = len(df)
+        end_row = min(start_row + chunk_size, total_rows)
+        return self.df.iloc[start_row:end_row].copy(), start_row, end_row
 
-        if current_row_position >= total_rows:
-            print("Reached end of file")
-            return pd.DataFrame(), current_row_position, total_rows
+    def iter_chunks(self, chunk_size: int = 100, start_row: int = 0) -> Iterator[tuple[pd.DataFrame, int, int]]:
+        """Lazily yield (DataFrame chunk, start_row, end_row) tuples until the sheet is exhausted."""
+        position = start_row
+        while position < self.total_rows:
+            chunk_df, chunk_start, chunk_end = self.read_chunk(position, chunk_size)
+            position = chunk_end
+            yield chunk_df, chunk_start, chunk_end
 
-        end_row = min(current_row_position + chunk_size, total_rows)
 
-        chunk_df = df.iloc[current_row_position:end_row].copy()
+@dataclass
+class ChunkCursor:
+    """Row position of a single ExcelProcessor run within its workbook."""
 
-        start_row = current_row_position
-        current_row_position = end_row
+    position: int = 0
+
+    def advance(self, end_row: int) -> None:
+        self.position = end_row
+
+    def reset(self) -> None:
+        self.position = 0
+
+
+def read_excel_chunk_with_calamine(
+    reader: ExcelChunkReader, cursor: ChunkCursor, chunk_size: int = 100
+) -> tuple[pd.DataFrame, int, int]:
+    """
+    Return the next chunk of rows from the reader's CATEGORY sheet and advance the cursor
 
-        print(f"Read chunk: rows {start_row + 1} to {end_row} (chunk size: {len(chunk_df)})")
+    Args:
+        reader (ExcelChunkReader): Reader holding the parsed workbook
+        cursor (ChunkCursor): Position of the current run within the sheet
+        chunk_size (int): Number of rows to read per chunk (default: 100)
 
+    Returns:
+        tuple: (DataFrame chunk, start_row, end_row)
+    """
+    chunk_df, start_row, end_row = reader.read_chunk(cursor.position, chunk_size)
+    if chunk_df.empty:
+        logger.debug("Reached end of file")
         return chunk_df, start_row, end_row
 
-    except Exception as e:
-        print(f"Error reading Excel file: {str(e)}")
-        try:
-            print("Trying fallback to default pandas engine...")
-            df = pd.read_excel(filename, sheet_name="CATEGORY")
+    cursor.advance(end_row)
+    logger.debug(f"Read chunk: rows {start_row + 1} to {end_row} (chunk size: {len(chunk_df)})")
+
+    return chunk_df, start_row, end_row
 
-            total_rows = len(df)
-            print(f"Total rows in CATEGORY sheet: {total_rows}")
 
-            if current_row_position >= total_rows:
-                print("Reached end of file")
-                return pd.DataFrame(), current_row_position, total_rows
+def has_more_chunks(reader: ExcelChunkReader, cursor: ChunkCursor) -> bool:
+    """Check if there are more chunks available after the cursor in the reader's CATEGORY sheet."""
+    try:
+        return cursor.position < reader.total_rows
+    except Exception as e:
+        logger.warning(f"Error checking for more chunks: {e}")
+        return False
 
-            end_row = min(current_row_position + chunk_size, total_rows)
-            chunk_df = df.iloc[current_row_position:end_row].copy()
 
-            start_row = current_row_position
-            current_row_position = end_row
+def get_excel_file_info(reader: ExcelChunkReader, cursor: Optional[ChunkCursor] = None) -> dict:
+    """Get information about the reader's CATEGORY sheet."""
+    try:
+        position = cursor.position if cursor is not None else 0
+        total_rows = reader.total_rows
+        column_names = reader.column_names
+        return {
+            'total_rows': total_rows,
+            'total_columns': len(column_names),
+            'column_names': column_names,
+            'current_position': position,
+            'remaining_rows': total_rows - position
+        }
+    except Exception as e:
+        logger.warning(f"Error getting Excel file info: {e}")
+        return {}
 
-            print(f"Read chunk with fallback: rows {start_row + 1} to {end_row} (chunk size: {len(chunk_df)})")
 
-            return chunk_df, start_row, end_row
+KEYWORD_COLUMN_HINTS = ['keyword', 'term', 'phrase', 'word']
+CATEGORY_COLUMN_HINTS = ['category', 'type', 'class', 'group']
+MISSING_KEYWORD_VALUES = ['nan', 'none', '']
+DISPLAY_KEYWORD_LIMIT = 15
+# Unrecoverable row groups listed in a run summary
+UNRECOVERABLE_REPORT_LIMIT = 20
 
-        except Exception as fallback_error:
-            print(f"Fallback also failed: {str(fallback_error)}")
-            raise Exception(f"Failed to read Excel file CATEGORY sheet: {str(e)}")
 
+@dataclass
+class KeywordColumns:
+    """The keyword and category columns of a workbook, detected once per file."""
 
-def reset_excel_position():
-    """Reset the global Excel row position counter."""
-    global current_row_position
-    current_row_position = 0
-    print("Reset Excel position counter to 0")
+    keyword_column: Any
+    category_column: Optional[Any] = None
 
 
-def get_current_excel_position() -> int:
-    """Get the current Excel row position."""
-    global current_row_position
-    return current_row_position
+def parse_flag(value: str) -> bool:
+    """Interpret a string workflow input such as "true"/"false" as a boolean."""
+    return str(value).strip().lower() not in ("false", "0", "no", "off")
 
 
-def has_more_chunks(excel_file_path: str) -> bool:
-    """Check if there are more chunks available in the Excel file CATEGORY sheet."""
-    try:
-        try:
-            from python_calamine import CalamineWorkbook
-            workbook = CalamineWorkbook.from_path(excel_file_path)
+def detect_keyword_columns(columns: List[Any]) -> KeywordColumns:
+    """Pick the keyword and category columns from the sheet header by name."""
+    keyword_column = None
+    category_column = None
 
-            sheet_names = workbook.sheet_names
-            if "CATEGORY" not in sheet_names:
-                sheet_name = sheet_names[0] if sheet_names else "Sheet1"
-            else:
-                sheet_name = "CATEGORY"
+    for col in columns:
+        col_lower = str(col).lower()
+        if any(hint in col_lower for hint in KEYWORD_COLUMN_HINTS):
+            keyword_column = col
+        elif any(hint in col_lower for hint in CATEGORY_COLUMN_HINTS):
+            category_column = col
 
-            sheet_data = workbook.get_sheet_by_name(sheet_name).to_python()
+    if keyword_column is None and len(columns) > 0:
+        keyword_column = columns[0]
 
-            if sheet_data:
-                headers = sheet_data[0]
-                data = sheet_data[1:]
-                df = pd.DataFrame(data, columns=headers)
-            else:
-                df = pd.DataFrame()
+    return KeywordColumns(keyword_column=keyword_column, category_column=category_column)
 
-        except ImportError:
-            print("CalamineWorkbook not available, using pandas with calamine engine...")
-            try:
-                df = pd.read_excel(excel_file_path, engine='calamine', sheet_name="CATEGORY")
-            except:
-                print("Calamine engine failed, using default engine...")
-                df = pd.read_excel(excel_file_path, sheet_name="CATEGORY")
-        except Exception as e:
-            print(f"CalamineWorkbook failed: {e}, using pandas with calamine engine...")
-            try:
-                df = pd.read_excel(excel_file_path, engine='calamine', sheet_name="CATEGORY")
-            except:
-                print("Calamine engine failed, using default engine...")
-                df = pd.read_excel(excel_file_path, sheet_name="CATEGORY")
 
-        total_rows = len(df)
-        current_pos = get_current_excel_position()
+@dataclass
+class PreparedChunk:
+    """The valid keywords of a chunk with the prompt and preview built from them."""
 
-        return current_pos < total_rows
-    except Exception as e:
-        print(f"Error checking for more chunks: {e}")
-        return False
+    keywords: List[str]
+    categories: List[str]
+    prompt: Optional[str]
+    display: str
+    start_row: int = 0
+    end_row: int = 0
 
+    @property
+    def keyword_count(self) -> int:
+        return len(self.keywords)
 
-def get_excel_file_info(excel_file_path: str) -> dict:
-    """Get information about the Excel file CATEGORY sheet."""
-    try:
-        try:
-            from python_calamine import CalamineWorkbook
-            workbook = CalamineWorkbook.from_path(excel_file_path)
+    def select(self, keep: List[bool]) -> "PreparedChunk":
+        """Return the chunk restricted to the keywords flagged in `keep`, with its prompt rebuilt."""
+        return build_prepared_chunk(
+            [keyword for keyword, kept in zip(self.keywords, keep) if kept],
+            [category for category, kept in zip(self.categories, keep) if kept],
+            self.start_row,
+            self.end_row,
+        )
 
-            sheet_names = workbook.sheet_names
-            print(f"Available sheets: {sheet_names}")
 
-            if "CATEGORY" not in sheet_names:
-                print("CATEGORY sheet not found, using first available sheet...")
-                sheet_name = sheet_names[0] if sheet_names else "Sheet1"
-            else:
-                sheet_name = "CATEGORY"
+def build_prepared_chunk(keywords: List[str], categories: List[str], start_row: int, end_row: int) -> PreparedChunk:
+    """Build the analysis prompt and display preview for a chunk's keywords in one pass."""
+    if not keywords:
+        return PreparedChunk(
+            keywords=[],
+            categories=[],
+            prompt=None,
+            display="No valid keywords found in this chunk.",
+            start_row=start_row,
+            end_row=end_row,
+        )
 
-            print(f"Reading sheet: {sheet_name}")
-            sheet_data = workbook.get_sheet_by_name(sheet_name).to_python()
+    prompt = format_keyword_table(keywords, categories)
+
+    display_lines = [
+        f"• {keyword} ({category})"
+        for keyword, category in zip(keywords[:DISPLAY_KEYWORD_LIMIT], categories[:DISPLAY_KEYWORD_LIMIT])
+    ]
+    if len(keywords) > DISPLAY_KEYWORD_LIMIT:
+        display_lines.append(f"... and {len(keywords) - DISPLAY_KEYWORD_LIMIT} more")
+
+    return PreparedChunk(
+        keywords=keywords,
+        categories=categories,
+        prompt=prompt,
+        display='\n'.join(display_lines),
+        start_row=start_row,
+        end_row=end_row,
+    )
 
-            # Convert to DataFrame
-            if sheet_data:
-                # Use first row as headers
-                headers = sheet_data[0]
-                data = sheet_data[1:]  # Skip header row
-                df = pd.DataFrame(data, columns=headers)
-            else:
-                df = pd.DataFrame()
 
-        except ImportError:
-            print("CalamineWorkbook not available, using pandas with calamine engine...")
-            try:
-                df = pd.read_excel(excel_file_path, engine='calamine', sheet_name="CATEGORY")
-            except:
-                print("Calamine engine failed, using default engine...")
-                df = pd.read_excel(excel_file_path, sheet_name="CATEGORY")
-        except Exception as e:
-            print(f"CalamineWorkbook failed: {e}, using pandas with calamine engine...")
-            try:
-                df = pd.read_excel(excel_file_path, engine='calamine', sheet_name="CATEGORY")
-            except:
-                print("Calamine engine failed, using default engine...")
-                df = pd.read_excel(excel_file_path, sheet_name="CATEGORY")
+def prepare_keyword_chunk(chunk_df: pd.DataFrame, columns: KeywordColumns, start_row: int, end_row: int) -> PreparedChunk:
+    """
+    Extract the valid keywords of a chunk and build the analysis prompt and display preview.
 
+    Missing and empty keywords are dropped with vectorized pandas operations; chunks without a
+    category column are labelled 'general'.
+    """
+    if chunk_df.empty or columns.keyword_column not in chunk_df.columns:
+        return build_prepared_chunk([], [], start_row, end_row)
+
+    keyword_series = chunk_df[columns.keyword_column]
+    keyword_series = keyword_series[keyword_series.notna()].astype(str).str.strip()
+    keyword_series = keyword_series[~keyword_series.str.lower().isin(MISSING_KEYWORD_VALUES)]
+
+    if columns.category_column is not None and columns.category_column in chunk_df.columns:
+        category_series = chunk_df.loc[keyword_series.index, columns.category_column].astype(str).str.strip()
+    else:
+        category_series = pd.Series('general', index=keyword_series.index)
+
+    return build_prepared_chunk(keyword_series.tolist(), category_series.tolist(), start_row, end_row)
+
+
+@dataclass
+class ExcelRunProgress:
+    """Settings and counters shared by the chunks of a single ExcelProcessor run."""
+
+    total_rows: int = 0
+    estimated_chunks: int = 0
+    completed_chunks: int = 0
+    total_keywords: int = 0
+    niche: str = ""
+    instruction_hash: str = ""
+    use_cache: bool = True
+    cache_lookups: int = 0
+    cache_hits: int = 0
+    prefiltered: Dict[str, int] = field(default_factory=dict)
+    prefilter_tokens_saved: int = 0
+    analysis_seconds: float = 0.0
+    analyzed_keyword_count: int = 0
+    token_usage: TokenUsage = field(default_factory=TokenUsage)
+    analysis_retries: int = 0
+    analysis_splits: int = 0
+    unrecoverable: List["UnrecoverableChunkRows"] = field(default_factory=list)
+    chunker: Optional[AdaptiveChunker] = None
+    checkpoint: Optional[ExcelRunCheckpoint] = None
+
+    @property
+    def cache_hit_rate(self) -> float:
+        return (self.cache_hits / self.cache_lookups * 100) if self.cache_lookups else 0.0
+
+    @property
+    def prefiltered_total(self) -> int:
+        return sum(self.prefiltered.values())
+
+    @property
+    def prefilter_seconds_saved(self) -> float:
+        """Model time the pre-filter saved, estimated from this run's average analysis time per keyword."""
+        if not self.analyzed_keyword_count:
+            return 0.0
+        return self.analysis_seconds / self.analyzed_keyword_count * self.prefiltered_total
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The run's counters, for callers that track it outside its event stream (e.g. background jobs)."""
         return {
-            'total_rows': len(df),
-            'total_columns': len(df.columns),
-            'column_names': list(df.columns),
-            'current_position': get_current_excel_position(),
-            'remaining_rows': len(df) - get_current_excel_position()
+            "total_rows": self.total_rows,
+            "estimated_chunks": self.estimated_chunks,
+            "completed_chunks": self.completed_chunks,
+            "total_keywords": self.total_keywords,
+            "cache_hits": self.cache_hits,
+            "prefiltered": self.prefiltered_total,
+            "analysis_retries": self.analysis_retries,
+            "analysis_splits": self.analysis_splits,
+            "unrecoverable_keywords": sum(len(rows.rows.keywords) for rows in self.unrecoverable),
         }
-    except Exception as e:
-        print(f"Error getting Excel file info: {e}")
-        return {}
+
+
+@dataclass
+class UnrecoverableChunkRows:
+    """Keywords of a chunk that could not be analyzed, for the run's report."""
+
+    chunk_number: int
+    start_row: int
+    end_row: int
+    rows: UnrecoverableRows
+
+
+@dataclass
+class ChunkAnalysisJob:
+    """A chunk dispatched for analysis, kept until its result can be emitted in order."""
+
+    chunk_number: int
+    current_pos: int
+    start_row: int
+    end_row: int
+    progress_percentage: float
+    remaining_chunks: int
+    analyzed_keywords: List[str] = field(default_factory=list)
+    analyzed_categories: List[str] = field(default_factory=list)
+    cached_verdicts: List[KeywordVerdict] = field(default_factory=list)
+    token_usage: TokenUsage = field(default_factory=TokenUsage)
+    submitted_at: float = 0.0
+    result: Optional[ChunkAnalysisResult] = None
+    finished: bool = False
+
+
+def get_chunk_analysis(response: Any) -> Optional["ExcelChunkAnalysis"]:
+    """The analyzer's answer from a RunResponse, if it parsed."""
+    content = getattr(response, "content", None)
+    return content if isinstance(content, ExcelChunkAnalysis) else None
+
+
+class ChunkAnalysisDispatcher:
+    """
+    Run keyword analyses for Excel chunks, optionally several at once.
+
+    With max_in_flight == 1 each chunk is analyzed inline through Agent.run. Above that, analyses
+    go through Agent.arun on a private event loop thread. Agent runs keep state on the instance,
+    so every in-flight analysis borrows its own copy of the analyzer from a pool. Failed calls are
+    retried, and chunks that keep failing are split, by the retrier.
+    """
+
+    def __init__(
+        self,
+        agent: Agent,
+        build_message: Callable[[List[str], List[str]], str],
+        max_in_flight: int = 1,
+        retrier: Optional[ChunkRetrier] = None,
+    ):
+        self.agent = agent
+        self.build_message = build_message
+        self.retrier = retrier or ChunkRetrier(get_chunk_analysis)
+        self.max_in_flight = max(1, max_in_flight)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._agents: Optional[asyncio.Queue] = None
+
+        if self.is_concurrent:
+            self._loop = asyncio.new_event_loop()
+            self._agents = asyncio.Queue()
+            for _ in range(self.max_in_flight):
+                self._agents.put_nowait(agent.deep_copy())
+            self._thread = threading.Thread(target=self._loop.run_forever, name="excel-chunk-analysis", daemon=True)
+            self._thread.start()
+
+    @property
+    def is_concurrent(self) -> bool:
+        return self.max_in_flight > 1
+
+    def submit(self, keywords: List[str], categories: List[str]) -> Future:
+        """Start analyzing a chunk's keywords and return a future resolving to the ChunkAnalysisResult."""
+        if self._loop is None:
+            future: Future = Future()
+            try:
+                future.set_result(self.retrier.analyze(self.agent.run, self.build_message, keywords, categories))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return asyncio.run_coroutine_threadsafe(self._analyze(keywords, categories), self._loop)
+
+    async def _analyze(self, keywords: List[str], categories: List[str]) -> ChunkAnalysisResult:
+        assert self._agents is not None
+        agent = await self._agents.get()
+        try:
+            return await self.retrier.aanalyze(agent.arun, self.build_message, keywords, categories)
+        finally:
+            self._agents.put_nowait(agent)
+
+    def close(self) -> None:
+        """Cancel outstanding analyses and stop the event loop thread."""
+        if self._loop is None or self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        outstanding = asyncio.all_tasks(self._loop)
+        for task in outstanding:
+            task.cancel()
+        if outstanding:
+            self._loop.run_until_complete(asyncio.gather(*outstanding, return_exceptions=True))
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+
+
+class AsyncChunkAnalysisDispatcher:
+    """
+    Async counterpart of ChunkAnalysisDispatcher for runs driven from an event loop.
+
+    Analyses are tasks on the caller's loop going through Agent.arun. As with the threaded
+    dispatcher, every in-flight analysis borrows its own copy of the analyzer from a pool.
+    """
+
+    def __init__(
+        self,
+        agent: Agent,
+        build_message: Callable[[List[str], List[str]], str],
+        max_in_flight: int = 1,
+        retrier: Optional[ChunkRetrier] = None,
+    ):
+        self.build_message = build_message
+        self.retrier = retrier or ChunkRetrier(get_chunk_analysis)
+        self.max_in_flight = max(1, max_in_flight)
+        self._agents: asyncio.Queue = asyncio.Queue()
+        self._agents.put_nowait(agent)
+        for _ in range(self.max_in_flight - 1):
+            self._agents.put_nowait(agent.deep_copy())
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def is_concurrent(self) -> bool:
+        return self.max_in_flight > 1
+
+    def submit(self, keywords: List[str], categories: List[str]) -> asyncio.Task:
+        """Start analyzing a chunk's keywords and return a task resolving to the ChunkAnalysisResult."""
+        task = asyncio.create_task(self._analyze(keywords, categories))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _analyze(self, keywords: List[str], categories: List[str]) -> ChunkAnalysisResult:
+        agent = await self._agents.get()
+        try:
+            return await self.retrier.aanalyze(agent.arun, self.build_message, keywords, categories)
+        finally:
+            self._agents.put_nowait(agent)
+
+    async def close(self) -> None:
+        """Cancel outstanding analyses, e.g. when the client stops reading the run."""
+        outstanding = list(self._tasks)
+        for task in outstanding:
+            task.cancel()
+        if outstanding:
+            await asyncio.gather(*outstanding, return_exceptions=True)
+
+
+@dataclass
+class ExcelRunState:
+    """The workbook, analyzer and options of a single ExcelProcessor run, shared by run() and arun()."""
+
+    session_id: str
+    niche: str
+    keyword_analyzer: Agent
+    chunk_size: int
+    max_concurrency: int
+    progress: ExcelRunProgress
+    excel_file_path: str = ""
+    reader: Optional[ExcelChunkReader] = None
+    cursor: ChunkCursor = field(default_factory=ChunkCursor)
+    column_names: List[Any] = field(default_factory=list)
+    keyword_columns: Optional[KeywordColumns] = None
+    keyword_prefilter: Optional[KeywordPrefilter] = None
+    error: Optional[str] = None
+
+    def build_message(self, keywords: List[str], categories: List[str]) -> str:
+        """The analyzer's message for some of a chunk's keywords."""
+        return build_keyword_message(self.niche, format_keyword_table(keywords, categories))
 
 
 class KeywordEvaluation(BaseModel):
@@ -255,7 +603,7 @@ class ExcelProcessor(Workflow):
 
     # Excel Analysis Agent: Analyzes keywords for SEO value
     keyword_analyzer: Agent = Agent(
-        model=OpenAIChat(id="gpt-4o-mini"),
+        model=get_openai_chat("gpt-4o-mini"),
         debug_mode=True,
         stream=False,
         description=dedent("""\
@@ -265,9 +613,8 @@ class ExcelProcessor(Workflow):
 Ensure that all evaluations are made solely based on the provided criteria without introducing any personal opinions or assumptions.
 ________________________________________________________________
 **The inputs you will get:**
-- Keywords: insert keywords
-- Category of each keyword: category ( these categories are beneath the given niche.
-NICHE IS { niche } FOR ALL KEYWORDS
+- Niche: the first line of every message; it is the niche FOR ALL KEYWORDS of that message
+- Keywords: a tab-separated table with a header row, one keyword and its category per row ( these categories are beneath the given niche.
 ________________________________________________________________
 First: analyze the keywords carefully to understand its context and its intent ( informational - commercial - Navigational - Transactional ), to determine the target audience whether it is (beginners OR intermediates OR experts) for the keywords.
 ________________________________________________________________
@@ -327,25 +674,170 @@ The instructions are finished, so after analyzing and understanding them well an
         structured_outputs=True,
     )
 
+    # Counters of the run in progress on this copy of the workflow, set once start_run() loaded its workbook
+    run_progress: Optional[ExcelRunProgress] = None
+
+    @instrument_keyword_run("excel")
     def run(
         self,
-        base64_string: str,
-        niche: str,
+        base64_string: str = "",
+        niche: str = "",
         chunk_size: str = "100",
         session_id: Optional[str] = None,
+        max_concurrency: str = "1",
+        upload_id: str = "",
+        use_cache: str = "true",
+        prefilter: str = "true",
+        resume: str = "true",
     ) -> Iterator[Union[WorkflowCompletedEvent, RunResponse]]:
-        logger.info(f"Processing Excel file with session_id: {session_id}")
+        if self.run_id is None:
+            raise ValueError("Run ID is not set")
+
+        state = self.start_run(
+            base64_string, niche, chunk_size, session_id, max_concurrency, upload_id, use_cache, prefilter, resume
+        )
+        if state.error:
+            yield WorkflowCompletedEvent(run_id=self.run_id, content=state.error)
+            return
+
+        # Process Excel file in chunks. Up to max_concurrency analyses are in flight at once;
+        # their results are still saved and reported in chunk order.
+        dispatcher = ChunkAnalysisDispatcher(
+            state.keyword_analyzer, state.build_message, max_in_flight=state.max_concurrency
+        )
+        pending: Dict[Future, ChunkAnalysisJob] = {}
+        dispatch_order: Deque[ChunkAnalysisJob] = deque()
+        try:
+            for item in self.plan_chunks(state):
+                if isinstance(item, RunResponse):
+                    yield item
+                    continue
+                # Dispatch the analysis, then wait until there is room for the next chunk
+                if not item.finished:
+                    item.submitted_at = time.perf_counter()
+                    pending[dispatcher.submit(item.analyzed_keywords, item.analyzed_categories)] = item
+                dispatch_order.append(item)
+                yield from self.collect_chunk_results(
+                    pending, dispatch_order, state.progress, state.session_id,
+                    max_pending=state.max_concurrency - 1, report_completions=dispatcher.is_concurrent,
+                )
+
+            # Wait for the chunks that are still being analyzed
+            yield from self.collect_chunk_results(
+                pending, dispatch_order, state.progress, state.session_id,
+                max_pending=0, report_completions=dispatcher.is_concurrent,
+            )
+        finally:
+            dispatcher.close()
 
+        yield WorkflowCompletedEvent(run_id=self.run_id, content=self.finish_run(state))
+
+    @instrument_keyword_run("excel")
+    async def arun(
+        self,
+        base64_string: str = "",
+        niche: str = "",
+        chunk_size: str = "100",
+        session_id: Optional[str] = None,
+        max_concurrency: str = "1",
+        upload_id: str = "",
+        use_cache: str = "true",
+        prefilter: str = "true",
+        resume: str = "true",
+    ) -> AsyncIterator[Union[WorkflowCompletedEvent, RunResponse]]:
+        """
+        Async version of run() for callers on an event loop.
+
+        Decoding the upload, parsing the workbook, pre-filtering, cache lookups and every result or
+        checkpoint write run in worker threads, and chunks are analyzed through Agent.arun, so a large
+        file never holds up other requests served by the same loop.
+        """
         if self.run_id is None:
             raise ValueError("Run ID is not set")
 
+        state = await asyncio.to_thread(
+            self.start_run,
+            base64_string, niche, chunk_size, session_id, max_concurrency, upload_id, use_cache, prefilter, resume,
+        )
+        if state.error:
+            yield WorkflowCompletedEvent(run_id=self.run_id, content=state.error)
+            return
+
+        dispatcher = AsyncChunkAnalysisDispatcher(
+            state.keyword_analyzer, state.build_message, max_in_flight=state.max_concurrency
+        )
+        pending: Dict[asyncio.Task, ChunkAnalysisJob] = {}
+        dispatch_order: Deque[ChunkAnalysisJob] = deque()
+        planner = self.plan_chunks(state)
+        try:
+            # Each step of the planner reads and prepares one chunk, so it is advanced off the loop
+            while (item := await asyncio.to_thread(next, planner, None)) is not None:
+                if isinstance(item, RunResponse):
+                    yield item
+                    continue
+                if not item.finished:
+                    item.submitted_at = time.perf_counter()
+                    pending[dispatcher.submit(item.analyzed_keywords, item.analyzed_categories)] = item
+                dispatch_order.append(item)
+                async for response in self.acollect_chunk_results(
+                    pending, dispatch_order, state.progress, state.session_id,
+                    max_pending=state.max_concurrency - 1, report_completions=dispatcher.is_concurrent,
+                ):
+                    yield response
+
+            async for response in self.acollect_chunk_results(
+                pending, dispatch_order, state.progress, state.session_id,
+                max_pending=0, report_completions=dispatcher.is_concurrent,
+            ):
+                yield response
+        finally:
+            planner.close()
+            await dispatcher.close()
+
+        final_results = await asyncio.to_thread(self.finish_run, state)
+        yield WorkflowCompletedEvent(run_id=self.run_id, content=final_results)
+
+    def update_run_method(self):
+        super().update_run_method()
+        # Workflow only routes one of run() and arun() through its session handling; route both,
+        # so the playground's run() calls keep working alongside arun()
+        if self._subclass_run is not None:
+            object.__setattr__(self, "run", self.run_workflow.__get__(self))
+        # Both rely on agno internals (_subclass_run, the instance's rebound run methods); fail here
+        # rather than on the first run if the installed agno routes them differently
+        routing = (("run", "run_workflow"), ("arun", "arun_workflow_generator"))
+        for method_name, workflow_method_name in routing:
+            workflow_method = getattr(Workflow, workflow_method_name, None)
+            if workflow_method is None or getattr(getattr(self, method_name), "__func__", None) is not workflow_method:
+                raise RuntimeError(
+                    f"This agno version does not route {self.__class__.__name__}.{method_name}() through "
+                    f"Workflow.{workflow_method_name}(), so its runs would have no run_id or session"
+                )
+
+    def start_run(
+        self,
+        base64_string: str,
+        niche: str,
+        chunk_size: str,
+        session_id: Optional[str],
+        max_concurrency: str,
+        upload_id: str,
+        use_cache: str,
+        prefilter: str,
+        resume: str,
+    ) -> ExcelRunState:
+        """Parse the run's options, load its workbook and checkpoint. Blocking; arun() calls it in a thread."""
+        logger.info(f"Processing Excel file with session_id: {session_id}")
+        self.run_progress = None
+
         # Get the actual session ID from the workflow
         actual_session_id = session_id or self.session_id or 'default'
         logger.info(f"Using session ID: {actual_session_id}")
 
-        # Convert chunk_size string to int
+        # Convert chunk_size string to int; "auto" sizes every chunk by its estimated tokens
+        adaptive_chunking = chunk_size.strip().lower() == "auto"
         try:
-            chunk_size_int = int(chunk_size)
+            chunk_size_int = 100 if adaptive_chunking else int(chunk_size)
             if chunk_size_int <= 0:
                 chunk_size_int = 100
                 logger.warning(f"Invalid chunk_size '{chunk_size}', using default value of 100")
@@ -353,58 +845,170 @@ The instructions are finished, so after analyzing and understanding them well an
             chunk_size_int = 100
             logger.warning(f"Invalid chunk_size '{chunk_size}', using default value of 100")
 
-        # Update agent instructions with the dynamic niche
-        self.keyword_analyzer.instructions = self.get_agent_instructions(niche)
-
-        # Convert base64 to Excel file
-        excel_file_path = self.convert_base64_to_excel(base64_string, actual_session_id)
-        if not excel_file_path:
-            yield WorkflowCompletedEvent(
-                run_id=self.run_id,
-                content="Error: Failed to convert base64 string to Excel file",
+        # Convert max_concurrency string to int; 1 analyzes chunks one at a time
+        try:
+            max_concurrency_int = int(max_concurrency)
+            if max_concurrency_int <= 0:
+                max_concurrency_int = 1
+                logger.warning(f"Invalid max_concurrency '{max_concurrency}', using default value of 1")
+        except ValueError:
+            max_concurrency_int = 1
+            logger.warning(f"Invalid max_concurrency '{max_concurrency}', using default value of 1")
+
+        # A per-run copy of the analyzer, so concurrent runs don't share run state. Its system prompt is
+        # the same for every niche; the niche goes into each chunk's message.
+        keyword_analyzer = self.keyword_analyzer.deep_copy()
+        # Cached verdicts are only reused for the same model and prompt
+        model_id = keyword_analyzer.model.id if keyword_analyzer.model else None
+        instruction_hash = get_instruction_hash(
+            model_id, str(keyword_analyzer.description), str(keyword_analyzer.instructions)
+        )
+        chunker = (
+            AdaptiveChunker(
+                model_id,
+                instruction_tokens=estimate_tokens(f"{keyword_analyzer.description}{keyword_analyzer.instructions or ''}"),
             )
-            return
+            if adaptive_chunking
+            else None
+        )
+        state = ExcelRunState(
+            session_id=actual_session_id,
+            niche=niche,
+            keyword_analyzer=keyword_analyzer,
+            chunk_size=chunk_size_int,
+            max_concurrency=max_concurrency_int,
+            progress=ExcelRunProgress(
+                niche=niche, instruction_hash=instruction_hash, use_cache=parse_flag(use_cache), chunker=chunker
+            ),
+        )
+
+        # niche only has a default so base64_string can stay the first positional argument
+        if not niche:
+            state.error = "Error: niche is required"
+            return state
+
+        # Use a workbook streamed through /v1/uploads/excel, or decode the base64 string
+        if upload_id:
+            excel_file_path = self.get_uploaded_excel(upload_id)
+            if not excel_file_path:
+                state.error = f"Error: No uploaded Excel file found for upload_id '{upload_id}'"
+                return state
+        else:
+            excel_file_path = self.convert_base64_to_excel(base64_string, actual_session_id)
+            if not excel_file_path:
+                state.error = "Error: Failed to convert base64 string to Excel file"
+                return state
+
+        # Open the workbook once; file info and chunking are served from this reader,
+        # and the cursor tracks this run's position independently of any other upload
+        state.excel_file_path = excel_file_path
+        state.reader = ExcelChunkReader(excel_file_path)
 
         # Get file info for progress tracking
-        file_info = get_excel_file_info(excel_file_path)
+        file_info = get_excel_file_info(state.reader, state.cursor)
         total_rows = file_info.get('total_rows', 0)
-        column_names = file_info.get('column_names', [])
+        state.column_names = file_info.get('column_names', [])
+        state.keyword_columns = detect_keyword_columns(state.column_names)
+        if chunker is not None:
+            state.chunk_size = self.size_next_chunk(chunker, state.reader, state.cursor, state.keyword_columns)
+
+        state.progress.total_rows = total_rows
+        state.progress.estimated_chunks = (total_rows + state.chunk_size - 1) // state.chunk_size
+        state.progress.checkpoint = self.load_checkpoint(
+            excel_file_path, actual_session_id, niche, total_rows, parse_flag(resume)
+        )
+        # Reject non-English keywords and near-duplicates locally, across all chunks of this run
+        state.keyword_prefilter = KeywordPrefilter() if parse_flag(prefilter) else None
+        self.run_progress = state.progress
+        return state
+
+    def plan_chunks(self, state: ExcelRunState) -> Generator[Union[RunResponse, ChunkAnalysisJob], None, None]:
+        """
+        Read and prepare the run's chunks in order, yielding progress messages and analysis jobs.
+
+        Jobs that need no model call come out already finished. Every step reads the workbook and may
+        touch the cache and result stores, so arun() advances this generator in a worker thread.
+        """
+        progress = state.progress
+        reader, cursor, keyword_columns = state.reader, state.cursor, state.keyword_columns
+        # start_run() opened the workbook and detected its columns, or reported an error instead
+        assert reader is not None and keyword_columns is not None
+        total_rows, chunker, checkpoint = progress.total_rows, progress.chunker, progress.checkpoint
+        column_names = state.column_names
+        chunk_size_int = state.chunk_size
 
         # Initial progress message
         yield RunResponse(
             run_id=self.run_id,
             content=f"📊 **Excel File Analysis Started**\n\n"
-                   f"📁 File: {excel_file_path}\n"
-                   f"🎯 Niche: {niche}\n"
+                   f"📁 File: {state.excel_file_path}\n"
+                   f"🎯 Niche: {state.niche}\n"
                    f"📈 Total Rows: {total_rows}\n"
                    f"📋 Columns: {', '.join(column_names[:5])}{'...' if len(column_names) > 5 else ''}\n"
-                   f"🔄 Processing in chunks of {chunk_size_int} rows...\n"
-                   f"⏳ Estimated chunks: {(total_rows + chunk_size_int - 1) // chunk_size_int}\n\n"
+                   + (f"🔄 Processing in token-budgeted chunks (~{chunk_size_int} rows to start)...\n"
+                      if chunker is not None else f"🔄 Processing in chunks of {chunk_size_int} rows...\n")
+                   + f"⏳ Estimated chunks: {progress.estimated_chunks}\n\n"
                    f"---"
         )
 
-        # Process Excel file in chunks
-        total_keywords = 0
+        if checkpoint is not None and checkpoint.chunks:
+            yield RunResponse(
+                run_id=self.run_id,
+                content=f"♻️ **Resuming Previous Run**\n\n"
+                       f"✅ Already analyzed: {checkpoint.completed_rows}/{total_rows} rows "
+                       f"in {len(checkpoint.chunks)} chunks ({checkpoint.total_keywords} valuable keywords)\n"
+                       f"🔄 Only unfinished chunks will be analyzed\n\n"
+                       f"---"
+            )
         chunk_number = 0
 
-        while has_more_chunks(excel_file_path):
+        while has_more_chunks(reader, cursor):
             chunk_number += 1
-            current_pos = get_current_excel_position()
+            current_pos = cursor.position
+
+            # Skip chunks a previous run of this file already saved
+            done_chunk = checkpoint.chunk_at(current_pos) if checkpoint is not None else None
+            if done_chunk is not None:
+                self.skip_checkpointed_chunk(
+                    done_chunk.start_row, done_chunk.end_row, reader, cursor, keyword_columns, state.keyword_prefilter
+                )
+                progress.completed_chunks += 1
+                progress.total_keywords += done_chunk.keyword_count
+                continue
+
+            if chunker is not None and chunk_number > 1:
+                chunk_size_int = self.size_next_chunk(chunker, reader, cursor, keyword_columns)
+                progress.estimated_chunks = (
+                    chunk_number - 1 + (total_rows - current_pos + chunk_size_int - 1) // chunk_size_int
+                )
 
-            # Read chunk
-            chunk_df, start_row, end_row = read_excel_chunk_with_calamine(excel_file_path, chunk_size=chunk_size_int)
+            # Read chunk, stopping short of the next chunk that is already checkpointed
+            rows_to_read = chunk_size_int
+            next_done_start = checkpoint.next_completed_start(current_pos) if checkpoint is not None else None
+            if next_done_start is not None:
+                rows_to_read = min(rows_to_read, next_done_start - current_pos)
+            chunk_df, start_row, end_row = read_excel_chunk_with_calamine(reader, cursor, chunk_size=rows_to_read)
+            if reader.total_rows != total_rows:
+                # The row count came from the sheet's <dimension>, which can count trailing blank or
+                # styled rows; chunking follows the loaded sheet, so progress does too
+                total_rows = progress.total_rows = reader.total_rows
+                if chunker is None:
+                    progress.estimated_chunks = (total_rows + chunk_size_int - 1) // chunk_size_int
 
             if chunk_df.empty:
                 break
+            record_keyword_chunk("excel", end_row - start_row)
 
             # Calculate progress
             progress_percentage = (current_pos / total_rows * 100) if total_rows > 0 else 0
             remaining_chunks = (total_rows - current_pos + chunk_size_int - 1) // chunk_size_int
 
-            # Prepare keywords for analysis
-            keywords_text = self.prepare_keywords_for_analysis(chunk_df, start_row, end_row)
-            if not keywords_text:
+            # Prepare keywords for analysis and display in one pass
+            prepared = prepare_keyword_chunk(chunk_df, keyword_columns, start_row, end_row)
+            if not prepared.prompt:
                 # Skip empty chunks
+                progress.completed_chunks += 1
+                self.record_checkpoint(progress, start_row, end_row, 0)
                 yield RunResponse(
                     run_id=self.run_id,
                     content=f"⏭️ **Chunk {chunk_number} Skipped**\n\n"
@@ -415,59 +1019,268 @@ The instructions are finished, so after analyzing and understanding them well an
                 )
                 continue
 
-            # Extract keywords for display
-            keywords_for_display = self.extract_keywords_for_display(chunk_df, start_row, end_row)
+            # Drop keywords the model would always exclude before they cost any tokens
+            prefilter_note = ""
+            if state.keyword_prefilter is not None:
+                filtered = self.prefilter_chunk(state.keyword_prefilter, prepared, progress, state.session_id)
+                if filtered.keyword_count < prepared.keyword_count:
+                    prefilter_note = (
+                        f"🧹 Pre-filtered: {prepared.keyword_count - filtered.keyword_count} keywords "
+                        f"(~{estimate_tokens(prepared.prompt) - estimate_tokens(filtered.prompt)} tokens saved)\n"
+                    )
+                prepared = filtered
+
+            # Answer previously analyzed keywords from the verdict cache; only misses go to the model
+            cached = self.get_cached_verdicts(prepared, progress)
+            to_analyze = prepared.select([normalize_keyword(k) not in cached for k in prepared.keywords])
+            cached_verdicts = [
+                KeywordVerdict(keyword=k, included=cached[normalize_keyword(k)].included,
+                               reason=cached[normalize_keyword(k)].reason)
+                for k in prepared.keywords if normalize_keyword(k) in cached
+            ]
+            progress.cache_lookups += prepared.keyword_count
+            progress.cache_hits += len(cached_verdicts)
 
             # Show chunk processing start
             yield RunResponse(
                 run_id=self.run_id,
                 content=f"🔍 **Processing Chunk {chunk_number}**\n\n"
                        f"📊 Position: {current_pos}/{total_rows} rows ({progress_percentage:.1f}%)\n"
-                       f"📝 Analyzing {len(keywords_for_display)} keywords from rows {start_row + 1}-{end_row}\n"
+                       f"📝 Analyzing {prepared.keyword_count} keywords from rows {start_row + 1}-{end_row}\n"
+                       f"{prefilter_note}"
+                       f"🗃️ Cache hits: {len(cached_verdicts)}/{prepared.keyword_count} keywords "
+                       f"({progress.cache_hit_rate:.1f}% overall)\n"
                        f"🔄 Remaining chunks: {remaining_chunks}\n\n"
                        f"**Keywords in this chunk:**\n"
-                       f"{keywords_for_display}\n\n"
-                       f"🤖 AI is analyzing keywords for SEO value in the {niche} niche..."
+                       f"{prepared.display}\n\n"
+                       + (f"🤖 AI is analyzing {to_analyze.keyword_count} keywords for SEO value in the {state.niche} niche..."
+                          if to_analyze.prompt else "🗃️ No keywords in this chunk need the model.")
             )
 
-            # Analyze keywords
-            analysis_response: RunResponse = self.keyword_analyzer.run(keywords_text)
-            if (
-                analysis_response is not None
-                and analysis_response.content is not None
-                and isinstance(analysis_response.content, ExcelChunkAnalysis)
-            ):
-                # Save results
-                keywords_data = []
-                valuable_keywords = []
-                for keyword_eval in analysis_response.content.valuable_keywords:
-                    keywords_data.append({
-                        'keyword': keyword_eval.keyword,
-                        'reason': keyword_eval.reason
-                    })
-                    valuable_keywords.append(keyword_eval.keyword)
-
-                total_keywords += len(keywords_data)
-                self.save_keywords_to_session(actual_session_id, keywords_data)
-
-                # Show chunk results
-                yield RunResponse(
-                    run_id=self.run_id,
-                    content=f"✅ **Chunk {chunk_number} Complete**\n\n"
-                           f"📊 Position: {current_pos}/{total_rows} rows ({progress_percentage:.1f}%)\n"
-                           f"🎯 Valuable keywords found: {len(keywords_data)}\n"
-                           f"📈 Total accumulated: {total_keywords} keywords\n"
-                           f"🔄 Remaining chunks: {remaining_chunks}\n\n"
-                           f"**Valuable keywords from this chunk:**\n"
-                           f"{', '.join(valuable_keywords[:10])}{'...' if len(valuable_keywords) > 10 else ''}\n\n"
-                           f"**Sample reasons:**\n"
-                           f"{self.format_sample_reasons(keywords_data[:3])}\n\n"
-                           f"---"
+            job = ChunkAnalysisJob(
+                chunk_number=chunk_number,
+                current_pos=current_pos,
+                start_row=start_row,
+                end_row=end_row,
+                progress_percentage=progress_percentage,
+                remaining_chunks=remaining_chunks,
+                analyzed_keywords=to_analyze.keywords,
+                analyzed_categories=to_analyze.categories,
+                cached_verdicts=cached_verdicts,
+            )
+            if not job.analyzed_keywords:
+                job.finished = True
+                progress.completed_chunks += 1
+            yield job
+
+        # The sheet is exhausted: finish_run() compares the checkpoint with the rows chunking covered
+        progress.total_rows = reader.total_rows
+
+    def finish_run(self, state: ExcelRunState) -> str:
+        """Close the run's checkpoint if the whole file is done and build the session summary."""
+        checkpoint = state.progress.checkpoint
+        if checkpoint is not None and checkpoint.completed_rows >= state.progress.total_rows:
+            try:
+                get_excel_run_checkpoint_store().mark_completed(checkpoint)
+            except Exception as e:
+                logger.warning(f"Failed to mark checkpoint completed: {e}")
+        return self.finalize_session(state.session_id, state.progress)
+
+    def collect_chunk_results(
+        self,
+        pending: Dict[Future, ChunkAnalysisJob],
+        dispatch_order: Deque[ChunkAnalysisJob],
+        progress: ExcelRunProgress,
+        session_id: str,
+        max_pending: int,
+        report_completions: bool,
+    ) -> Iterator[RunResponse]:
+        """Wait until at most `max_pending` analyses are in flight, emitting finished chunks in chunk order."""
+        while True:
+            while dispatch_order and dispatch_order[0].finished:
+                chunk_result = self.save_chunk_result(dispatch_order.popleft(), progress, session_id)
+                if chunk_result is not None:
+                    yield chunk_result
+            if len(pending) <= max_pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=lambda f: pending[f].chunk_number):
+                job = pending.pop(future)
+                self.record_chunk_analysis(job, future.result(), progress)
+                if report_completions:
+                    yield self.get_chunk_analyzed_response(job, progress, in_flight=len(pending))
+
+    async def acollect_chunk_results(
+        self,
+        pending: Dict[asyncio.Task, ChunkAnalysisJob],
+        dispatch_order: Deque[ChunkAnalysisJob],
+        progress: ExcelRunProgress,
+        session_id: str,
+        max_pending: int,
+        report_completions: bool,
+    ) -> AsyncIterator[RunResponse]:
+        """Async version of collect_chunk_results(); results are saved in worker threads."""
+        while True:
+            while dispatch_order and dispatch_order[0].finished:
+                chunk_result = await asyncio.to_thread(
+                    self.save_chunk_result, dispatch_order.popleft(), progress, session_id
                 )
+                if chunk_result is not None:
+                    yield chunk_result
+            if len(pending) <= max_pending:
+                break
 
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=lambda t: pending[t].chunk_number):
+                job = pending.pop(task)
+                self.record_chunk_analysis(job, task.result(), progress)
+                if report_completions:
+                    yield self.get_chunk_analyzed_response(job, progress, in_flight=len(pending))
+
+    def record_chunk_analysis(self, job: ChunkAnalysisJob, result: ChunkAnalysisResult, progress: ExcelRunProgress):
+        """Attach a finished analysis to its job and update the run's counters."""
+        job.result = result
+        job.finished = True
+        job.token_usage = TokenUsage.from_metrics(result.metrics)
+        progress.token_usage.add(job.token_usage)
+        progress.analysis_retries += result.retries
+        progress.analysis_splits += result.splits
+        progress.completed_chunks += 1
+        analysis_seconds = time.perf_counter() - job.submitted_at
+        progress.analysis_seconds += analysis_seconds
+        progress.analyzed_keyword_count += len(job.analyzed_keywords)
+        record_keyword_analysis("excel", analysis_seconds, len(job.analyzed_keywords), job.token_usage)
+        if progress.chunker is not None:
+            progress.chunker.record_result(parsed=result.parse_failures == 0, output_tokens=result.max_output_tokens)
+
+    def get_chunk_analyzed_response(self, job: ChunkAnalysisJob, progress: ExcelRunProgress, in_flight: int) -> RunResponse:
+        return RunResponse(
+            run_id=self.run_id,
+            content=f"⏱️ **Chunk {job.chunk_number} Analyzed** "
+                   f"({progress.completed_chunks}/{progress.estimated_chunks} chunks done, "
+                   f"{in_flight} in flight)\n\n"
+        )
 
-        final_results = self.finalize_session(actual_session_id)
-        yield WorkflowCompletedEvent(run_id=self.run_id, content=final_results)
+    def save_chunk_result(
+        self, job: ChunkAnalysisJob, progress: ExcelRunProgress, session_id: str
+    ) -> Optional[RunResponse]:
+        """
+        Save the valuable keywords of an analyzed chunk, cache the model's verdicts and report them.
+
+        Keywords the retrier gave up on are added to the run's report, and the chunk is not
+        checkpointed, so resuming the run analyzes it again.
+        """
+        result = job.result or ChunkAnalysisResult()
+        unrecoverable = set(result.unrecoverable_keywords)
+        for rows in result.unrecoverable:
+            progress.unrecoverable.append(
+                UnrecoverableChunkRows(
+                    chunk_number=job.chunk_number, start_row=job.start_row, end_row=job.end_row, rows=rows
+                )
+            )
+
+        # Save results: cached keywords that were kept, then the model's picks
+        keywords_data = []
+        valuable_keywords = []
+        for verdict in job.cached_verdicts:
+            if verdict.included:
+                keywords_data.append({'keyword': verdict.keyword, 'reason': verdict.reason})
+                valuable_keywords.append(verdict.keyword)
+        model_picks = {}
+        for analysis in result.analyses:
+            for keyword_eval in analysis.valuable_keywords:
+                keywords_data.append({
+                    'keyword': keyword_eval.keyword,
+                    'reason': keyword_eval.reason
+                })
+                valuable_keywords.append(keyword_eval.keyword)
+                model_picks[keyword_eval.keyword] = keyword_eval.reason
+        if result.analyses:
+            self.cache_verdicts([k for k in job.analyzed_keywords if k not in unrecoverable], model_picks, progress)
+
+        chunk_key = progress.checkpoint.get_chunk_key(job.start_row, job.end_row) if progress.checkpoint else None
+        saved = self.save_keywords_to_session(session_id, keywords_data, chunk_key=chunk_key)
+        if saved and not unrecoverable:
+            self.record_checkpoint(progress, job.start_row, job.end_row, len(keywords_data))
+        progress.total_keywords += len(keywords_data)
+
+        # Show chunk results
+        return RunResponse(
+            run_id=self.run_id,
+            content=f"✅ **Chunk {job.chunk_number} Complete**\n\n"
+                   f"📊 Position: {job.current_pos}/{progress.total_rows} rows ({job.progress_percentage:.1f}%)\n"
+                   f"🎯 Valuable keywords found: {len(keywords_data)}\n"
+                   f"📈 Total accumulated: {progress.total_keywords} keywords\n"
+                   f"🗃️ Cache hit rate: {progress.cache_hit_rate:.1f}% ({progress.cache_hits}/{progress.cache_lookups} keywords)\n"
+                   + (f"🔢 Tokens: {job.token_usage.describe()}\n" if job.token_usage.input_tokens else "")
+                   + (f"🔁 Retried {result.retries} times, split {result.splits} times\n"
+                      if result.retries or result.splits else "")
+                   + (f"⚠️ Could not analyze {len(unrecoverable)} keywords; they are listed in the run summary\n"
+                      if unrecoverable else "")
+                   + f"🔄 Remaining chunks: {job.remaining_chunks}\n\n"
+                   f"**Valuable keywords from this chunk:**\n"
+                   f"{', '.join(valuable_keywords[:10])}{'...' if len(valuable_keywords) > 10 else ''}\n\n"
+                   f"**Sample reasons:**\n"
+                   f"{self.format_sample_reasons(keywords_data[:3])}\n\n"
+                   f"---"
+        )
+
+    def size_next_chunk(
+        self, chunker: AdaptiveChunker, reader: ExcelChunkReader, cursor: ChunkCursor, columns: KeywordColumns
+    ) -> int:
+        """Rows in the next token-budgeted chunk, sized from a look-ahead window at the cursor."""
+        window_df, _, _ = reader.read_chunk(cursor.position, chunker.max_rows)
+        if window_df.empty or columns.keyword_column not in window_df.columns:
+            return chunker.min_rows
+        categories = window_df[columns.category_column] if columns.category_column in window_df.columns else None
+        return chunker.size_next_chunk(window_df[columns.keyword_column], categories)
+
+    def prefilter_chunk(
+        self, keyword_prefilter: KeywordPrefilter, prepared: PreparedChunk, progress: ExcelRunProgress, session_id: str
+    ) -> PreparedChunk:
+        """Apply the local keyword rules to a chunk, recording what they rejected."""
+        result = keyword_prefilter.filter(prepared.keywords)
+        if not result.rejections:
+            return prepared
+
+        filtered = prepared.select(result.keep)
+        for rule, count in result.rejected_by_rule.items():
+            progress.prefiltered[rule] = progress.prefiltered.get(rule, 0) + count
+        progress.prefilter_tokens_saved += estimate_tokens(prepared.prompt) - estimate_tokens(filtered.prompt)
+        chunk_key = (
+            progress.checkpoint.get_chunk_key(prepared.start_row, prepared.end_row) if progress.checkpoint else None
+        )
+        try:
+            get_session_result_store().append_rejections(
+                session_id,
+                [{'keyword': r.keyword, 'rule': r.rule, 'reason': r.reason} for r in result.rejections],
+                chunk_key=chunk_key,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to record pre-filtered keywords: {e}")
+        return filtered
+
+    def get_cached_verdicts(self, prepared: PreparedChunk, progress: ExcelRunProgress) -> Dict[str, KeywordVerdict]:
+        """Look up the chunk's keywords in the verdict cache; cache errors never fail the run."""
+        if not progress.use_cache or not prepared.keywords:
+            return {}
+        try:
+            return get_keyword_verdict_cache().get_many(prepared.keywords, progress.niche, progress.instruction_hash)
+        except Exception as e:
+            logger.warning(f"Keyword verdict cache lookup failed: {e}")
+            return {}
+
+    def cache_verdicts(self, analyzed_keywords: List[str], valuable: Dict[str, str], progress: ExcelRunProgress):
+        """Store an include/exclude verdict for every keyword the model analyzed, given its picks and reasons."""
+        if not progress.use_cache:
+            return
+        try:
+            get_keyword_verdict_cache().put_many(
+                build_verdicts(analyzed_keywords, valuable), progress.niche, progress.instruction_hash
+            )
+        except Exception as e:
+            logger.warning(f"Keyword verdict cache update failed: {e}")
 
     def get_cached_results(self, session_id: str) -> Optional[str]:
         logger.info("Checking if cached results exist")
@@ -479,176 +1292,132 @@ The instructions are finished, so after analyzing and understanding them well an
         self.session_state["excel_results"][session_id] = results
 
     def convert_base64_to_excel(self, base64_string: str, session_id: Optional[str] = None) -> Optional[str]:
-        """Convert base64 string to Excel file."""
+        """Decode a base64 string to the session's input Excel file (compatibility path for non-streaming clients)."""
         try:
-            if not base64_string:
-                return None
-
-            base64_string = base64_string.strip().replace('\n', '').replace('\r', '')
-
-            if not base64_string:
-                return None
-
-
-            try:
-                import re
-                if not re.match(r'^[A-Za-z0-9+/]*={0,2}$', base64_string):
-                    return None
-            except Exception:
-                return None
-
-
-            try:
-                excel_bytes = base64.b64decode(base64_string)
-            except Exception:
+            if not base64_string or not base64_string.strip():
                 return None
-
-            if not excel_bytes:
-                return None
-
-
-            try:
-                excel_signatures = [
-                    b'\x50\x4B\x03\x04',
-                    b'\xD0\xCF\x11\xE0',
-                    b'\x09\x08\x10\x00',
-                ]
-                is_excel_file = any(excel_bytes.startswith(sig) for sig in excel_signatures)
-                if not is_excel_file:
-                    return None
-            except Exception:
-                pass
-
-
-            session_id = session_id or 'default'
-            excel_file_path = f"tmp/input_excel_{session_id}.xlsx"
-
-            try:
-                os.makedirs("tmp", exist_ok=True)
-            except Exception:
-                return None
-
-            try:
-                with open(excel_file_path, 'wb') as f:
-                    f.write(excel_bytes)
-            except Exception:
-                return None
-
-            if not os.path.exists(excel_file_path):
-                return None
-
-            file_size = os.path.getsize(excel_file_path)
-            if file_size == 0:
-                return None
-
-            reset_excel_position()
-            logger.info(f"Reset Excel position counter for new file: {excel_file_path}")
-
-            return excel_file_path
-
+            return write_base64_excel(base64_string, get_excel_input_path(session_id))
         except Exception as e:
             logger.error(f"Error converting base64 to Excel: {e}")
             return None
 
+    def get_uploaded_excel(self, upload_id: str) -> Optional[str]:
+        """Return the path of a workbook stored by the streaming upload endpoint."""
+        try:
+            excel_file_path = get_excel_input_path(upload_id)
+        except ExcelUploadError as e:
+            logger.error(str(e))
+            return None
+        if not os.path.exists(excel_file_path) or os.path.getsize(excel_file_path) == 0:
+            logger.error(f"Uploaded Excel file not found: {excel_file_path}")
+            return None
+        return excel_file_path
+
     def prepare_keywords_for_analysis(self, chunk_df: pd.DataFrame, start_row: int, end_row: int) -> Optional[str]:
         """Prepare keywords from DataFrame for analysis."""
         try:
-            keyword_column = None
-            category_column = None
-
-
-            for col in chunk_df.columns:
-                col_lower = str(col).lower()
-                if any(keyword in col_lower for keyword in ['keyword', 'term', 'phrase', 'word']):
-                    keyword_column = col
-                elif any(cat in col_lower for cat in ['category', 'type', 'class', 'group']):
-                    category_column = col
-
-            if not keyword_column:
-                keyword_column = chunk_df.columns[0]
-
-            if not category_column:
-                category_column = 'category'
-                chunk_df[category_column] = 'general'
-
-            keywords_with_category = []
-            for _, row in chunk_df.iterrows():
-                keyword = str(row[keyword_column]).strip()
-                category = str(row[category_column]).strip()
-                if keyword and keyword.lower() not in ['nan', 'none', '']:
-                    keywords_with_category.append({
-                        'keyword': keyword,
-                        'category': category
-                    })
-
-            if not keywords_with_category:
-                return None
-
-            keywords_text = f"Please analyze the following keywords from the Excel file (rows {start_row + 1} to {end_row}):\n\n"
-            for item in keywords_with_category:
-                keywords_text += f"- Keyword: {item['keyword']}, Category: {item['category']}\n"
-
-            return keywords_text
-
+            return prepare_keyword_chunk(chunk_df, detect_keyword_columns(list(chunk_df.columns)), start_row, end_row).prompt
         except Exception as e:
             logger.error(f"Error preparing keywords for analysis: {e}")
             return None
 
-    def save_keywords_to_session(self, session_id: Optional[str], keywords_data: List[Dict[str, str]]):
-        """Save keywords to session-specific Excel file."""
+    def save_keywords_to_session(
+        self, session_id: Optional[str], keywords_data: List[Dict[str, str]], chunk_key: Optional[str] = None
+    ) -> bool:
+        """Append a chunk's keywords to the session result store."""
         try:
-            session_id = session_id or 'default'
-            session_excel_file = f"tmp/session_keywords_{session_id}.xlsx"
-
-
-            existing_keywords = []
-            if os.path.exists(session_excel_file):
-                try:
-                    existing_df = pd.read_excel(session_excel_file)
-                    existing_keywords = existing_df.to_dict('records')
-                except:
-                    existing_keywords = []
-
-
-            existing_keywords.extend(keywords_data)
+            get_session_result_store().append(session_id, keywords_data, chunk_key=chunk_key)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving keywords to session: {e}")
+            return False
 
+    def load_checkpoint(
+        self, file_path: str, session_id: str, niche: str, total_rows: int, resume: bool
+    ) -> Optional[ExcelRunCheckpoint]:
+        """
+        Load this file's checkpoint in the session, dropping results of chunks that never reached it.
 
-            if existing_keywords:
-                df = pd.DataFrame(existing_keywords)
-                df.to_excel(session_excel_file, index=False)
+        With `resume` off the checkpoint is cleared, and the file's earlier results in the session
+        are replaced by this run's.
+        """
+        try:
+            checkpoint_store = get_excel_run_checkpoint_store()
+            file_hash = get_file_sha256(file_path)
+            if not resume:
+                checkpoint_store.clear(session_id, file_hash, niche)
+            checkpoint = checkpoint_store.load(session_id, file_hash, niche, total_rows=total_rows)
+            get_session_result_store().discard_chunks(
+                session_id,
+                checkpoint.chunk_key_prefix,
+                keep_keys=[checkpoint.get_chunk_key(c.start_row, c.end_row) for c in checkpoint.chunks],
+            )
+            if checkpoint.chunks:
+                logger.info(
+                    f"Resuming session {session_id}: {checkpoint.completed_rows}/{total_rows} rows already analyzed"
+                )
+            return checkpoint
+        except Exception as e:
+            logger.warning(f"Checkpoints unavailable, processing the whole file: {e}")
+            return None
 
+    def record_checkpoint(self, progress: ExcelRunProgress, start_row: int, end_row: int, keyword_count: int):
+        """Mark a chunk's row range as done once its results are saved."""
+        if progress.checkpoint is None:
+            return
+        try:
+            get_excel_run_checkpoint_store().record_chunk(progress.checkpoint, start_row, end_row, keyword_count)
         except Exception as e:
-            logger.error(f"Error saving keywords to session: {e}")
+            logger.warning(f"Failed to checkpoint rows {start_row + 1}-{end_row}: {e}")
 
-    def finalize_session(self, session_id: Optional[str]) -> str:
-        """Finalize the session and return summary."""
+    def skip_checkpointed_chunk(
+        self,
+        start_row: int,
+        end_row: int,
+        reader: ExcelChunkReader,
+        cursor: ChunkCursor,
+        columns: KeywordColumns,
+        keyword_prefilter: Optional[KeywordPrefilter],
+    ):
+        """Move past a chunk finished by an earlier run, replaying it through the pre-filter's duplicate index."""
+        if keyword_prefilter is not None:
+            chunk_df, _, _ = reader.read_chunk(start_row, end_row - start_row)
+            keyword_prefilter.filter(prepare_keyword_chunk(chunk_df, columns, start_row, end_row).keywords)
+        cursor.advance(end_row)
+
+    def finalize_session(self, session_id: Optional[str], progress: Optional[ExcelRunProgress] = None) -> str:
+        """Finalize the session, build its Excel file and return summary."""
         try:
             session_id = session_id or 'default'
-            session_excel_file = f"tmp/session_keywords_{session_id}.xlsx"
-            session_keywords = []
+            result_store = get_session_result_store()
+            session_keyword_count = result_store.count(session_id)
 
-            if os.path.exists(session_excel_file):
-                try:
-                    df = pd.read_excel(session_excel_file)
-                    session_keywords = df.to_dict('records')
-                except:
-                    session_keywords = []
-
-            if session_keywords:
+            if session_keyword_count:
+                session_excel_file = result_store.export_excel(session_id) or get_session_excel_path(session_id)
                 download_url = self.get_download_url(session_id)
                 result = f"🎉 **Session Complete!**\n\n"
                 result += f"📊 **Summary:**\n"
-                result += f"• Total valuable keywords processed: {len(session_keywords)}\n"
+                result += f"• Total valuable keywords processed: {session_keyword_count}\n"
                 result += f"• File saved: {session_excel_file}\n"
-                result += f"• File size: {self.get_file_size(session_excel_file)} MB\n\n"
+                result += f"• File size: {self.get_file_size(session_excel_file)} MB\n"
+                result += self.format_run_savings(progress)
+                result += "\n"
+                result += self.format_unrecoverable_rows(progress)
                 result += f"📥 **Download your results:**\n"
                 result += f"🔗 {download_url}\n\n"
                 result += f"💡 **What's in the file:**\n"
                 result += f"• Keyword: The valuable keyword\n"
-                result += f"• Reason: Why this keyword was selected as valuable\n\n"
+                result += f"• Reason: Why this keyword was selected as valuable\n"
+                result += f"• Pre-filtered sheet: Keywords rejected locally and the rule that rejected them\n\n"
                 result += f"✅ Your Excel file is ready for download!"
             else:
                 result = "Session complete! No valuable keywords found in this session."
+                savings = self.format_run_savings(progress)
+                if savings:
+                    result += f"\n\n{savings}"
+                unrecoverable = self.format_unrecoverable_rows(progress)
+                if unrecoverable:
+                    result += f"\n{unrecoverable}"
 
             if session_id:
                 self.add_results_to_cache(session_id, result)
@@ -659,6 +1428,48 @@ The instructions are finished, so after analyzing and understanding them well an
             logger.error(f"Error finalizing session: {e}")
             return f"Error finalizing session: {str(e)}"
 
+    def format_run_savings(self, progress: Optional[ExcelRunProgress]) -> str:
+        """Summary lines for the model tokens this run used and the keywords that never reached the model."""
+        if progress is None:
+            return ""
+        lines = []
+        if progress.token_usage.input_tokens:
+            lines.append(f"• Model tokens: {progress.token_usage.describe()}")
+        if progress.prefiltered_total:
+            rules = ", ".join(f"{rule.replace('_', ' ')}: {count}" for rule, count in sorted(progress.prefiltered.items()))
+            lines.append(f"• Pre-filtered keywords: {progress.prefiltered_total} ({rules})")
+            lines.append(
+                f"• Pre-filter savings: ~{progress.prefilter_tokens_saved} prompt tokens, "
+                f"~{progress.prefilter_seconds_saved:.1f}s of model time"
+            )
+        if progress.cache_hits:
+            lines.append(f"• Answered from cache: {progress.cache_hits}/{progress.cache_lookups} keywords")
+        if progress.analysis_retries or progress.analysis_splits:
+            lines.append(
+                f"• Recovered model calls: {progress.analysis_retries} retries, {progress.analysis_splits} chunk splits"
+            )
+        return "".join(f"{line}\n" for line in lines)
+
+    def format_unrecoverable_rows(self, progress: Optional[ExcelRunProgress]) -> str:
+        """Report of the keywords that could not be analyzed even after retries and splitting."""
+        if progress is None or not progress.unrecoverable:
+            return ""
+        keyword_count = sum(len(entry.rows.keywords) for entry in progress.unrecoverable)
+        lines = [
+            f"⚠️ **Unrecoverable rows:** {keyword_count} keywords could not be analyzed. Their chunks were "
+            f"not checkpointed, so resuming this session analyzes them again."
+        ]
+        for entry in progress.unrecoverable[:UNRECOVERABLE_REPORT_LIMIT]:
+            keywords = entry.rows.keywords
+            lines.append(
+                f"• Chunk {entry.chunk_number} (rows {entry.start_row + 1}-{entry.end_row}): "
+                f"{', '.join(keywords[:5])}{'...' if len(keywords) > 5 else ''} ({len(keywords)} keywords) - "
+                f"{entry.rows.reason}"
+            )
+        if len(progress.unrecoverable) > UNRECOVERABLE_REPORT_LIMIT:
+            lines.append(f"... and {len(progress.unrecoverable) - UNRECOVERABLE_REPORT_LIMIT} more")
+        return "".join(f"{line}\n" for line in lines) + "\n"
+
     def get_download_url(self, session_id: str) -> str:
         """Generate download URL based on environment."""
         try:
@@ -689,43 +1500,7 @@ The instructions are finished, so after analyzing and understanding them well an
     def extract_keywords_for_display(self, chunk_df: pd.DataFrame, start_row: int, end_row: int) -> str:
         """Extract and format keywords for display."""
         try:
-            keyword_column = None
-            category_column = None
-
-
-            for col in chunk_df.columns:
-                col_lower = str(col).lower()
-                if any(keyword in col_lower for keyword in ['keyword', 'term', 'phrase', 'word']):
-                    keyword_column = col
-                elif any(cat in col_lower for cat in ['category', 'type', 'class', 'group']):
-                    category_column = col
-
-            if not keyword_column:
-                keyword_column = chunk_df.columns[0]
-
-            keywords_with_category = []
-            for _, row in chunk_df.iterrows():
-                keyword = str(row[keyword_column]).strip()
-                category = str(row[category_column]).strip() if category_column else 'general'
-                if keyword and keyword.lower() not in ['nan', 'none', '']:
-                    keywords_with_category.append({
-                        'keyword': keyword,
-                        'category': category
-                    })
-
-
-            if keywords_with_category:
-                display_lines = []
-                for i, item in enumerate(keywords_with_category[:15]):
-                    display_lines.append(f"• {item['keyword']} ({item['category']})")
-
-                if len(keywords_with_category) > 15:
-                    display_lines.append(f"... and {len(keywords_with_category) - 15} more")
-
-                return '\n'.join(display_lines)
-            else:
-                return "No valid keywords found in this chunk."
-
+            return prepare_keyword_chunk(chunk_df, detect_keyword_columns(list(chunk_df.columns)), start_row, end_row).display
         except Exception as e:
             logger.error(f"Error extracting keywords for display: {e}")
             return "Error extracting keywords for display."
@@ -742,74 +1517,6 @@ The instructions are finished, so after analyzing and understanding them well an
 
         return '\n'.join(formatted_reasons)
 
-    def get_agent_instructions(self, niche: str) -> str:
-        """Generate agent instructions with dynamic niche."""
-        return dedent(f'''\
-            You are a Seasoned SEO professional specializing in keyword analysis, At the same time you are an expert content creator (these previous two personalities should work in harmony and compatibility), Your task is objectively evaluating keywords for optimal SEO segments, and given complete keyword lists. Choose Keywords that are valuable and useful to readers., as these selected keywords will be used to create informative blog articles.
-
-
-Ensure that all evaluations are made solely based on the provided criteria without introducing any personal opinions or assumptions.
-________________________________________________________________
-**The inputs you will get:**
-- Keywords: insert keywords
-- Category of each keyword: category ( these categories are beneath the given niche.
-NICHE IS { niche } FOR ALL KEYWORDS
-________________________________________________________________
-First: analyze the keywords carefully to understand its context and its intent ( informational - commercial - Navigational - Transactional ), to determine the target audience whether it is (beginners OR intermediates OR experts) for the keywords.
-________________________________________________________________
-**Now,follow the following criteria to choose the valuable keywords:**
-1-Give all Keywords the same level of attention.
-*Note:Keywords can be a sentence, a command, or a question. Never base your analysis on this.*
-
-2-As You are a SEO expert, Consider multiple perspectives before applying the criteria to choose valuable Keywords and then apply the following criteria in order to choose the valuable Keywords:
-- Keywords must be grammatically and linguistically correct.
-- Valuable Keywords provide deep information yet remain accessible to non-specialists.
--Valuable Keywords offer practical solutions or scientific benefits.
-- A valuable Keyword is one that can be understood independently, even if presented alone.
-
-
-
-3- Also, as you are a content creator,review each keyword to make sure that:
--Is it scalable for in-depth content?
--Does it provide real solutions to the user?
--Does it maintain clarity and coherence in isolation?
--Does it provide useful information rather than superficial information?
-- Is it just an informational intention?
-
-4-After that, Cross-reference the keyword against established industry guidelines and case studies to ensure that its value is consistent across various expert perspectives ( SEO expert and content creators ).
-
-5-whether category is (beginners OR intermediates OR experts),You should Exclude any keyword that requires a level above the intermediates level to understand.
-________________________________________________________________
-**Important instructions and considerations:**
-1. Do not include personal opinions regarding the audience 's interests, desires, or perspectives.
-Also “Avoid over‐elaboration or speculative reasoning: focus only on the given criteria without philosophical digressions.”
-2. Maintain a professional and objective tone throughout the analysis.
-3. Strictly follow the provided standards without deviation.
-4. Do not make assumptions about a keyword's depth or complexity; treat all keywords equally without any bias to any each.
-5. Do not add any extra emphasis or formatting to the keywords.
-7. Disregard search volume when evaluating keywords.
-8. Ensure that excluded keywords are only listed in the second table, not in the first.
-9. Ensure every keyword is evaluated and appears in one of the two tables (none are neglected).
-10. Scientific abbreviations are acceptable in both upper and lower case.
-11. Keywords that are trivially simple and cannot support in-depth content should be excluded, but if a straightforward keyword can still yield robust, beneficial content, keep it.
-12. If two keywords are ≥ 80 % similar, keep the clearer phrasing and the other similar in the excluded table.
-12. Exclude any non-English keywords.
-________________________________________________________________
-**Remember that the two personas ( the SEO expert and expert content creator ), must work in integration and harmony, without any distractions, contradictions, or objections.**
-________________________________________________________________
-**The outputs must be as following:**
-1. Provide a detailed and accurate statement of target audience analysis, audience level of experience or understanding, and any other relevant characteristics.
-
-2.Table 1 consists of 2 columns (the Valuable Keyword | the reason ).
-
-
-Ensure that the target audience is clearly indicated and justified based on the complexity and content of the keywords.
-________________________________________________________________
-**Several lists of keywords will be provided in the same chat, so you are required to deal with each list completely independently to avoid confusion or merging or comparing between the lists.**
-________________________________________________________________
-The instructions are finished, so after analyzing and understanding them well and in a coherent manner, ask for the inputs.
-''')
-
 
 def get_excel_processor(debug_mode: bool = True) -> ExcelProcessor:
     return ExcelProcessor(
@@ -0,0 +1,206 @@
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Rule names recorded with every pre-rejected keyword
+RULE_SINGLE_WORD = "single_word"
+RULE_NON_ENGLISH = "non_english"
+RULE_NEAR_DUPLICATE = "near_duplicate"
+
+# Function words that are common in other Latin-script languages but never in English keywords.
+# Words that are also English (die, con, sin, van, per, ...) are left out: "die casting" and
+# "con artist" are English keywords.
+FOREIGN_FUNCTION_WORDS = frozenset(
+    """
+    los las del por una unos como qué cómo dónde cuál también muy sobre entre
+    les des une est dans pour avec sur sont aux qui ou où comment pourquoi très
+    der das und ist nicht mit für auf ein eine einen wie was wo warum auch
+    il gli della di che sono cosa perché anche
+    het een en voor niet ook och att som är inte hur
+    dos não em um uma porque também
+    """.split()
+)
+ENGLISH_FUNCTION_WORDS = frozenset(
+    """
+    the a an and or of to in on for with is are was were be how what why when where which who
+    can do does best vs from at by your my you it this that
+    """.split()
+)
+
+_WORD_PATTERN = re.compile(r"[^\W\d_]+|\d+")
+_MAX_PRIME = (1 << 31) - 1
+# End of the Latin Extended-B block
+_LAST_LATIN_CODEPOINT = 0x024F
+
+
+def tokenize_keyword(keyword: str) -> List[str]:
+    """Lower-cased word and number tokens of a keyword."""
+    return _WORD_PATTERN.findall(keyword.lower())
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Rough model token count of a prompt (about four characters per token)."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def looks_non_english(keyword: str, tokens: List[str]) -> bool:
+    """
+    Lightweight language check: keywords written mostly in a non-Latin script, or phrases built
+    from other languages' function words, are treated as non-English. Accented Latin letters alone
+    are not enough, so loanwords such as "café" pass, and one foreign function word is not either,
+    so "le creuset" or "des moines iowa" pass: it takes at least two of them.
+    """
+    letters = [char for char in keyword if char.isalpha()]
+    if not letters:
+        return False
+    non_latin = sum(1 for char in letters if ord(char) > _LAST_LATIN_CODEPOINT)
+    if non_latin / len(letters) > 0.5:
+        return True
+
+    if len(tokens) < 2 or any(token in ENGLISH_FUNCTION_WORDS for token in tokens):
+        return False
+    foreign = sum(1 for token in tokens if token in FOREIGN_FUNCTION_WORDS)
+    # Two-token phrases need both tokens foreign, so this also covers "a majority of the tokens"
+    return foreign >= 2
+
+
+def get_shingles(text: str, size: int = 3) -> FrozenSet[str]:
+    """Character shingles of a keyword, padded so short keywords still get several shingles."""
+    padded = f" {' '.join(tokenize_keyword(text))} "
+    if len(padded) <= size:
+        return frozenset([padded])
+    return frozenset(padded[i : i + size] for i in range(len(padded) - size + 1))
+
+
+def jaccard_similarity(left: FrozenSet[str], right: FrozenSet[str]) -> float:
+    if not left and not right:
+        return 1.0
+    return len(left & right) / len(left | right)
+
+
+@dataclass
+class PrefilterRejection:
+    """A keyword rejected locally, with the rule that rejected it."""
+
+    keyword: str
+    rule: str
+    reason: str
+
+
+@dataclass
+class PrefilterResult:
+    """Outcome of pre-filtering one chunk of keywords."""
+
+    keep: List[bool]
+    rejections: List[PrefilterRejection] = field(default_factory=list)
+
+    @property
+    def rejected_by_rule(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for rejection in self.rejections:
+            counts[rejection.rule] = counts.get(rejection.rule, 0) + 1
+        return counts
+
+
+class KeywordPrefilter:
+    """
+    Deterministic keyword rules applied before keywords are sent to the model.
+
+    Keywords that the model would always exclude - multi-word keywords when only single words are
+    wanted, non-English keywords, and near-duplicates of a keyword already kept - are rejected locally.
+    Near-duplicates are found with MinHash locality-sensitive hashing over character shingles and
+    confirmed with an exact Jaccard similarity check; keywords that differ in a number ("vitamin b6" and
+    "vitamin b12") are never treated as duplicates. The index lives on the instance, so one
+    prefilter per run dedupes across all of its chunks; the first occurrence of a keyword is kept.
+    """
+
+    def __init__(
+        self,
+        single_word_only: bool = False,
+        english_only: bool = True,
+        similarity_threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        seed: int = 7,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.single_word_only = single_word_only
+        self.english_only = english_only
+        self.similarity_threshold = similarity_threshold
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+
+        rng = np.random.default_rng(seed)
+        self._perm_a = rng.integers(1, _MAX_PRIME, size=num_perm, dtype=np.uint64)
+        self._perm_b = rng.integers(0, _MAX_PRIME, size=num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._kept: List[Tuple[str, FrozenSet[str], FrozenSet[str]]] = []
+
+    def _signature(self, shingles: FrozenSet[str]) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) & _MAX_PRIME for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        return ((np.outer(self._perm_a, hashes) + self._perm_b[:, None]) % _MAX_PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[band * self.rows_per_band : (band + 1) * self.rows_per_band].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def find_near_duplicate(
+        self, shingles: FrozenSet[str], numbers: FrozenSet[str], band_keys: List[bytes]
+    ) -> Optional[str]:
+        """Return the kept keyword `shingles` is a near-duplicate of, if any."""
+        candidates: Set[int] = set()
+        for band, key in enumerate(band_keys):
+            candidates.update(self._buckets[band].get(key, ()))
+        for index in sorted(candidates):
+            keyword, kept_shingles, kept_numbers = self._kept[index]
+            if kept_numbers == numbers and jaccard_similarity(shingles, kept_shingles) >= self.similarity_threshold:
+                return keyword
+        return None
+
+    def _remember(
+        self, keyword: str, shingles: FrozenSet[str], numbers: FrozenSet[str], band_keys: List[bytes]
+    ) -> None:
+        index = len(self._kept)
+        self._kept.append((keyword, shingles, numbers))
+        for band, key in enumerate(band_keys):
+            self._buckets[band].setdefault(key, []).append(index)
+
+    def filter(self, keywords: List[str]) -> PrefilterResult:
+        """Decide which keywords of a chunk go to the model, in order."""
+        result = PrefilterResult(keep=[])
+        for keyword in keywords:
+            rejection = self._check(keyword)
+            result.keep.append(rejection is None)
+            if rejection is not None:
+                result.rejections.append(rejection)
+        return result
+
+    def _check(self, keyword: str) -> Optional[PrefilterRejection]:
+        tokens = tokenize_keyword(keyword)
+        if self.single_word_only and len(keyword.split()) > 1:
+            return PrefilterRejection(keyword, RULE_SINGLE_WORD, "Excluded: not a single word.")
+        if self.english_only and looks_non_english(keyword, tokens):
+            return PrefilterRejection(keyword, RULE_NON_ENGLISH, "Excluded: not an English keyword.")
+
+        shingles = get_shingles(keyword)
+        numbers = frozenset(token for token in tokens if token.isdigit())
+        band_keys = self._band_keys(self._signature(shingles))
+        duplicate_of = self.find_near_duplicate(shingles, numbers, band_keys)
+        if duplicate_of is not None:
+            return PrefilterRejection(
+                keyword,
+                RULE_NEAR_DUPLICATE,
+                f"Excluded: at least {self.similarity_threshold:.0%} similar to '{duplicate_of}'.",
+            )
+        self._remember(keyword, shingles, numbers, band_keys)
+        return None
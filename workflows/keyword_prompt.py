@@ -0,0 +1,29 @@
+from typing import Iterable
+
+# Header row of the keyword table sent with every chunk
+KEYWORD_TABLE_HEADER = "keyword\tcategory"
+
+
+def clean_table_cell(value: object) -> str:
+    """A keyword or category on one line, without the tabs and newlines that delimit the table."""
+    return " ".join(str(value).split())
+
+
+def format_keyword_table(keywords: Iterable[str], categories: Iterable[str]) -> str:
+    """Keywords and their categories as a tab-separated table with a header row."""
+    rows = [KEYWORD_TABLE_HEADER]
+    rows.extend(
+        f"{clean_table_cell(keyword)}\t{clean_table_cell(category)}" for keyword, category in zip(keywords, categories)
+    )
+    return "\n".join(rows) + "\n"
+
+
+def build_keyword_message(niche: str, keyword_table: str) -> str:
+    """
+    The user message for one chunk of keywords.
+
+    The analyzers' system prompt is identical for every niche and chunk, so providers can serve it
+    from their prompt-prefix cache; everything that varies - the niche, then the keyword table - is
+    appended after it in this message.
+    """
+    return f"Niche: {clean_table_cell(niche)}\nKeywords:\n{keyword_table}"
@@ -0,0 +1,193 @@
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from agno.utils.log import logger
+
+
+def get_file_sha256(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class CheckpointedChunk:
+    """A row range [start_row, end_row) whose results were saved."""
+
+    start_row: int
+    end_row: int
+    keyword_count: int
+
+
+@dataclass
+class ExcelRunCheckpoint:
+    """Completed row ranges of one input file analyzed in one session for one niche."""
+
+    session_id: str
+    file_hash: str
+    niche: str
+    chunks: List[CheckpointedChunk] = field(default_factory=list)
+    status: str = "running"
+
+    @property
+    def completed_rows(self) -> int:
+        return sum(chunk.end_row - chunk.start_row for chunk in self.chunks)
+
+    @property
+    def total_keywords(self) -> int:
+        return sum(chunk.keyword_count for chunk in self.chunks)
+
+    @property
+    def chunk_key_prefix(self) -> str:
+        return f"{self.file_hash[:16]}:{self.niche}:"
+
+    def get_chunk_key(self, start_row: int, end_row: int) -> str:
+        """Tag stored with a chunk's results, so results of unfinished chunks can be discarded."""
+        return f"{self.chunk_key_prefix}{start_row}-{end_row}"
+
+    def chunk_at(self, row: int) -> Optional[CheckpointedChunk]:
+        """The completed chunk starting at `row`, if any."""
+        for chunk in self.chunks:
+            if chunk.start_row == row:
+                return chunk
+        return None
+
+    def next_completed_start(self, row: int) -> Optional[int]:
+        """Start of the first completed chunk after `row`, so a new chunk can stop short of it."""
+        starts = [chunk.start_row for chunk in self.chunks if chunk.start_row > row]
+        return min(starts) if starts else None
+
+
+class ExcelRunCheckpointStore:
+    """
+    Durable checkpoints for ExcelProcessor runs, kept next to the workflow's own storage.
+
+    A checkpoint is keyed on (session id, SHA-256 of the input file, niche). Every chunk whose results
+    have been saved is recorded with its row range and keyword count, so resubmitting the same file in
+    the same session skips straight to the first unfinished chunk instead of re-analyzing everything.
+    """
+
+    def __init__(self, db_file: str = "tmp/excel_processor_agent.db", table_name: str = "excel_processor_checkpoints"):
+        self.db_file = db_file
+        self.table_name = table_name
+        self.chunks_table_name = f"{table_name}_chunks"
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            db_dir = os.path.dirname(self.db_file)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+        connection = sqlite3.connect(self.db_file, timeout=30)
+        if not self._initialized:
+            connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.table_name} (
+                    session_id TEXT NOT NULL,
+                    file_hash TEXT NOT NULL,
+                    niche TEXT NOT NULL,
+                    total_rows INTEGER,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (session_id, file_hash, niche)
+                )
+                """
+            )
+            connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.chunks_table_name} (
+                    session_id TEXT NOT NULL,
+                    file_hash TEXT NOT NULL,
+                    niche TEXT NOT NULL,
+                    start_row INTEGER NOT NULL,
+                    end_row INTEGER NOT NULL,
+                    keyword_count INTEGER NOT NULL,
+                    completed_at REAL NOT NULL,
+                    PRIMARY KEY (session_id, file_hash, niche, start_row)
+                )
+                """
+            )
+            connection.commit()
+            self._initialized = True
+        return connection
+
+    def load(self, session_id: str, file_hash: str, niche: str, total_rows: Optional[int] = None) -> ExcelRunCheckpoint:
+        """Return the checkpoint for this file, creating an empty one if the file is new to the session."""
+        now = time.time()
+        key = (session_id, file_hash, niche)
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                f"SELECT status FROM {self.table_name} WHERE session_id = ? AND file_hash = ? AND niche = ?", key
+            ).fetchone()
+            if row is None:
+                connection.execute(
+                    f"INSERT INTO {self.table_name} "
+                    f"(session_id, file_hash, niche, total_rows, status, created_at, updated_at) "
+                    f"VALUES (?, ?, ?, ?, 'running', ?, ?)",
+                    (*key, total_rows, now, now),
+                )
+                return ExcelRunCheckpoint(session_id=session_id, file_hash=file_hash, niche=niche)
+
+            chunks = [
+                CheckpointedChunk(start_row=start_row, end_row=end_row, keyword_count=keyword_count)
+                for start_row, end_row, keyword_count in connection.execute(
+                    f"SELECT start_row, end_row, keyword_count FROM {self.chunks_table_name} "
+                    f"WHERE session_id = ? AND file_hash = ? AND niche = ? ORDER BY start_row",
+                    key,
+                )
+            ]
+        return ExcelRunCheckpoint(
+            session_id=session_id, file_hash=file_hash, niche=niche, chunks=chunks, status=row[0]
+        )
+
+    def record_chunk(self, checkpoint: ExcelRunCheckpoint, start_row: int, end_row: int, keyword_count: int) -> None:
+        """Mark a chunk as done; call only after its results have been saved."""
+        now = time.time()
+        key = (checkpoint.session_id, checkpoint.file_hash, checkpoint.niche)
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                f"INSERT OR REPLACE INTO {self.chunks_table_name} "
+                f"(session_id, file_hash, niche, start_row, end_row, keyword_count, completed_at) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, start_row, end_row, keyword_count, now),
+            )
+            connection.execute(
+                f"UPDATE {self.table_name} SET updated_at = ? WHERE session_id = ? AND file_hash = ? AND niche = ?",
+                (now, *key),
+            )
+        checkpoint.chunks.append(CheckpointedChunk(start_row=start_row, end_row=end_row, keyword_count=keyword_count))
+
+    def mark_completed(self, checkpoint: ExcelRunCheckpoint) -> None:
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                f"UPDATE {self.table_name} SET status = 'completed', updated_at = ? "
+                f"WHERE session_id = ? AND file_hash = ? AND niche = ?",
+                (time.time(), checkpoint.session_id, checkpoint.file_hash, checkpoint.niche),
+            )
+        checkpoint.status = "completed"
+
+    def clear(self, session_id: str, file_hash: str, niche: str) -> None:
+        """Forget a file's checkpoint so it is analyzed from the start."""
+        key = (session_id, file_hash, niche)
+        with closing(self._connect()) as connection, connection:
+            for table_name in (self.chunks_table_name, self.table_name):
+                connection.execute(
+                    f"DELETE FROM {table_name} WHERE session_id = ? AND file_hash = ? AND niche = ?", key
+                )
+        logger.info(f"Cleared checkpoint for session {session_id}, file {file_hash[:12]}")
+
+
+excel_run_checkpoint_store = ExcelRunCheckpointStore()
+
+
+def get_excel_run_checkpoint_store() -> ExcelRunCheckpointStore:
+    return excel_run_checkpoint_store
@@ -0,0 +1,389 @@
+import csv
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from agno.utils.log import logger
+from openpyxl import Workbook
+
+# Export format -> (file extension, media type)
+EXPORT_FORMATS: Dict[str, tuple[str, str]] = {
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("csv", "text/csv"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+# Rows fetched from SQLite and written per batch during an export
+EXPORT_BATCH_SIZE = 5000
+
+
+def get_session_export_path(session_id: Optional[str], file_format: str = "xlsx") -> str:
+    """Path of the file built for a session's accumulated keywords in the given format."""
+    extension, _ = EXPORT_FORMATS[file_format]
+    return f"tmp/session_keywords_{session_id or 'default'}.{extension}"
+
+
+def get_session_excel_path(session_id: Optional[str]) -> str:
+    """Path of the Excel file built for a session's accumulated keywords."""
+    return get_session_export_path(session_id, "xlsx")
+
+
+class SessionResultStore:
+    """
+    Append-only store for the valuable keywords accumulated by the keyword workflows.
+
+    Every analyzed chunk inserts only its own rows in a single SQLite transaction, so the cost of
+    saving a chunk no longer grows with the session and a crash can't corrupt earlier results.
+    The session Excel file is built from these rows once, when the session is finalized or downloaded.
+    Keywords rejected by the local pre-filter are kept in a second table with the rule that rejected them.
+    Every write bumps the session's revision, and each export file records the revision it was built
+    from, so a download is rebuilt after any append or discard.
+    """
+
+    def __init__(self, db_file: str = "tmp/session_results.db", table_name: str = "session_keywords"):
+        self.db_file = db_file
+        self.table_name = table_name
+        self.rejections_table_name = f"{table_name}_rejected"
+        self.revisions_table_name = f"{table_name}_revisions"
+        self.exports_table_name = f"{table_name}_exports"
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            db_dir = os.path.dirname(self.db_file)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+        connection = sqlite3.connect(self.db_file, timeout=30)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.table_name} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    keyword TEXT NOT NULL,
+                    reason TEXT,
+                    created_at REAL NOT NULL,
+                    chunk_key TEXT
+                )
+                """
+            )
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_session ON {self.table_name} (session_id, id)"
+            )
+            connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.rejections_table_name} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    keyword TEXT NOT NULL,
+                    rule TEXT NOT NULL,
+                    reason TEXT,
+                    created_at REAL NOT NULL,
+                    chunk_key TEXT
+                )
+                """
+            )
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{self.rejections_table_name}_session "
+                f"ON {self.rejections_table_name} (session_id, id)"
+            )
+            connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.revisions_table_name} (
+                    session_id TEXT PRIMARY KEY,
+                    revision INTEGER NOT NULL,
+                    modified_at REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.exports_table_name} (
+                    file_path TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    revision INTEGER NOT NULL
+                )
+                """
+            )
+            for table_name in (self.table_name, self.rejections_table_name):
+                columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table_name})")}
+                if "chunk_key" not in columns:
+                    # Tables created before results were tagged with the chunk that produced them
+                    connection.execute(f"ALTER TABLE {table_name} ADD COLUMN chunk_key TEXT")
+            connection.commit()
+            self._initialized = True
+        return connection
+
+    def _bump_revision(self, connection: sqlite3.Connection, session_id: str, now: float) -> None:
+        """Mark the session as changed, in the transaction of the write that changed it."""
+        connection.execute(
+            f"INSERT INTO {self.revisions_table_name} (session_id, revision, modified_at) VALUES (?, 1, ?) "
+            f"ON CONFLICT (session_id) DO UPDATE SET revision = revision + 1, modified_at = excluded.modified_at",
+            (session_id, now),
+        )
+
+    def append(
+        self, session_id: Optional[str], keywords_data: List[Dict[str, str]], chunk_key: Optional[str] = None
+    ) -> int:
+        """Append a chunk's keywords to the session and return the number of rows written."""
+        if not keywords_data:
+            return 0
+        session_id = session_id or "default"
+        now = time.time()
+        rows = [(session_id, item["keyword"], item.get("reason"), now, chunk_key) for item in keywords_data]
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                f"INSERT INTO {self.table_name} (session_id, keyword, reason, created_at, chunk_key) "
+                f"VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._bump_revision(connection, session_id, now)
+        return len(rows)
+
+    def append_rejections(
+        self, session_id: Optional[str], rejections: List[Dict[str, str]], chunk_key: Optional[str] = None
+    ) -> int:
+        """Record keywords rejected before analysis, each with its `rule` and `reason`."""
+        if not rejections:
+            return 0
+        session_id = session_id or "default"
+        now = time.time()
+        rows = [(session_id, item["keyword"], item["rule"], item.get("reason"), now, chunk_key) for item in rejections]
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                f"INSERT INTO {self.rejections_table_name} (session_id, keyword, rule, reason, created_at, chunk_key) "
+                f"VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._bump_revision(connection, session_id, now)
+        return len(rows)
+
+    def discard_chunks(self, session_id: Optional[str], key_prefix: str, keep_keys: Iterable[str]) -> int:
+        """
+        Delete the rows of chunks tagged with `key_prefix` that are not in `keep_keys`.
+
+        Used when a run resumes: results saved by chunks that never reached a checkpoint are dropped,
+        since those chunks are analyzed again.
+        """
+        keep = set(keep_keys)
+        session_id = session_id or "default"
+        # Escape LIKE wildcards so the prefix is matched literally
+        pattern = key_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        deleted = 0
+        with closing(self._connect()) as connection, connection:
+            for table_name in (self.table_name, self.rejections_table_name):
+                stale = [
+                    chunk_key
+                    for (chunk_key,) in connection.execute(
+                        f"SELECT DISTINCT chunk_key FROM {table_name} "
+                        f"WHERE session_id = ? AND chunk_key LIKE ? ESCAPE '\\'",
+                        (session_id, pattern),
+                    )
+                    if chunk_key not in keep
+                ]
+                for chunk_key in stale:
+                    deleted += connection.execute(
+                        f"DELETE FROM {table_name} WHERE session_id = ? AND chunk_key = ?", (session_id, chunk_key)
+                    ).rowcount
+            if deleted:
+                self._bump_revision(connection, session_id, time.time())
+        if deleted:
+            logger.info(f"Discarded {deleted} rows of unfinished chunks for session {session_id}")
+        return deleted
+
+    def count_rejections(self, session_id: Optional[str]) -> Dict[str, int]:
+        """Number of pre-rejected keywords in the session, per rule."""
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                f"SELECT rule, COUNT(*) FROM {self.rejections_table_name} WHERE session_id = ? GROUP BY rule",
+                (session_id or "default",),
+            ).fetchall()
+        return {rule: count for rule, count in rows}
+
+    def iter_rejections(self, session_id: Optional[str], batch_size: int = 1000) -> Iterator[Dict[str, str]]:
+        """Yield the session's pre-rejected keywords in insertion order."""
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                f"SELECT keyword, rule, reason FROM {self.rejections_table_name} WHERE session_id = ? ORDER BY id",
+                (session_id or "default",),
+            )
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                for keyword, rule, reason in batch:
+                    yield {"keyword": keyword, "rule": rule, "reason": reason}
+
+    def count(self, session_id: Optional[str]) -> int:
+        """Number of keywords accumulated in the session."""
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                f"SELECT COUNT(*) FROM {self.table_name} WHERE session_id = ?", (session_id or "default",)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def revision(self, session_id: Optional[str]) -> int:
+        """Number of writes to the session so far; 0 if the store never wrote to it."""
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                f"SELECT revision FROM {self.revisions_table_name} WHERE session_id = ?", (session_id or "default",)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def exported_revision(self, file_path: str) -> Optional[int]:
+        """Revision of the session the file at `file_path` was last exported from, if it was."""
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                f"SELECT revision FROM {self.exports_table_name} WHERE file_path = ?", (file_path,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def iter_rows(self, session_id: Optional[str], batch_size: int = 1000) -> Iterator[Dict[str, str]]:
+        """Yield the session's keywords in insertion order, fetching `batch_size` rows at a time."""
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                f"SELECT keyword, reason FROM {self.table_name} WHERE session_id = ? ORDER BY id",
+                (session_id or "default",),
+            )
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                for keyword, reason in batch:
+                    yield {"keyword": keyword, "reason": reason}
+
+    def export(
+        self, session_id: Optional[str], file_format: str = "xlsx", file_path: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Build the session's download file from the stored rows.
+
+        Rows are streamed from SQLite in batches and written as they are read (openpyxl write-only
+        mode for xlsx), so memory stays flat however large the session is. The file is written to a
+        temporary file of its own and moved into place, so readers never see a partial file and
+        concurrent exports don't write over each other. Returns the path, or None if the session has
+        no keywords; an earlier export of a session whose rows were all discarded is removed.
+
+        Raises:
+            ValueError: If the format is unknown, or Parquet is requested without pyarrow installed
+        """
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {file_format}")
+        file_path = file_path or get_session_export_path(session_id, file_format)
+        # Read before the rows, so rows written during the export leave the file out of date
+        revision = self.revision(session_id)
+        if not self.count(session_id):
+            # Files of sessions accumulated before the store existed (revision 0) are kept
+            if revision and os.path.exists(file_path):
+                os.remove(file_path)
+                logger.info(f"Removed the export of session {session_id}, which has no keywords left")
+            return None
+
+        file_dir, file_name = os.path.split(file_path)
+        os.makedirs(file_dir or ".", exist_ok=True)
+        base, ext = os.path.splitext(file_name)
+        fd, tmp_path = tempfile.mkstemp(dir=file_dir or ".", prefix=f"{base}.part-", suffix=ext)
+        os.close(fd)
+        try:
+            if file_format == "xlsx":
+                written = self._write_xlsx(session_id, tmp_path)
+            elif file_format == "csv":
+                written = self._write_csv(session_id, tmp_path)
+            else:
+                written = self._write_parquet(session_id, tmp_path)
+            # The upsert takes the database write lock, so concurrent exports move their file into
+            # place and record its revision one at a time, and the recorded revision matches the file
+            with closing(self._connect()) as connection, connection:
+                connection.execute(
+                    f"INSERT INTO {self.exports_table_name} (file_path, session_id, revision) VALUES (?, ?, ?) "
+                    f"ON CONFLICT (file_path) DO UPDATE SET session_id = excluded.session_id, "
+                    f"revision = excluded.revision",
+                    (file_path, session_id or "default", revision),
+                )
+                os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logger.info(f"Exported {written} keywords for session {session_id} to {file_path}")
+        return file_path
+
+    def _write_xlsx(self, session_id: Optional[str], file_path: str) -> int:
+        """Keywords on the first sheet; pre-rejected keywords, if any, on a "Pre-filtered" sheet."""
+        workbook = Workbook(write_only=True)
+        keywords_sheet = workbook.create_sheet("Sheet1")
+        keywords_sheet.append(["keyword", "reason"])
+        written = 0
+        for row in self.iter_rows(session_id, batch_size=EXPORT_BATCH_SIZE):
+            keywords_sheet.append([row["keyword"], row["reason"]])
+            written += 1
+
+        if self.count_rejections(session_id):
+            rejections_sheet = workbook.create_sheet("Pre-filtered")
+            rejections_sheet.append(["keyword", "rule", "reason"])
+            for row in self.iter_rejections(session_id, batch_size=EXPORT_BATCH_SIZE):
+                rejections_sheet.append([row["keyword"], row["rule"], row["reason"]])
+        workbook.save(file_path)
+        return written
+
+    def _write_csv(self, session_id: Optional[str], file_path: str) -> int:
+        written = 0
+        with open(file_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["keyword", "reason"])
+            for row in self.iter_rows(session_id, batch_size=EXPORT_BATCH_SIZE):
+                writer.writerow([row["keyword"], row["reason"]])
+                written += 1
+        return written
+
+    def _write_parquet(self, session_id: Optional[str], file_path: str) -> int:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet export requires pyarrow: `pip install pyarrow`")
+
+        schema = pa.schema([("keyword", pa.string()), ("reason", pa.string())])
+        written = 0
+        batch: List[Dict[str, str]] = []
+        with pq.ParquetWriter(file_path, schema) as writer:
+            for row in self.iter_rows(session_id, batch_size=EXPORT_BATCH_SIZE):
+                batch.append(row)
+                if len(batch) >= EXPORT_BATCH_SIZE:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    written += len(batch)
+                    batch = []
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                written += len(batch)
+        return written
+
+    def export_excel(self, session_id: Optional[str], file_path: Optional[str] = None) -> Optional[str]:
+        """Build the session's Excel file from the stored rows."""
+        return self.export(session_id, "xlsx", file_path)
+
+    def ensure_export(self, session_id: Optional[str], file_format: str = "xlsx") -> Optional[str]:
+        """Return an up-to-date download file for the session, rebuilding it only if the session changed since."""
+        file_path = get_session_export_path(session_id, file_format)
+        revision = self.revision(session_id)
+        if not revision and not self.count(session_id):
+            # Sessions accumulated before the store existed only have the Excel file
+            return file_path if os.path.exists(file_path) else None
+        if os.path.exists(file_path) and self.exported_revision(file_path) == revision:
+            return file_path
+        return self.export(session_id, file_format, file_path)
+
+    def ensure_excel(self, session_id: Optional[str]) -> Optional[str]:
+        """Return an up-to-date Excel file for the session."""
+        return self.ensure_export(session_id, "xlsx")
+
+
+session_result_store = SessionResultStore()
+
+
+def get_session_result_store() -> SessionResultStore:
+    return session_result_store
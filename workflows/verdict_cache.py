@@ -0,0 +1,194 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from os import getenv
+from typing import Dict, Iterable, List, Optional
+
+from agno.utils.log import logger
+
+NOT_SELECTED_REASON = "Not selected as valuable by the model."
+
+
+@dataclass
+class KeywordVerdict:
+    """Whether a keyword was kept for a niche, and why."""
+
+    keyword: str
+    included: bool
+    reason: str
+
+
+def normalize_keyword(keyword: str) -> str:
+    """Case- and whitespace-insensitive form of a keyword used as the cache key."""
+    return " ".join(str(keyword).lower().split())
+
+
+def get_instruction_hash(*parts: Optional[str]) -> str:
+    """Stable hash of the model and prompt a verdict was produced with."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()[:16]
+
+
+class KeywordVerdictCache:
+    """
+    Persistent include/exclude cache for analyzed keywords.
+
+    Verdicts are keyed on (normalized keyword, niche, instruction hash), so a change to the prompt or
+    model never serves stale answers. Entries expire after `ttl_seconds`; once the table grows past
+    `max_entries` the least recently used entries are evicted. Expiry and eviction scan the table, so
+    they run every `evict_every` puts rather than on each one; in between the table may run over
+    `max_entries` by the verdicts of those puts.
+    """
+
+    def __init__(
+        self,
+        db_file: str = "tmp/keyword_verdicts.db",
+        table_name: str = "keyword_verdicts",
+        ttl_seconds: float = float(getenv("KEYWORD_CACHE_TTL_DAYS", "30")) * 24 * 60 * 60,
+        max_entries: int = int(getenv("KEYWORD_CACHE_MAX_ENTRIES", "500000")),
+        evict_every: int = int(getenv("KEYWORD_CACHE_EVICT_EVERY", "50")),
+    ):
+        self.db_file = db_file
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.evict_every = max(1, evict_every)
+        self._initialized = False
+        self._puts_lock = threading.Lock()
+        self._puts_since_evict = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            db_dir = os.path.dirname(self.db_file)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+        connection = sqlite3.connect(self.db_file, timeout=30)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.table_name} (
+                    keyword TEXT NOT NULL,
+                    niche TEXT NOT NULL,
+                    instruction_hash TEXT NOT NULL,
+                    included INTEGER NOT NULL,
+                    reason TEXT,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    PRIMARY KEY (keyword, niche, instruction_hash)
+                )
+                """
+            )
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_last_used ON {self.table_name} (last_used_at)"
+            )
+            connection.commit()
+            self._initialized = True
+        return connection
+
+    def get_many(self, keywords: Iterable[str], niche: str, instruction_hash: str) -> Dict[str, KeywordVerdict]:
+        """Return the unexpired verdicts for `keywords`, keyed by normalized keyword."""
+        normalized = list({normalize_keyword(keyword) for keyword in keywords})
+        if not normalized:
+            return {}
+
+        now = time.time()
+        niche_key = normalize_keyword(niche)
+        verdicts: Dict[str, KeywordVerdict] = {}
+        with closing(self._connect()) as connection, connection:
+            # Stay below SQLite's bound-parameter limit
+            for offset in range(0, len(normalized), 500):
+                batch = normalized[offset : offset + 500]
+                placeholders = ", ".join("?" for _ in batch)
+                rows = connection.execute(
+                    f"SELECT keyword, included, reason FROM {self.table_name} "
+                    f"WHERE niche = ? AND instruction_hash = ? AND created_at >= ? AND keyword IN ({placeholders})",
+                    (niche_key, instruction_hash, now - self.ttl_seconds, *batch),
+                ).fetchall()
+                for keyword, included, reason in rows:
+                    verdicts[keyword] = KeywordVerdict(keyword=keyword, included=bool(included), reason=reason or "")
+            if verdicts:
+                hits = list(verdicts)
+                for offset in range(0, len(hits), 500):
+                    batch = hits[offset : offset + 500]
+                    placeholders = ", ".join("?" for _ in batch)
+                    connection.execute(
+                        f"UPDATE {self.table_name} SET last_used_at = ? "
+                        f"WHERE niche = ? AND instruction_hash = ? AND keyword IN ({placeholders})",
+                        (now, niche_key, instruction_hash, *batch),
+                    )
+        return verdicts
+
+    def put_many(self, verdicts: List[KeywordVerdict], niche: str, instruction_hash: str) -> None:
+        """Store verdicts, replacing earlier ones for the same key; every few puts, enforce the TTL and size bound."""
+        if not verdicts:
+            return
+        now = time.time()
+        niche_key = normalize_keyword(niche)
+        rows = [
+            (normalize_keyword(verdict.keyword), niche_key, instruction_hash, int(verdict.included), verdict.reason, now, now)
+            for verdict in verdicts
+        ]
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                f"INSERT OR REPLACE INTO {self.table_name} "
+                f"(keyword, niche, instruction_hash, included, reason, created_at, last_used_at) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            if self._should_evict():
+                self._evict(connection, now)
+
+    def _should_evict(self) -> bool:
+        with self._puts_lock:
+            self._puts_since_evict += 1
+            if self._puts_since_evict < self.evict_every:
+                return False
+            self._puts_since_evict = 0
+            return True
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        connection.execute(f"DELETE FROM {self.table_name} WHERE created_at < ?", (now - self.ttl_seconds,))
+        (count,) = connection.execute(f"SELECT COUNT(*) FROM {self.table_name}").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            connection.execute(
+                f"DELETE FROM {self.table_name} WHERE rowid IN "
+                f"(SELECT rowid FROM {self.table_name} ORDER BY last_used_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            logger.info(f"Evicted {overflow} keyword verdicts from the cache")
+
+
+def build_verdicts(
+    keywords: Iterable[str], valuable_keywords: Dict[str, str], not_selected_reason: str = NOT_SELECTED_REASON
+) -> List[KeywordVerdict]:
+    """
+    Turn a model answer into a verdict per analyzed keyword.
+
+    `valuable_keywords` maps the keywords the model kept to its reason; every other analyzed keyword
+    was excluded by the model.
+    """
+    valuable = {normalize_keyword(keyword): reason for keyword, reason in valuable_keywords.items()}
+    verdicts: Dict[str, KeywordVerdict] = {}
+    for keyword in keywords:
+        key = normalize_keyword(keyword)
+        if key in valuable:
+            verdicts[key] = KeywordVerdict(keyword=keyword, included=True, reason=valuable[key])
+        else:
+            verdicts[key] = KeywordVerdict(keyword=keyword, included=False, reason=not_selected_reason)
+    return list(verdicts.values())
+
+
+keyword_verdict_cache = KeywordVerdictCache()
+
+
+def get_keyword_verdict_cache() -> KeywordVerdictCache:
+    return keyword_verdict_cache
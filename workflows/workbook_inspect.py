@@ -0,0 +1,184 @@
+import posixpath
+import re
+import zipfile
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_CELL_REF = re.compile(r"^([A-Z]+)(\d+)$")
+
+
+@dataclass
+class SheetInfo:
+    """Dimensions and header of a worksheet, read without loading its rows."""
+
+    sheet_name: str
+    total_rows: int
+    column_names: List[Any] = field(default_factory=list)
+    sheet_names: List[str] = field(default_factory=list)
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + (ord(letter) - ord("A") + 1)
+    return index - 1
+
+
+def _parse_cell_ref(ref: str) -> Optional[Tuple[int, int]]:
+    """(row, column) of an A1-style reference, both 0-based."""
+    match = _CELL_REF.match(ref.upper().replace("$", ""))
+    if not match:
+        return None
+    return int(match.group(2)) - 1, _column_index(match.group(1))
+
+
+def _choose_sheet(sheet_names: List[str], preferred: str) -> Optional[str]:
+    if preferred in sheet_names:
+        return preferred
+    return sheet_names[0] if sheet_names else None
+
+
+def _xlsx_sheet_paths(archive: zipfile.ZipFile) -> Dict[str, str]:
+    """Sheet name -> worksheet XML path inside the package, in workbook order."""
+    relationships: Dict[str, str] = {}
+    with archive.open("xl/_rels/workbook.xml.rels") as rels_file:
+        for rel in ElementTree.parse(rels_file).getroot().iter(f"{_PACKAGE_REL_NS}Relationship"):
+            rel_id = rel.get("Id")
+            if rel_id is None:
+                continue
+            target = rel.get("Target", "")
+            path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+            relationships[rel_id] = path
+
+    sheet_paths: Dict[str, str] = {}
+    with archive.open("xl/workbook.xml") as workbook_file:
+        for sheet in ElementTree.parse(workbook_file).getroot().iter(f"{_MAIN_NS}sheet"):
+            sheet_rel_id = sheet.get(f"{_REL_NS}id")
+            sheet_path = relationships.get(sheet_rel_id) if sheet_rel_id is not None else None
+            if sheet_path:
+                sheet_paths[sheet.get("name", "")] = sheet_path
+    return sheet_paths
+
+
+def _read_shared_strings(archive: zipfile.ZipFile, indexes: List[int]) -> Dict[int, str]:
+    """Only the shared strings at `indexes`, parsing no further than the largest one."""
+    if not indexes or "xl/sharedStrings.xml" not in archive.namelist():
+        return {}
+    wanted = set(indexes)
+    last = max(wanted)
+    found: Dict[int, str] = {}
+    position = 0
+    with archive.open("xl/sharedStrings.xml") as strings_file:
+        for _, element in ElementTree.iterparse(strings_file, events=("end",)):
+            if element.tag != f"{_MAIN_NS}si":
+                continue
+            if position in wanted:
+                found[position] = "".join(text.text or "" for text in element.iter(f"{_MAIN_NS}t"))
+            element.clear()
+            if position >= last:
+                break
+            position += 1
+    return found
+
+
+def _cell_value(cell: ElementTree.Element) -> Any:
+    cell_type = cell.get("t")
+    if cell_type == "inlineStr":
+        return "".join(text.text or "" for text in cell.iter(f"{_MAIN_NS}t"))
+    value = cell.find(f"{_MAIN_NS}v")
+    raw = value.text if value is not None else None
+    if raw is None:
+        return ""
+    if cell_type in ("s", "str", "e"):
+        return raw
+    if cell_type == "b":
+        return raw == "1"
+    try:
+        return float(raw)
+    except ValueError:
+        return raw
+
+
+def read_xlsx_sheet_info(file_path: str, sheet_name: str = "CATEGORY") -> Optional[SheetInfo]:
+    """
+    Read a worksheet's dimensions and header row straight from the xlsx package.
+
+    Only the workbook index, the start of the worksheet XML (up to the end of the header row) and the
+    shared strings the header refers to are parsed. Returns None when the file is not an xlsx package
+    or the sheet does not declare its dimensions, so callers can fall back to another reader.
+    """
+    if not zipfile.is_zipfile(file_path):
+        return None
+    with zipfile.ZipFile(file_path) as archive:
+        sheet_paths = _xlsx_sheet_paths(archive)
+        chosen = _choose_sheet(list(sheet_paths), sheet_name)
+        if chosen is None:
+            return None
+
+        dimension: Optional[str] = None
+        header_cells: List[ElementTree.Element] = []
+        with archive.open(sheet_paths[chosen]) as sheet_file:
+            for _, element in ElementTree.iterparse(sheet_file, events=("end",)):
+                if element.tag == f"{_MAIN_NS}dimension":
+                    dimension = element.get("ref")
+                elif element.tag == f"{_MAIN_NS}row":
+                    header_cells = list(element.iter(f"{_MAIN_NS}c"))
+                    break
+                elif element.tag == f"{_MAIN_NS}sheetData":
+                    break
+
+        if not dimension or ":" not in dimension:
+            # Writers that skip <dimension>, or emit just "A1", give no usable row count
+            return None
+        first, last = (_parse_cell_ref(ref) for ref in dimension.split(":", 1))
+        if first is None or last is None:
+            return None
+        (first_row, first_col), (last_row, last_col) = first, last
+
+        column_names: List[Any] = [""] * (last_col - first_col + 1)
+        shared = _read_shared_strings(
+            archive, [int(cell.findtext(f"{_MAIN_NS}v") or 0) for cell in header_cells if cell.get("t") == "s"]
+        )
+        for position, cell in enumerate(header_cells):
+            parsed = _parse_cell_ref(cell.get("r", ""))
+            column = parsed[1] - first_col if parsed else position
+            if not 0 <= column < len(column_names):
+                continue
+            value = _cell_value(cell)
+            if cell.get("t") == "s":
+                value = shared.get(int(value or 0), "")
+            column_names[column] = value
+
+    return SheetInfo(
+        sheet_name=chosen,
+        total_rows=max(0, last_row - first_row),
+        column_names=column_names,
+        sheet_names=list(sheet_paths),
+    )
+
+
+def read_calamine_sheet_info(workbook: Any, sheet_name: str = "CATEGORY") -> Optional[SheetInfo]:
+    """Dimensions and header of a sheet of an open CalamineWorkbook, without converting its rows."""
+    sheet_names = list(workbook.sheet_names)
+    chosen = _choose_sheet(sheet_names, sheet_name)
+    if chosen is None:
+        return None
+    sheet = workbook.get_sheet_by_name(chosen)
+    if not sheet.height:
+        return SheetInfo(sheet_name=chosen, total_rows=0, sheet_names=sheet_names)
+    try:
+        header = sheet.to_python(nrows=1)
+    except TypeError:
+        # python-calamine without `nrows`: converting the rows still spares building the DataFrame
+        header = sheet.to_python()[:1]
+    return SheetInfo(
+        sheet_name=chosen,
+        total_rows=sheet.height - 1,
+        column_names=list(header[0]) if header else [],
+        sheet_names=sheet_names,
+    )
+